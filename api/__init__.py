@@ -1,9 +1,22 @@
 from api.agents import register_agent_routes
+from api.billing import register_billing_routes
 from api.chat import register_chat_routes
+from api.events import register_event_routes
 from api.files import register_file_routes
+from api.health import register_health_routes
+from api.metrics import register_metrics_routes
+from api.recording import register_recording_hooks
+from api.tracing import register_tracing_hooks
 
 def register_routes(app):
     """Register all API routes with the Flask app."""
+    # Tracing first, so that the root span covers the other request hooks
+    register_tracing_hooks(app)
     register_agent_routes(app)
+    register_billing_routes(app)
     register_chat_routes(app)
-    register_file_routes(app)
\ No newline at end of file
+    register_event_routes(app)
+    register_file_routes(app)
+    register_health_routes(app)
+    register_metrics_routes(app)
+    register_recording_hooks(app)
\ No newline at end of file
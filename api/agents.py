@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
 
-from schemas.agents import AgentCreate, AgentUpdate
-from services.human_agent import HumanAgentManager
-from services.database import get_db_manager
+from schemas.agents import (
+    AgentCreate, AgentUpdate, AgentHandoffRequest,
+    AgentBulkCreate, AgentBulkUpdate, AgentBulkStatusUpdate
+)
+from services.human_agent import get_human_agent_manager
 from utils.validation import ValidationError
 
 def register_agent_routes(app):
@@ -15,8 +17,7 @@ def register_agent_routes(app):
         
         try:
             agent_data = AgentCreate(**data).dict()
-            db_manager = get_db_manager()
-            agent_manager = HumanAgentManager(db_manager)
+            agent_manager = get_human_agent_manager()
             result = agent_manager.register_agent(agent_data)
             
             return jsonify(result), 201
@@ -25,6 +26,54 @@ def register_agent_routes(app):
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
+    @app.route("/api/agents/bulk", methods=["POST"])
+    def create_agents():
+        """Create several agents in one transaction."""
+        data = request.json
+        
+        try:
+            bulk = AgentBulkCreate(**data)
+            agent_manager = get_human_agent_manager()
+            result = agent_manager.register_agents([agent.dict() for agent in bulk.agents])
+            
+            return jsonify({"agents": result}), 201
+        except ValidationError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/agents/bulk", methods=["PUT"])
+    def update_agents():
+        """Update several agents in one transaction."""
+        data = request.json
+        
+        try:
+            bulk = AgentBulkUpdate(**data)
+            agent_manager = get_human_agent_manager()
+            result = agent_manager.update_agents([agent.dict(exclude_unset=True) for agent in bulk.agents])
+            
+            return jsonify(result), 200
+        except ValidationError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/agents/bulk/status", methods=["PUT"])
+    def update_agent_statuses():
+        """Set the status of several agents in one transaction."""
+        data = request.json
+        
+        try:
+            bulk = AgentBulkStatusUpdate(**data)
+            agent_manager = get_human_agent_manager()
+            result = agent_manager.update_agent_statuses(bulk.agent_ids, bulk.status)
+            
+            return jsonify(result), 200
+        except ValidationError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
     @app.route("/api/agents/<agent_id>", methods=["PUT"])
     def update_agent(agent_id):
         """Update an existing agent."""
@@ -32,8 +81,7 @@ def register_agent_routes(app):
         
         try:
             agent_data = AgentUpdate(**data).dict(exclude_unset=True)
-            db_manager = get_db_manager()
-            agent_manager = HumanAgentManager(db_manager)
+            agent_manager = get_human_agent_manager()
             result = agent_manager.update_agent(agent_id, agent_data)
             
             return jsonify(result), 200
@@ -46,8 +94,7 @@ def register_agent_routes(app):
     def get_agent(agent_id):
         """Get agent details."""
         try:
-            db_manager = get_db_manager()
-            agent_manager = HumanAgentManager(db_manager)
+            agent_manager = get_human_agent_manager()
             result = agent_manager.get_agent(agent_id)
             
             return jsonify(result), 200
@@ -58,8 +105,7 @@ def register_agent_routes(app):
     def delete_agent(agent_id):
         """Delete an agent."""
         try:
-            db_manager = get_db_manager()
-            agent_manager = HumanAgentManager(db_manager)
+            agent_manager = get_human_agent_manager()
             result = agent_manager.delete_agent(agent_id)
             
             return jsonify(result), 200
@@ -76,12 +122,68 @@ def register_agent_routes(app):
             if not status:
                 raise ValidationError("Status is required")
                 
-            db_manager = get_db_manager()
-            agent_manager = HumanAgentManager(db_manager)
+            agent_manager = get_human_agent_manager()
             result = agent_manager.update_agent_status(agent_id, status)
             
             return jsonify(result), 200
         except ValidationError as e:
             return jsonify({"error": str(e)}), 400
         except Exception as e:
-            return jsonify({"error": str(e)}), 500
\ No newline at end of file
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/agents/<agent_id>/heartbeat", methods=["POST"])
+    def agent_heartbeat(agent_id):
+        """Record a heartbeat from an agent, optionally reporting its status."""
+        data = request.get_json(silent=True) or {}
+        
+        try:
+            agent_manager = get_human_agent_manager()
+            result = agent_manager.heartbeat(agent_id, data.get("status"))
+            
+            return jsonify(result), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/handoffs", methods=["POST"])
+    def create_handoff():
+        """Hand off a conversation to a human agent, queueing it if no agent is available."""
+        data = request.json
+        
+        try:
+            handoff = AgentHandoffRequest(**data)
+            requirements = handoff.dict(include={"preferred_language", "preferred_level", "required_specialties"})
+            
+            agent_manager = get_human_agent_manager()
+            result = agent_manager.handoff_conversation(
+                handoff.conversation_id,
+                requirements,
+                priority=handoff.priority
+            )
+            
+            return jsonify(result), 202 if result.get("queued") else 200
+        except ValidationError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/handoffs/<ticket_id>", methods=["GET"])
+    def get_handoff(ticket_id):
+        """Get the state of a queued handoff."""
+        try:
+            agent_manager = get_human_agent_manager()
+            result = agent_manager.get_handoff_ticket(ticket_id)
+            
+            return jsonify(result), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 404
+    
+    @app.route("/api/handoffs/<ticket_id>", methods=["DELETE"])
+    def cancel_handoff(ticket_id):
+        """Cancel a queued handoff."""
+        try:
+            agent_manager = get_human_agent_manager()
+            result = agent_manager.cancel_handoff(ticket_id)
+            
+            return jsonify(result), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 404
\ No newline at end of file
@@ -0,0 +1,77 @@
+from flask import Response, request, jsonify, stream_with_context
+from io import StringIO
+import csv
+import json
+
+from services.database import get_db_manager, BILLING_LEDGER_COLUMNS
+from utils.validation import ValidationError
+
+def _csv_rows(entries):
+    """Encode ledger entries as CSV, a header line first."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    
+    writer.writerow(BILLING_LEDGER_COLUMNS)
+    for entry in entries:
+        writer.writerow([entry[column] for column in BILLING_LEDGER_COLUMNS])
+        
+        # Flush in chunks rather than per row
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+def _ndjson_rows(entries):
+    """Encode ledger entries as newline-delimited JSON."""
+    for entry in entries:
+        yield json.dumps(entry) + "\n"
+
+def register_billing_routes(app):
+    """Register billing-related routes with the Flask app."""
+    
+    @app.route("/api/billing/ledger", methods=["GET"])
+    def export_billing_ledger():
+        """Stream billing ledger entries as CSV or NDJSON."""
+        try:
+            export_format = request.args.get("format", "csv").lower()
+            if export_format not in ("csv", "ndjson"):
+                raise ValidationError("Invalid format. Valid values are: csv, ndjson")
+            
+            db_manager = get_db_manager()
+            entries = db_manager.iter_billing_entries(
+                start=request.args.get("start"),
+                end=request.args.get("end"),
+                agent_id=request.args.get("agent_id"),
+                period=request.args.get("period")
+            )
+            
+            if export_format == "csv":
+                body, mimetype = _csv_rows(entries), "text/csv"
+            else:
+                body, mimetype = _ndjson_rows(entries), "application/x-ndjson"
+            
+            return Response(
+                stream_with_context(body),
+                mimetype=mimetype,
+                headers={"Content-Disposition": f"attachment; filename=billing_ledger.{export_format}"}
+            )
+        except ValidationError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/billing/rollups", methods=["GET"])
+    def get_billing_rollups():
+        """Get billing totals per period and agent."""
+        try:
+            db_manager = get_db_manager()
+            rollups = db_manager.get_billing_rollups(
+                period=request.args.get("period"),
+                agent_id=request.args.get("agent_id")
+            )
+            
+            return jsonify({"rollups": rollups}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
\ No newline at end of file
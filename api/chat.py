@@ -1,6 +1,5 @@
 from flask import request, jsonify
 
-from core.ai import get_ai_core
 from services.database import get_db_manager
 from schemas.chat import ChatRequest, ConversationResponse, MessageResponse
 from utils.validation import ValidationError
@@ -18,7 +17,8 @@ def register_chat_routes(app):
             # Validate request data
             chat_request = ChatRequest(**data)
             
-            # Get AI core instance
+            # Get AI core instance, importing the model libraries on first use
+            from core.ai import get_ai_core
             ai_core = get_ai_core()
             
             # Process file if provided
@@ -43,7 +43,8 @@ def register_chat_routes(app):
                 welcome_message=chat_request.welcome_message,
                 exclusion_words=chat_request.exclusion_words,
                 main_prompt=chat_request.main_prompt,
-                chatbot_name=chat_request.chatbot_name
+                chatbot_name=chat_request.chatbot_name,
+                use_knowledge_base=chat_request.use_knowledge_base
             )
             
             return jsonify(response), 200
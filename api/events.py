@@ -0,0 +1,45 @@
+from flask import Response, request, stream_with_context
+import json
+
+from config import Config
+from services.events import get_event_broker
+
+def _event_stream(agent_id=None):
+    """Stream agent events to the client as server-sent events."""
+    types = request.args.get("types")
+    event_types = [event_type.strip() for event_type in types.split(",") if event_type.strip()] if types else None
+    
+    def generate():
+        subscription = get_event_broker().subscribe(agent_id, event_types)
+        try:
+            yield ": connected\n\n"
+            while True:
+                event = subscription.get(timeout=Config.EVENT_KEEPALIVE_SECONDS)
+                
+                # Comment lines keep idle connections open through proxies
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def register_event_routes(app):
+    """Register event stream routes with the Flask app."""
+    
+    @app.route("/api/events", methods=["GET"])
+    def stream_events():
+        """Stream handoff, conversation, rating and status events for all agents."""
+        return _event_stream()
+    
+    @app.route("/api/agents/<agent_id>/events", methods=["GET"])
+    def stream_agent_events(agent_id):
+        """Stream events for one agent."""
+        return _event_stream(agent_id)
\ No newline at end of file
@@ -1,9 +1,13 @@
 from flask import request, jsonify, send_file
 from io import BytesIO
 
-from core.storage import get_storage_service
 from utils.validation import ValidationError
 
+def _storage_service():
+    """Get the storage service, importing the MinIO client only once a file route is used."""
+    from core.storage import get_storage_service
+    return get_storage_service()
+
 def register_file_routes(app):
     """Register file-related routes with the Flask app."""
     
@@ -18,7 +22,7 @@ def register_file_routes(app):
             return jsonify({"error": "No file selected"}), 400
             
         try:
-            storage = get_storage_service()
+            storage = _storage_service()
             file_info = storage.upload_file(file)
             
             return jsonify(file_info), 201
@@ -29,7 +33,7 @@ def register_file_routes(app):
     def download_file(file_id):
         """Download a file."""
         try:
-            storage = get_storage_service()
+            storage = _storage_service()
             file_data = storage.download_file(file_id)
             
             # Create a BytesIO object from the file data
@@ -52,7 +56,7 @@ def register_file_routes(app):
     def delete_file(file_id):
         """Delete a file."""
         try:
-            storage = get_storage_service()
+            storage = _storage_service()
             result = storage.delete_file(file_id)
             
             return jsonify({"success": True, "message": "File deleted successfully"}), 200
@@ -63,7 +67,7 @@ def register_file_routes(app):
     def get_file_info(file_id):
         """Get file information."""
         try:
-            storage = get_storage_service()
+            storage = _storage_service()
             file_info = storage.get_file_info(file_id)
             
             return jsonify(file_info), 200
@@ -76,7 +80,7 @@ def register_file_routes(app):
         try:
             prefix = request.args.get("prefix")
             
-            storage = get_storage_service()
+            storage = _storage_service()
             files = storage.list_files(prefix)
             
             return jsonify({"files": files}), 200
@@ -0,0 +1,12 @@
+from flask import jsonify
+
+from core.startup import get_startup
+
+def register_health_routes(app):
+    """Register the readiness endpoint with the Flask app."""
+    
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        """Report whether this worker has warmed up and can serve requests without cold-start delays."""
+        status = get_startup().status()
+        return jsonify(status), 200 if status["ready"] else 503
\ No newline at end of file
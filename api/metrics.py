@@ -0,0 +1,26 @@
+from flask import Response, g, request
+import time
+
+from utils.metrics import observe_request, render_metrics
+
+def register_metrics_routes(app):
+    """Register request timing and the metrics endpoint with the Flask app."""
+    
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+    
+    @app.after_request
+    def record_request(response):
+        start = g.pop("request_start", None)
+        if start is not None:
+            # Label by route pattern rather than path, so IDs do not multiply the series
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe_request(request.method, route, response.status_code, time.perf_counter() - start)
+        return response
+    
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """Expose request and stage metrics in the Prometheus text format."""
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
\ No newline at end of file
@@ -0,0 +1,41 @@
+from flask import g, request
+import os
+import time
+
+from utils.recording import get_request_recorder, start_stage_timings, stop_stage_timings
+
+def register_recording_hooks(app):
+    """Record sampled requests, with their stage timings and response sizes, for replay."""
+    recorder = get_request_recorder()
+    if not recorder.enabled:
+        return
+    
+    @app.before_request
+    def start_recording():
+        if recorder.should_record(request.path):
+            g.record_start = time.time()
+            g.record_timer = time.perf_counter()
+            g.record_token = start_stage_timings()
+    
+    @app.after_request
+    def record_response(response):
+        token = g.pop("record_token", None)
+        if token is None:
+            return response
+        
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        recorder.record({
+            "ts": g.pop("record_start"),
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "route": route,
+            "json": request.get_json(silent=True),
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - g.pop("record_timer")) * 1000, 3),
+            "stages": stop_stage_timings(token),
+            "request_bytes": request.content_length or 0,
+            # Unknown for streamed responses
+            "response_bytes": response.calculate_content_length(),
+            "pid": os.getpid()
+        })
+        return response
\ No newline at end of file
@@ -0,0 +1,35 @@
+from flask import g, request
+
+from utils.tracing import get_tracer
+
+def register_tracing_hooks(app):
+    """Trace each request, with the stages it runs through as child spans."""
+    tracer = get_tracer()
+    if not tracer.enabled:
+        return
+    
+    @app.before_request
+    def start_trace():
+        # Name the span by route pattern, and continue the caller's trace if it sent one
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.trace_span, g.trace_token = tracer.start_trace(
+            f"{request.method} {route}",
+            traceparent=request.headers.get("traceparent"),
+            attributes={"http.method": request.method, "http.route": route, "http.target": request.path}
+        )
+    
+    @app.after_request
+    def tag_response(response):
+        trace_span = g.get("trace_span")
+        if trace_span is not None:
+            trace_span.set_attribute("http.status_code", response.status_code)
+            response.headers["X-Trace-Id"] = trace_span.trace_id
+        return response
+    
+    @app.teardown_request
+    def end_trace(error=None):
+        tracer.end_trace(
+            g.pop("trace_span", None),
+            g.pop("trace_token", None),
+            f"{type(error).__name__}: {str(error)}" if error else None
+        )
\ No newline at end of file
@@ -5,6 +5,7 @@ import os
 
 from config import Config
 from api import register_routes
+from core.startup import get_startup
 from utils.validation import ValidationError
 
 def create_app():
@@ -48,4 +49,8 @@ if __name__ == "__main__":
     
     # Create and run the app
     app = create_app()
+    
+    # Warm up while the server starts, in the process that serves rather than the reloader; /ready tells when it is done
+    if not Config.DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        get_startup().warm_up_in_background()
     app.run(debug=Config.DEBUG, host="0.0.0.0", port=5000)
@@ -0,0 +1,222 @@
+"""
+Local stand-ins for the external services the app calls, for benchmarks.
+
+FakeGroqServer answers Groq's OpenAI-compatible chat completions API over
+HTTP with deterministic text, after a configurable latency and at a
+configurable token rate, so that the model call costs a known amount of
+wall time. InMemoryObjectStore implements the part of the Minio client
+that StorageService uses, keeping objects in memory.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from minio.error import S3Error
+
+WORDS = (
+    "the account settings page lets you change your password and review recent activity "
+    "support can help with billing invoices refunds shipping and data export requests "
+    "please check the order status first and contact an agent if the problem continues"
+).split()
+
+class FakeGroqServer:
+    """
+    A local chat completions server with deterministic responses.
+    
+    The response to a conversation depends only on its last message and
+    the model, so replays produce the same text. Each response takes
+    `latency` seconds plus one second per `token_rate` tokens, and is cut
+    off with finish_reason "length" when it exceeds the request's max_tokens.
+    """
+    
+    def __init__(self, latency: float = 0.2, token_rate: float = 500.0,
+                 min_tokens: int = 50, max_tokens: int = 400, port: int = 0):
+        """
+        Initialize the server.
+        
+        Args:
+            latency: Seconds before the first token
+            token_rate: Tokens generated per second, or 0 for no generation time
+            min_tokens: Smallest response, in tokens
+            max_tokens: Largest response, in tokens
+            port: Port to listen on, or 0 for any free port
+        """
+        self.latency = latency
+        self.token_rate = token_rate
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def base_url(self) -> str:
+        """The URL to set as GROQ_API_BASE."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-groq", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def complete(self, body: dict) -> dict:
+        """Build the chat completion for a request body, without waiting."""
+        messages = body.get("messages") or [{"content": ""}]
+        model = body.get("model", "")
+        seed = zlib.crc32(f"{model}\n{messages[-1].get('content', '')}".encode("utf-8"))
+        rng = random.Random(seed)
+        
+        tokens = rng.randint(self.min_tokens, self.max_tokens)
+        finish_reason = "stop"
+        limit = body.get("max_tokens")
+        if limit and tokens > limit:
+            tokens = limit
+            finish_reason = "length"
+        
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in messages)
+        return {
+            "id": f"chatcmpl-{hashlib.sha1(str(seed).encode()).hexdigest()[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(rng.choice(WORDS) for _ in range(tokens))},
+                "finish_reason": finish_reason,
+                "logprobs": None
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": tokens,
+                "total_tokens": prompt_tokens + tokens
+            }
+        }
+    
+    def _handler(self):
+        """Build the request handler class bound to this server."""
+        fake = self
+        
+        class ChatCompletionsHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                try:
+                    completion = fake.complete(json.loads(body))
+                except ValueError:
+                    self._reply(400, {"error": {"message": "Invalid JSON"}})
+                    return
+                
+                with fake._lock:
+                    fake.requests += 1
+                tokens = completion["usage"]["completion_tokens"]
+                time.sleep(fake.latency + (tokens / fake.token_rate if fake.token_rate else 0))
+                self._reply(200, completion)
+            
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return ChatCompletionsHandler
+
+class _StoredObject:
+    """Response of InMemoryObjectStore.get_object(), read like a urllib3 response."""
+    
+    def __init__(self, data: bytes):
+        self._data = data
+    
+    def read(self, amt=None):
+        data, self._data = (self._data, b"") if amt is None else (self._data[:amt], self._data[amt:])
+        return data
+    
+    def close(self):
+        pass
+    
+    def release_conn(self):
+        pass
+
+class InMemoryObjectStore:
+    """The part of the Minio client used by StorageService, keeping objects in memory."""
+    
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def bucket_exists(self, bucket_name):
+        return bucket_name in self._buckets
+    
+    def make_bucket(self, bucket_name):
+        with self._lock:
+            self._buckets.setdefault(bucket_name, {})
+    
+    def put_object(self, bucket_name, object_name, data, length, content_type="application/octet-stream",
+                   metadata=None):
+        content = data.read(length)
+        stat = SimpleNamespace(
+            object_name=object_name,
+            size=len(content),
+            content_type=content_type,
+            last_modified=datetime.now(timezone.utc),
+            etag=hashlib.md5(content).hexdigest(),
+            metadata=dict(metadata or {})
+        )
+        with self._lock:
+            self._bucket(bucket_name)[object_name] = (content, stat)
+        return stat
+    
+    def get_object(self, bucket_name, object_name):
+        return _StoredObject(self._object(bucket_name, object_name)[0])
+    
+    def stat_object(self, bucket_name, object_name):
+        return self._object(bucket_name, object_name)[1]
+    
+    def remove_object(self, bucket_name, object_name):
+        with self._lock:
+            self._bucket(bucket_name).pop(object_name, None)
+    
+    def list_objects(self, bucket_name, prefix=None, recursive=False):
+        with self._lock:
+            stats = [stat for name, (_, stat) in sorted(self._bucket(bucket_name).items())
+                     if not prefix or name.startswith(prefix)]
+        return iter(stats)
+    
+    def _bucket(self, bucket_name):
+        """Get the objects of a bucket."""
+        if bucket_name not in self._buckets:
+            raise S3Error("NoSuchBucket", "The specified bucket does not exist", f"/{bucket_name}",
+                          None, None, None, bucket_name)
+        return self._buckets[bucket_name]
+    
+    def _object(self, bucket_name, object_name):
+        """Get the content and stat of an object."""
+        with self._lock:
+            stored = self._bucket(bucket_name).get(object_name)
+        if stored is None:
+            raise S3Error("NoSuchKey", "The specified key does not exist", f"/{bucket_name}/{object_name}",
+                          None, None, None, bucket_name, object_name)
+        return stored
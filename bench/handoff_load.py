@@ -0,0 +1,102 @@
+"""
+Fire concurrent handoffs from several processes and check no agent is assigned twice.
+
+Each process has its own HumanAgentManager and routing index, like a
+gunicorn worker, and runs handoffs from a pool of threads.
+
+Usage:
+    python -m bench.handoff_load [--agents 500] [--handoffs 5000] [--processes 4] [--threads 16]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+from services.database import DatabaseManager
+from services.human_agent import HumanAgentManager
+from services.agent_index import AgentRoutingIndex
+
+def run_worker(args):
+    """Run a share of the handoffs in one process."""
+    db_path, conversation_ids, threads = args
+    db_manager = DatabaseManager(db_path)
+    manager = HumanAgentManager(db_manager, AgentRoutingIndex(db_manager))
+    
+    def handoff(conversation_id):
+        start = time.perf_counter()
+        result = manager.handoff_conversation(conversation_id, {"preferred_language": "en"}, queue=False)
+        return result["success"], time.perf_counter() - start
+    
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(handoff, conversation_ids))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=500)
+    parser.add_argument("--handoffs", type=int, default=5000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    
+    db_path = os.path.join(tempfile.mkdtemp(), "handoff_load.db")
+    db_manager = DatabaseManager(db_path)
+    
+    for i in range(args.agents):
+        db_manager.create_agent({
+            "name": f"Agent {i}",
+            "level": "senior",
+            "hourly_rate": 30.0,
+            "specialties": [],
+            "languages": ["en"],
+            "status": "available"
+        })
+    
+    conversation_ids = [
+        db_manager.create_conversation({
+            "user_id": f"user{i}",
+            "title": "Load test",
+            "model": "bench",
+            "language": "en"
+        })["id"]
+        for i in range(args.handoffs)
+    ]
+    
+    shares = [
+        (db_path, conversation_ids[i::args.processes], args.threads)
+        for i in range(args.processes)
+    ]
+    
+    start = time.perf_counter()
+    with Pool(args.processes) as pool:
+        results = [item for share in pool.map(run_worker, shares) for item in share]
+    elapsed = time.perf_counter() - start
+    
+    successes = sum(1 for success, _ in results if success)
+    latencies = sorted(latency for _, latency in results)
+    
+    with sqlite3.connect(db_path) as conn:
+        double_assigned = conn.execute(
+            """
+            SELECT agent_id, COUNT(*) FROM agent_conversations
+            WHERE status = 'active'
+            GROUP BY agent_id
+            HAVING COUNT(*) > 1
+            """
+        ).fetchall()
+        busy_agents = conn.execute("SELECT COUNT(*) FROM agents WHERE status = 'busy'").fetchone()[0]
+    
+    print(f"handoffs: {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.0f}/s)")
+    print(f"successful: {successes} (expected {min(args.agents, args.handoffs)})")
+    print(f"p50 latency: {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 latency: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"busy agents: {busy_agents}, double assignments: {len(double_assigned)}")
+    
+    if double_assigned or successes != busy_agents:
+        raise SystemExit("FAIL: an agent was assigned to more than one conversation")
+    print("OK")
+
+if __name__ == "__main__":
+    main()
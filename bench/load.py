@@ -0,0 +1,320 @@
+"""
+Replay recorded requests against the app and report latency, throughput and memory per endpoint.
+
+The app runs in process with a temporary SQLite database, an in-memory
+MinIO stand-in and a local fake Groq server (see bench.fakes), so results
+depend on the code and not on the network. Workloads are JSONL files with
+one request per line:
+
+    {"method": "POST", "path": "/api/chat", "json": {"user_id": "u1", "query": "..."}}
+    {"method": "GET", "path": "/api/agents/{agent_id}"}
+    {"method": "POST", "path": "/api/files", "file": {"name": "a.txt", "content_type": "text/plain", "data": "..."}}
+
+{agent_id}, {user_id}, {conversation_id} and {file_id} in paths are
+replaced with records seeded before the run. The workload is replayed
+from a pool of threads until --requests have been sent, after one
+untimed pass to warm up. Memory is measured in a separate sequential
+pass under tracemalloc, as the peak allocation of each request.
+
+With --save-baseline the results are written to a JSON file; with
+--baseline they are compared with one, and the run fails if an
+endpoint got slower, allocates more, or fails more often, beyond
+--tolerance.
+
+Usage:
+    python -m bench.load [--workload bench/workload.jsonl] [--requests 500] [--concurrency 8]
+                         [--latency 0.2] [--token-rate 500] [--save-baseline FILE] [--baseline FILE]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from werkzeug.exceptions import HTTPException
+
+from bench.fakes import FakeGroqServer, InMemoryObjectStore
+from config import Config
+
+DEFAULT_WORKLOAD = os.path.join(os.path.dirname(__file__), "workload.jsonl")
+
+def load_workload(path):
+    """Load the requests of a workload file."""
+    with open(path, encoding="utf-8") as workload_file:
+        return [json.loads(line) for line in workload_file if line.strip()]
+
+def configure(data_dir, groq_base_url):
+    """Point the app's services at the local stand-ins, before any of them is created."""
+    Config.DATABASE_PATH = os.path.join(data_dir, "bench.db")
+    Config.GROQ_API_BASE = groq_base_url
+    Config.GROQ_API_KEY = Config.GROQ_API_KEY or "bench"
+    
+    import core.storage
+    from core.storage import StorageService
+    core.storage._storage_service_instance = StorageService(client=InMemoryObjectStore())
+
+def seed(args):
+    """Create the records that workload paths refer to."""
+    from core.storage import get_storage_service
+    from services.database import get_db_manager
+    
+    db_manager = get_db_manager()
+    storage = get_storage_service()
+    rng = random.Random(args.seed)
+    
+    agent_ids = [
+        agent["id"] for agent in db_manager.create_agents([
+            {
+                "agent_id": f"bench-agent-{i}",
+                "name": f"Agent {i}",
+                "level": rng.choice(["junior", "senior", "expert"]),
+                "hourly_rate": 30.0,
+                "specialties": [],
+                "languages": ["en", "fa"],
+                "status": "available"
+            }
+            for i in range(args.agents)
+        ])
+    ]
+    
+    user_ids = [f"bench-user-{i}" for i in range(args.users)]
+    conversation_ids = []
+    for user_id in user_ids:
+        conversation_id = db_manager.create_conversation({
+            "user_id": user_id,
+            "title": "Benchmark conversation",
+            "model": "llama",
+            "language": "en"
+        })["id"]
+        for i in range(args.messages):
+            db_manager.create_message({
+                "conversation_id": conversation_id,
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": f"Benchmark message {i}"
+            })
+        conversation_ids.append(conversation_id)
+    
+    file_ids = [
+        storage.upload_file(f"Benchmark file {i}\n".encode("utf-8") * 100, "text/plain")["id"]
+        for i in range(args.files)
+    ]
+    
+    return {
+        "agent_id": agent_ids,
+        "user_id": user_ids,
+        "conversation_id": conversation_ids,
+        "file_id": file_ids
+    }
+
+class Replayer:
+    """Sends workload requests to the app through per-thread test clients."""
+    
+    def __init__(self, app, fixtures, seed):
+        self.app = app
+        self.fixtures = fixtures
+        self._adapter = app.url_map.bind("localhost")
+        self._local = threading.local()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+    
+    def endpoint(self, entry):
+        """Get the route pattern an entry is served by, such as "GET /api/agents/<agent_id>"."""
+        method = entry.get("method", "GET").upper()
+        try:
+            rule, _ = self._adapter.match(entry["path"].split("?")[0], method=method, return_rule=True)
+            return f"{method} {rule.rule}"
+        except HTTPException:
+            return f"{method} unmatched"
+    
+    def send(self, entry):
+        """
+        Send one request.
+        
+        Returns:
+            Tuple[int, int]: The status code and response size in bytes
+        """
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        
+        with self._rng_lock:
+            path = entry["path"].format_map({name: self._rng.choice(values) if values else ""
+                                             for name, values in self.fixtures.items()})
+        
+        kwargs = {"method": entry.get("method", "GET").upper(), "headers": entry.get("headers")}
+        if "file" in entry:
+            file = entry["file"]
+            kwargs["data"] = {"file": (BytesIO(file["data"].encode("utf-8")), file["name"],
+                                       file.get("content_type", "application/octet-stream"))}
+            kwargs["content_type"] = "multipart/form-data"
+        elif "json" in entry:
+            kwargs["json"] = entry["json"]
+        
+        response = client.open(path, **kwargs)
+        size = len(response.get_data())
+        response.close()
+        return response.status_code, size
+
+def percentile(sorted_values, fraction):
+    """Get a percentile of sorted values by nearest rank."""
+    return sorted_values[max(0, int(round(len(sorted_values) * fraction)) - 1)]
+
+def run_load(replayer, workload, requests, concurrency):
+    """Replay the workload from a pool of threads and collect latencies per endpoint."""
+    entries = [workload[i % len(workload)] for i in range(requests)]
+    endpoints = [replayer.endpoint(entry) for entry in entries]
+    
+    def timed_send(entry):
+        start = time.perf_counter()
+        try:
+            status, size = replayer.send(entry)
+        except Exception as e:
+            print(f"Error replaying {entry.get('method', 'GET')} {entry['path']}: {str(e)}")
+            status, size = 599, 0
+        return status, size, time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed_send, entries))
+    elapsed = time.perf_counter() - start
+    
+    by_endpoint = defaultdict(list)
+    for endpoint, result in zip(endpoints, results):
+        by_endpoint[endpoint].append(result)
+    return by_endpoint, elapsed
+
+def measure_memory(replayer, workload):
+    """Replay the workload once, sequentially, recording the peak allocation of each request."""
+    peaks = defaultdict(list)
+    tracemalloc.start()
+    try:
+        for entry in workload:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            try:
+                replayer.send(entry)
+            except Exception:
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+            peaks[replayer.endpoint(entry)].append((peak - current) / 1024)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def summarize(by_endpoint, elapsed, peaks):
+    """Summarize the results of each endpoint, and of all of them as "all"."""
+    by_endpoint = dict(by_endpoint, all=[result for results in by_endpoint.values() for result in results])
+    peaks = dict(peaks, all=[peak for values in peaks.values() for peak in values])
+    
+    summary = {}
+    for endpoint, results in by_endpoint.items():
+        latencies = sorted(latency * 1000 for _, _, latency in results)
+        endpoint_peaks = peaks.get(endpoint)
+        summary[endpoint] = {
+            "requests": len(results),
+            "errors": sum(1 for status, _, _ in results if status >= 500),
+            "throughput_rps": len(results) / elapsed,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "response_bytes": sum(size for _, size, _ in results) / len(results),
+            "peak_kib": max(endpoint_peaks) if endpoint_peaks else 0.0
+        }
+    return summary
+
+def compare(summary, baseline, tolerance, min_delta_ms):
+    """
+    Compare results with a baseline.
+    
+    Latency and memory regress when they grow by more than `tolerance`,
+    latency also by more than `min_delta_ms` so that jitter on fast
+    endpoints is ignored. Throughput regresses when it drops by more than
+    `tolerance`, and errors when there are more than in the baseline.
+    
+    Returns:
+        List[str]: A description of each regression
+    """
+    regressions = []
+    for endpoint, base in baseline.items():
+        current = summary.get(endpoint)
+        if current is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if current[key] > base[key] * (1 + tolerance) and current[key] - base[key] > min_delta_ms:
+                regressions.append(f"{endpoint}: {key} {base[key]:.1f} -> {current[key]:.1f}")
+        if current["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: peak_kib {base['peak_kib']:.0f} -> {current['peak_kib']:.0f}")
+        if endpoint == "all" and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: throughput_rps {base['throughput_rps']:.1f} -> "
+                               f"{current['throughput_rps']:.1f}")
+        if current["errors"] / current["requests"] > base["errors"] / base["requests"]:
+            regressions.append(f"{endpoint}: errors {base['errors']}/{base['requests']} -> "
+                               f"{current['errors']}/{current['requests']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the fake model's first token")
+    parser.add_argument("--token-rate", type=float, default=500, help="Tokens per second of the fake model")
+    parser.add_argument("--min-tokens", type=int, default=50)
+    parser.add_argument("--max-tokens", type=int, default=400)
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    
+    workload = load_workload(args.workload)
+    fake_groq = FakeGroqServer(args.latency, args.token_rate, args.min_tokens, args.max_tokens).start()
+    
+    with tempfile.TemporaryDirectory() as data_dir:
+        configure(data_dir, fake_groq.base_url)
+        fixtures = seed(args)
+        
+        from app import create_app
+        replayer = Replayer(create_app(), fixtures, args.seed)
+        
+        # Load tokenizers, models and caches before timing
+        for entry in workload:
+            replayer.send(entry)
+        
+        by_endpoint, elapsed = run_load(replayer, workload, args.requests, args.concurrency)
+        peaks = measure_memory(replayer, workload)
+    fake_groq.stop()
+    
+    summary = summarize(by_endpoint, elapsed, peaks)
+    print(f"{args.requests} requests in {elapsed:.2f}s with {args.concurrency} threads, "
+          f"{fake_groq.requests} model calls")
+    print(f"{'endpoint':<48}{'n':>6}{'err':>5}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak KiB':>10}")
+    for endpoint, result in sorted(summary.items(), key=lambda item: item[0] == "all"):
+        print(f"{endpoint[:47]:<48}{result['requests']:>6}{result['errors']:>5}{result['throughput_rps']:>8.1f}"
+              f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['peak_kib']:>10.0f}")
+    
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(summary, baseline_file, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.save_baseline}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare(summary, json.load(baseline_file), args.tolerance, args.min_delta_ms)
+        if regressions:
+            raise SystemExit("FAIL: regressions against the baseline\n" + "\n".join(regressions))
+        print("OK: no regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare single-pass response post-processing with one regex pass per step.
+
+Each response has a reasoning section, trailing spaces, runs of blank
+lines and excluded words. The per-step variant runs the same patterns
+as the pipeline one after another, so both produce the same text. The
+streaming variant feeds the response in small deltas and checks that
+its output matches the single pass.
+
+Usage:
+    python -m bench.postprocess [--responses 2000] [--delta-chars 4]
+"""
+import argparse
+import re
+import time
+
+from utils.postprocess import get_post_processor, PERSIAN_CHARACTERS, _THINK, _TRAILING_SPACE, _EXTRA_NEWLINE
+
+EXCLUSION_WORDS = ["latency", "guarantee"]
+
+def build_response(persian):
+    """Build a response the way reasoning models format them."""
+    reasoning = "<think>" + "Let me reason about this carefully. " * 40 + "</think>\n\n"
+    if persian:
+        line = "پاسخ این است که caching به کاهش latency کمک می‌کند.  \n"
+    else:
+        line = "The answer is that caching helps.  \nIt reduces latency by avoiding repeated work.\n\n\n"
+    return reasoning + line * 30
+
+def per_step(persian):
+    """Build a function running each post-processing step as its own pass."""
+    words = "|".join(EXCLUSION_WORDS)
+    steps = [_THINK, rf"[ \t]*(?<!\w)(?i:{words})(?!\w)"]
+    if persian:
+        steps.append(rf"[ \t]*(?:[^{PERSIAN_CHARACTERS}\s<]|<(?!(?:think|thinking)>))+")
+    steps.extend(["|".join(_TRAILING_SPACE), _EXTRA_NEWLINE])
+    patterns = [re.compile(step) for step in steps]
+    
+    def process(text):
+        for pattern in patterns:
+            text = pattern.sub("", text)
+        return text.strip()
+    
+    return process
+
+def stream(processor, text, delta_chars):
+    """Post-process a response fed in deltas."""
+    streaming = processor.stream()
+    output = [streaming.feed(text[i:i + delta_chars]) for i in range(0, len(text), delta_chars)]
+    output.append(streaming.flush())
+    return "".join(output)
+
+def timed(function, repeat):
+    """Get the mean microseconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=2000)
+    parser.add_argument("--delta-chars", type=int, default=4)
+    args = parser.parse_args()
+    
+    print(f"{'language':<10}{'chars':>8}{'per step us':>14}{'single us':>12}{'stream us/delta':>18}{'same':>6}")
+    for language, persian in (("english", False), ("persian", True)):
+        text = build_response(persian)
+        processor = get_post_processor(persian_only=persian, exclusion_words=EXCLUSION_WORDS)
+        steps = per_step(persian)
+        expected = processor.process(text)
+        same = steps(text) == expected and stream(processor, text, args.delta_chars) == expected
+        
+        step_us = timed(lambda: steps(text), args.responses)
+        single_us = timed(lambda: processor.process(text), args.responses)
+        deltas = -(-len(text) // args.delta_chars)
+        stream_us = timed(lambda: stream(processor, text, args.delta_chars), max(1, args.responses // 10)) / deltas
+        print(f"{language:<10}{len(text):>8}{step_us:>14.1f}{single_us:>12.1f}{stream_us:>18.2f}{str(same):>6}")
+
+if __name__ == "__main__":
+    main()
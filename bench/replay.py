@@ -0,0 +1,142 @@
+"""
+Re-issue recorded requests against a running server at their original or a scaled rate.
+
+Reads the files written with RECORD_REQUESTS=true, including rotated and
+per-worker ones, and sends each request at its recorded offset from the
+first one, divided by --speed. Run it against gunicorn with different
+GUNICORN_WORKERS to find the count at which latency holds up: when the
+server falls behind, latency grows, and when the client does, the
+schedule slip does.
+
+Point GROQ_API_BASE of the server at `python -m bench.replay --fake-groq`
+to replay without calling Groq.
+
+Usage:
+    python -m bench.replay FILE [FILE ...] [--url http://localhost:5000] [--speed 1.0] [--max-in-flight 64]
+    python -m bench.replay --fake-groq [--port 8081] [--latency 0.2] [--token-rate 500]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.fakes import FakeGroqServer
+
+def load_records(paths):
+    """Load recorded requests from several files, in the order they were received."""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as record_file:
+            records.extend(json.loads(line) for line in record_file if line.strip())
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+def percentile(sorted_values, fraction):
+    """Get a percentile of sorted values by nearest rank."""
+    return sorted_values[max(0, int(round(len(sorted_values) * fraction)) - 1)]
+
+def replay(records, url, speed, max_in_flight, timeout):
+    """
+    Send records on their recorded schedule.
+    
+    Returns:
+        Tuple[List[Dict], float]: Per request, its route, status, latency and how late
+            it was sent; and the seconds the replay took
+    """
+    local = threading.local()
+    
+    def send(record, due):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        slip = time.perf_counter() - due
+        start = time.perf_counter()
+        try:
+            response = session.request(record["method"], url + record["path"], json=record.get("json"),
+                                       timeout=timeout)
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        return {
+            "route": f"{record['method']} {record.get('route', record['path'])}",
+            "status": status,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "recorded_ms": record.get("duration_ms"),
+            "slip_ms": slip * 1000
+        }
+    
+    first_ts = records[0]["ts"]
+    start = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for record in records:
+            due = start + (record["ts"] - first_ts) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(send, record, due))
+    return [future.result() for future in futures], time.perf_counter() - start
+
+def report(results, elapsed, records):
+    """Print throughput, latency against the recorded latency, and schedule slip per route."""
+    recorded_span = records[-1]["ts"] - records[0]["ts"]
+    print(f"{len(results)} requests in {elapsed:.1f}s ({len(results) / elapsed:.1f}/s), "
+          f"recorded over {recorded_span:.1f}s ({len(records) / max(recorded_span, 1e-9):.1f}/s)")
+    statuses = Counter(result["status"] for result in results)
+    print("statuses: " + ", ".join(f"{status or 'failed'}: {count}" for status, count in sorted(statuses.items())))
+    
+    by_route = defaultdict(list)
+    for result in results:
+        by_route[result["route"]].append(result)
+    
+    print(f"{'route':<40}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rec p50':>9}{'rec p95':>9}{'slip p95':>10}")
+    for route, route_results in sorted(by_route.items()):
+        latencies = sorted(result["latency_ms"] for result in route_results)
+        recorded = sorted(result["recorded_ms"] for result in route_results if result["recorded_ms"] is not None)
+        slips = sorted(result["slip_ms"] for result in route_results)
+        recorded_p50 = f"{statistics.median(recorded):>9.1f}" if recorded else f"{'-':>9}"
+        recorded_p95 = f"{percentile(recorded, 0.95):>9.1f}" if recorded else f"{'-':>9}"
+        print(f"{route[:39]:<40}{len(route_results):>6}{statistics.median(latencies):>9.1f}"
+              f"{percentile(latencies, 0.95):>9.1f}{percentile(latencies, 0.99):>9.1f}"
+              f"{recorded_p50}{recorded_p95}{percentile(slips, 0.95):>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay rate relative to the recorded rate")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--fake-groq", action="store_true", help="Serve a fake Groq API instead of replaying")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=500)
+    args = parser.parse_args()
+    
+    if args.fake_groq:
+        server = FakeGroqServer(args.latency, args.token_rate, port=args.port).start()
+        print(f"Fake Groq API on {server.base_url}; set GROQ_API_BASE={server.base_url} on the server")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
+        return
+    
+    if not args.files:
+        parser.error("no recorded request files given")
+    records = load_records(args.files)[:args.limit]
+    if not records:
+        raise SystemExit("No recorded requests to replay")
+    
+    results, elapsed = replay(records, args.url.rstrip("/"), args.speed, args.max_in_flight, args.timeout)
+    report(results, elapsed, records)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Measure allocations and memory of response chunks while streaming many responses at once.
+
+The first part holds every chunk of the concurrent responses in memory,
+with the old dict-carrying ResponseChunk and with the slotted one. The
+second part streams the responses through StreamingChunkers fed with
+interleaved token deltas, as a server would. It is timed without
+tracing, and its memory is traced over the first paragraph only, since
+a chunker never holds more than the chunk it is building.
+
+Usage:
+    python -m bench.response_chunks [--responses 10000] [--chunks 8]
+"""
+import argparse
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from utils.response import ResponseChunk, ChunkingStrategy, StreamingChunker, typing_delay
+
+SENTENCE = "The quick brown fox jumps over the lazy dog near the river bank. "
+
+@dataclass
+class LegacyResponseChunk:
+    """ResponseChunk as it was before its metadata became computed properties."""
+    content: str
+    sequence: int
+    total_chunks: Optional[int]
+    metadata: Dict
+
+def legacy_chunk(content, sequence, total_chunks):
+    """Build a chunk the way the old chunker did."""
+    return LegacyResponseChunk(
+        content=content,
+        sequence=sequence,
+        total_chunks=total_chunks,
+        metadata={
+            "is_first": sequence == 1,
+            "is_last": sequence == total_chunks,
+            "progress": sequence / total_chunks,
+            "pacing_delay": typing_delay(content)
+        }
+    )
+
+def slotted_chunk(content, sequence, total_chunks):
+    """Build a chunk with the current representation."""
+    return ResponseChunk(content, sequence, total_chunks)
+
+def measure(build):
+    """Run `build` under tracemalloc and return its result, live blocks, live bytes, peak bytes and seconds."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    stats = snapshot.statistics("filename")
+    return result, sum(stat.count for stat in stats), sum(stat.size for stat in stats), peak, elapsed
+
+def hold_chunks(factory, responses, chunks):
+    """Build and keep every chunk of every response."""
+    content = SENTENCE * 3
+    return [
+        [factory(content, sequence, chunks) for sequence in range(1, chunks + 1)]
+        for _ in range(responses)
+    ]
+
+def stream(responses, chunks, paragraphs=None):
+    """Stream the responses through chunkers, one token delta per response in turn."""
+    text = (SENTENCE * 3 + "\n\n") * chunks
+    deltas = [text[i:i + 4] for i in range(0, len(text), 4)]
+    if paragraphs is not None:
+        deltas = deltas[:len(deltas) * paragraphs // chunks]
+    chunkers = [StreamingChunker(ChunkingStrategy.SMART) for _ in range(responses)]
+    sent = 0
+    
+    for delta in deltas:
+        for chunker in chunkers:
+            sent += len(chunker.feed(delta))
+    for chunker in chunkers:
+        sent += len(chunker.flush())
+    
+    return sent, len(deltas) * responses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=10000)
+    parser.add_argument("--chunks", type=int, default=8)
+    args = parser.parse_args()
+    
+    print(f"Holding {args.chunks} chunks for each of {args.responses} responses")
+    print(f"{'representation':<16}{'live blocks':>14}{'live MiB':>10}{'peak MiB':>10}{'seconds':>10}")
+    for name, factory in (("dict metadata", legacy_chunk), ("slotted", slotted_chunk)):
+        _, blocks, size, peak, elapsed = measure(lambda: hold_chunks(factory, args.responses, args.chunks))
+        print(f"{name:<16}{blocks:>14,}{size / 2 ** 20:>10.1f}{peak / 2 ** 20:>10.1f}{elapsed:>10.2f}")
+    
+    print()
+    print(f"Streaming {args.responses} concurrent responses of {args.chunks} paragraphs")
+    start = time.perf_counter()
+    sent, deltas = stream(args.responses, args.chunks)
+    elapsed = time.perf_counter() - start
+    print(f"chunks sent: {sent:,}, deltas: {deltas:,}, {elapsed / deltas * 1e6:.2f} us/delta")
+    
+    _, blocks, size, peak, _ = measure(lambda: stream(args.responses, args.chunks, paragraphs=1))
+    print(f"first paragraph traced: live blocks: {blocks:,}, peak MiB: {peak / 2 ** 20:.1f}")
+
+if __name__ == "__main__":
+    main()
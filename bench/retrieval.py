@@ -0,0 +1,114 @@
+"""
+Compare latency and hit rate of vector, lexical and hybrid retrieval.
+
+Usage:
+    python -m bench.retrieval [--documents 2000] [--queries 200] [--limit 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from services.knowledge_base import KnowledgeBase, SearchMode
+
+TOPICS = [
+    "billing and invoices", "password reset", "shipping delays", "refund policy",
+    "API rate limits", "mobile app login", "two-factor authentication", "data export",
+]
+
+PERSIAN_TOPICS = [
+    "بازگشت وجه", "پیگیری سفارش", "تغییر رمز عبور", "ارسال کالا", "پشتیبانی فنی",
+]
+
+def build_corpus(size, rng):
+    """Build a synthetic corpus and the queries that should retrieve each document."""
+    documents = []
+    queries = []
+    
+    for i in range(size):
+        kind = i % 4
+        topic = rng.choice(TOPICS)
+        
+        if kind == 0:
+            code = f"PX-{1000 + i}"
+            text = f"Product {code} covers {topic}. Contact support if {code} is out of stock."
+            query = code
+        elif kind == 1:
+            error = f"ERR_{rng.choice(['CONN', 'AUTH', 'QUOTA'])}_{i}"
+            text = f"The error {error} appears when {topic} fails. Retry after a few minutes."
+            query = error
+        elif kind == 2:
+            topic = rng.choice(PERSIAN_TOPICS)
+            text = f"راهنمای {topic} برای مشتریان شماره {i}: لطفا مراحل را به ترتیب انجام دهید."
+            query = f"{topic} شماره {i}"
+        else:
+            text = f"Frequently asked question {i}: how do I handle {topic} for my account?"
+            query = f"help with {topic} question {i}"
+        
+        documents.append((text, i))
+        queries.append((query, i))
+    
+    return documents, queries
+
+def load(knowledge_base, documents, data_dir):
+    """Ingest the corpus through a SQLite database, as an external source would be."""
+    path = os.path.join(data_dir, "corpus.db")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE documents (content TEXT, bench_id INTEGER)")
+        conn.executemany("INSERT INTO documents VALUES (?, ?)", documents)
+    conn.close()
+    return knowledge_base.ingest_external_db(
+        f"sqlite:///{path}", "SELECT content, bench_id FROM documents", ["bench_id"], batch_size=500
+    )
+
+def run(mode, knowledge_base, queries, limit):
+    """Run all queries in one retrieval mode."""
+    latencies = []
+    hits = 0
+    
+    for query, expected_id in queries:
+        start = time.perf_counter()
+        docs = knowledge_base.search_knowledge_base(query, limit=limit, mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        
+        if any(doc.metadata.get("bench_id") == expected_id for doc in docs):
+            hits += 1
+    
+    latencies.sort()
+    return {
+        "mode": mode.value,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "hit_rate": hits / len(queries)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    documents, queries = build_corpus(args.documents, rng)
+    queries = rng.sample(queries, min(args.queries, len(queries)))
+    
+    knowledge_base = KnowledgeBase()
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        loaded = load(knowledge_base, documents, data_dir)
+        print(f"Loaded {loaded['documents']} documents in {loaded['batches']} batches "
+              f"in {time.perf_counter() - start:.1f}s")
+    
+    print(f"{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'hit rate':>10}")
+    for mode in SearchMode:
+        result = run(mode, knowledge_base, queries, args.limit)
+        print(f"{result['mode']:<10}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['hit_rate']:>10.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure how long a fresh worker takes to import the app and serve its first requests.
+
+Each measurement runs in a new interpreter, as a newly started worker
+would, with the stand-ins of bench.load (temporary SQLite, in-memory
+MinIO and a fake Groq server without latency). Three scenarios:
+
+    import   import app and create it; which heavy libraries were imported
+    cold     first and second /api/chat without warming up, as before preloading
+    warm     warm-up steps, then first and second /api/chat, as after a preloaded fork
+
+Usage:
+    python -m bench.startup [--repeat 3]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ["transformers", "langchain", "langchain_groq", "faiss", "tiktoken", "minio", "sqlalchemy", "torch"]
+
+CHAT_REQUEST = {"user_id": "startup-user", "query": "How do I reset my password?", "model_name": "llama"}
+
+def measure(scenario):
+    """Run one scenario in this process and return its timings in seconds."""
+    result = {}
+    start = time.perf_counter()
+    import app
+    result["import_app"] = time.perf_counter() - start
+    result["heavy_modules"] = [name for name in HEAVY_MODULES if name in sys.modules]
+    
+    # Imported after the app, since the MinIO stand-in imports minio
+    from bench.fakes import FakeGroqServer
+    from bench.load import configure
+    
+    fake_groq = FakeGroqServer(latency=0, token_rate=0).start()
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        flask_app = app.create_app()
+        result["create_app"] = time.perf_counter() - start
+        
+        # After create_app, as a preloaded master would, but before any service is built
+        configure(data_dir, fake_groq.base_url)
+        client = flask_app.test_client()
+        
+        start = time.perf_counter()
+        client.get("/ready")
+        result["first_ready"] = time.perf_counter() - start
+        
+        if scenario == "warm":
+            from core.startup import get_startup
+            startup = get_startup()
+            start = time.perf_counter()
+            startup.warm_up()
+            result["warm_up"] = time.perf_counter() - start
+            for name, status in startup.status()["steps"].items():
+                result[f"warm_up.{name}"] = status["seconds"]
+        
+        if scenario in ("cold", "warm"):
+            for label in ("first_chat", "second_chat"):
+                start = time.perf_counter()
+                response = client.post("/api/chat", json=CHAT_REQUEST)
+                result[label] = time.perf_counter() - start
+                if response.status_code != 200:
+                    result[f"{label}_error"] = response.get_json()
+    fake_groq.stop()
+    return result
+
+def run_child(scenario):
+    """Run a scenario in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child", scenario],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=["import", "cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        print(json.dumps(measure(args.child)))
+        return
+    
+    for scenario in ("import", "cold", "warm"):
+        runs = [run_child(scenario) for _ in range(args.repeat)]
+        print(f"\n{scenario} (median of {args.repeat})")
+        for key, value in runs[0].items():
+            if isinstance(value, float):
+                print(f"  {key:<28}{statistics.median(run[key] for run in runs) * 1000:>10.1f} ms")
+            else:
+                print(f"  {key:<28}{value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Show the slowest traced requests as span trees.
+
+Reads the OTLP JSON lines written with TRACE_EXPORTER=file. With --serve
+it instead stands in for a local OTLP/HTTP collector: point the app at it
+with TRACE_EXPORTER=otlp and TRACE_OTLP_ENDPOINT=http://localhost:4318/v1/traces
+and it appends what it receives to the same file format.
+
+Usage:
+    python -m bench.traces [--file traces.jsonl] [--slowest 5] [--trace-id ID] [--user-id ID]
+    python -m bench.traces --serve [--port 4318] [--file traces.jsonl]
+"""
+import argparse
+import json
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def load_spans(path):
+    """Load every span of a trace file, with attributes as a plain dict."""
+    spans = []
+    with open(path, encoding="utf-8") as trace_file:
+        for line in trace_file:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line).get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for span in scope_spans.get("spans", []):
+                        span["attributes"] = {
+                            attribute["key"]: next(iter(attribute["value"].values()), None)
+                            for attribute in span.get("attributes", [])
+                        }
+                        span["duration_ms"] = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+                        spans.append(span)
+    return spans
+
+def print_tree(span, children, depth=0):
+    """Print a span and its children in start order, with the time not spent in children."""
+    own_children = sorted(children.get(span["spanId"], []), key=lambda child: int(child["startTimeUnixNano"]))
+    self_ms = span["duration_ms"] - sum(child["duration_ms"] for child in own_children)
+    detail = span["attributes"].get("db.statement") or span["attributes"].get("model") or ""
+    error = " ERROR" if span.get("status", {}).get("code") == 2 else ""
+    print(f"{span['duration_ms']:>10.2f} ms {max(self_ms, 0):>10.2f} ms  {'  ' * depth}{span['name']}{error}"
+          f"{'  ' + detail[:80] if detail else ''}")
+    for child in own_children:
+        print_tree(child, children, depth + 1)
+
+def report(args):
+    """Print the slowest matching requests."""
+    spans = load_spans(args.file)
+    children = defaultdict(list)
+    by_id = {}
+    for span in spans:
+        by_id[span["spanId"]] = span
+        if span.get("parentSpanId"):
+            children[span["parentSpanId"]].append(span)
+    
+    roots = [span for span in spans if span.get("parentSpanId") not in by_id]
+    if args.trace_id:
+        roots = [span for span in roots if span["traceId"] == args.trace_id]
+    if args.user_id:
+        # Requests in which any span is tagged with the user
+        traces = {span["traceId"] for span in spans if str(span["attributes"].get("user_id")) == args.user_id}
+        roots = [span for span in roots if span["traceId"] in traces]
+    
+    roots.sort(key=lambda span: span["duration_ms"], reverse=True)
+    print(f"{len(spans)} spans, {len(roots)} matching requests")
+    for root in roots[:args.slowest]:
+        print(f"\ntrace {root['traceId']}")
+        print(f"{'total':>13} {'self':>13}  span")
+        print_tree(root, children)
+
+def serve(args):
+    """Accept OTLP/HTTP JSON exports and append them to the trace file."""
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                line = json.dumps(json.loads(body), separators=(",", ":"))
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            with open(args.file, "a", encoding="utf-8") as trace_file:
+                trace_file.write(line + "\n")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+        
+        def log_message(self, format, *log_args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), CollectorHandler)
+    print(f"Collecting traces on http://127.0.0.1:{args.port}/v1/traces into {args.file}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default="traces.jsonl")
+    parser.add_argument("--slowest", type=int, default=5)
+    parser.add_argument("--trace-id")
+    parser.add_argument("--user-id")
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--port", type=int, default=4318)
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve(args)
+    else:
+        report(args)
+
+if __name__ == "__main__":
+    main()
@@ -15,9 +15,87 @@ class Config:
     # API Keys and Tokens
     HUGGINGFACE_TOKEN = os.getenv('HUGGINGFACE_TOKEN')
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+    GROQ_API_BASE = os.getenv('GROQ_API_BASE')  # Groq's own API unless set, such as to bench's fake server
     
     # Database Configuration
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'chat_history.db')
+    DATABASE_TIMEOUT = float(os.getenv('DATABASE_TIMEOUT', '30'))
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '8'))
+    DATABASE_BUSY_RETRIES = int(os.getenv('DATABASE_BUSY_RETRIES', '3'))
+    DATABASE_BUSY_BACKOFF = float(os.getenv('DATABASE_BUSY_BACKOFF', '0.05'))
+    DATABASE_JOURNAL_MODE = os.getenv('DATABASE_JOURNAL_MODE', 'WAL')
+    
+    # Redis Configuration (shared state across workers, in-process fallbacks when unset)
+    REDIS_URL = os.getenv('REDIS_URL', '')
+    
+    # Knowledge Base
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '1024'))
+    
+    # Retrieval-Augmented Generation
+    RAG_TOP_K = int(os.getenv('RAG_TOP_K', '4'))
+    RAG_TOKEN_BUDGET = int(os.getenv('RAG_TOKEN_BUDGET', '1200'))
+    RAG_TIMEOUT = float(os.getenv('RAG_TIMEOUT', '5'))
+    FILE_CONTEXT_TOKEN_BUDGET = int(os.getenv('FILE_CONTEXT_TOKEN_BUDGET', '2000'))
+    
+    # Response Length Estimation
+    LENGTH_ESTIMATE_MIN_OBSERVATIONS = int(os.getenv('LENGTH_ESTIMATE_MIN_OBSERVATIONS', '20'))
+    MAX_TOKENS_HEADROOM = float(os.getenv('MAX_TOKENS_HEADROOM', '1.5'))
+    MAX_TOKENS_FLOOR = int(os.getenv('MAX_TOKENS_FLOOR', '256'))
+    MAX_TOKENS_CEILING = int(os.getenv('MAX_TOKENS_CEILING', '4096'))
+    
+    # Knowledge Base Ingestion
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+    BLOG_PAGE_SIZE = int(os.getenv('BLOG_PAGE_SIZE', '100'))
+    BLOG_FETCH_CONCURRENCY = int(os.getenv('BLOG_FETCH_CONCURRENCY', '8'))
+    EXTERNAL_DB_BATCH_SIZE = int(os.getenv('EXTERNAL_DB_BATCH_SIZE', '500'))
+    INGEST_PREFETCH_BATCHES = int(os.getenv('INGEST_PREFETCH_BATCHES', '2'))
+    
+    # Human Agents
+    AGENT_INDEX_REFRESH_SECONDS = float(os.getenv('AGENT_INDEX_REFRESH_SECONDS', '2'))
+    HANDOFF_CLAIM_ATTEMPTS = int(os.getenv('HANDOFF_CLAIM_ATTEMPTS', '5'))
+    HANDOFF_CANDIDATE_POOL = int(os.getenv('HANDOFF_CANDIDATE_POOL', '3'))
+    HANDOFF_LOAD_WINDOW_SECONDS = float(os.getenv('HANDOFF_LOAD_WINDOW_SECONDS', '3600'))
+    HANDOFF_WEIGHT_LOAD = float(os.getenv('HANDOFF_WEIGHT_LOAD', '0.5'))
+    HANDOFF_WEIGHT_RATING = float(os.getenv('HANDOFF_WEIGHT_RATING', '0.3'))
+    HANDOFF_WEIGHT_COST = float(os.getenv('HANDOFF_WEIGHT_COST', '0.2'))
+    HANDOFF_DISPATCH_INTERVAL = float(os.getenv('HANDOFF_DISPATCH_INTERVAL', '2'))
+    HANDOFF_DISPATCH_TIMEOUT = float(os.getenv('HANDOFF_DISPATCH_TIMEOUT', '60'))
+    PRESENCE_TIMEOUT_SECONDS = float(os.getenv('PRESENCE_TIMEOUT_SECONDS', '60'))
+    PRESENCE_SWEEP_INTERVAL = float(os.getenv('PRESENCE_SWEEP_INTERVAL', '10'))
+    PRESENCE_SWEEP_BATCH_SIZE = int(os.getenv('PRESENCE_SWEEP_BATCH_SIZE', '500'))
+    AGENT_CACHE_SIZE = int(os.getenv('AGENT_CACHE_SIZE', '10000'))
+    AGENT_CACHE_TTL_SECONDS = float(os.getenv('AGENT_CACHE_TTL_SECONDS', '30'))
+    
+    # Billing
+    BILLING_EXPORT_BATCH_SIZE = int(os.getenv('BILLING_EXPORT_BATCH_SIZE', '1000'))
+    
+    # Agent Events
+    EVENT_CHANNEL = os.getenv('EVENT_CHANNEL', 'agent-events')
+    EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', '1000'))
+    EVENT_KEEPALIVE_SECONDS = float(os.getenv('EVENT_KEEPALIVE_SECONDS', '15'))
+    
+    # Tracing (disabled unless TRACE_EXPORTER is 'file' or 'otlp')
+    TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', '').lower()
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+    TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+    TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'parviz-mind')
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1'))
+    TRACE_QUEUE_SIZE = int(os.getenv('TRACE_QUEUE_SIZE', '10000'))
+    TRACE_BATCH_SIZE = int(os.getenv('TRACE_BATCH_SIZE', '512'))
+    TRACE_EXPORT_INTERVAL = float(os.getenv('TRACE_EXPORT_INTERVAL', '2'))
+    
+    # Request Recording (for replay with bench.replay)
+    RECORD_REQUESTS = os.getenv('RECORD_REQUESTS', 'False').lower() == 'true'
+    RECORD_FILE = os.getenv('RECORD_FILE', 'recorded_requests.jsonl')
+    RECORD_PATHS = [path.strip() for path in os.getenv('RECORD_PATHS', '/api/chat').split(',') if path.strip()]
+    RECORD_SAMPLE_RATE = float(os.getenv('RECORD_SAMPLE_RATE', '1'))
+    RECORD_MAX_BYTES = int(os.getenv('RECORD_MAX_BYTES', str(100 * 1024 * 1024)))
+    RECORD_BACKUP_COUNT = int(os.getenv('RECORD_BACKUP_COUNT', '5'))
+    RECORD_QUEUE_SIZE = int(os.getenv('RECORD_QUEUE_SIZE', '10000'))
+    RECORD_FLUSH_INTERVAL = float(os.getenv('RECORD_FLUSH_INTERVAL', '1'))
+    RECORD_REDACT_PII = os.getenv('RECORD_REDACT_PII', 'True').lower() == 'true'
+    RECORD_REDACT_SALT = os.getenv('RECORD_REDACT_SALT', '')
     
     @classmethod
     def validate(cls):
@@ -1,5 +1,15 @@
-from .ai import AICore
-from .storage import StorageService
+import importlib
+
+# Imported on first use, since the AI core pulls in transformers, langchain and FAISS
+_LAZY_ATTRIBUTES = {
+    'AICore': '.ai',
+    'StorageService': '.storage'
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = ['AICore', 'StorageService']
 
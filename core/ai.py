@@ -1,4 +1,6 @@
+import contextvars
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Any
 
 from transformers import AutoTokenizer
@@ -6,15 +8,25 @@ import tiktoken
 from langchain_groq import ChatGroq
 
 from services.database import get_db_manager
+from services.knowledge_base import get_knowledge_base
+from services.length_estimator import get_length_estimator
+from services.lexical_index import BM25Index
 from utils.language import Language, ResponseLength, ResponseStyle
+from utils.metrics import span, timed
+from utils.postprocess import get_post_processor
+from utils.tracing import set_attributes
 from config import Config
 
+# Pool for retrieval work that runs while the rest of the prompt is prepared
+_retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
 class AICore:
     """Core AI functionality for handling chat interactions."""
     
     def __init__(self):
         """Initialize the AI core with necessary models and tokenizers."""
         self._db_manager = get_db_manager()
+        self._length_estimator = get_length_estimator()
         self._tokenizers = {}
         self._models = {}
         self._conversation_history = []
@@ -24,6 +36,7 @@ class AICore:
         # Initialize tokenizers
         self._init_tokenizers()
         
+    @timed("ai.tokenizer_load")
     def _init_tokenizers(self):
         """Initialize tokenizers for different models."""
         # Load tokenizers for different models
@@ -41,13 +54,14 @@ class AICore:
             # Default to llama tokenizer as fallback
             return self._tokenizers["llama"]
     
-    def _init_model(self, model_name=None):
+    def _init_model(self, model_name=None, max_tokens=None):
         """Initialize a model using ChatGroq."""
         if not model_name:
             model_name = self.default_model
             
         # Create model with ChatGroq
-        return ChatGroq(api_key=self.api_key, model_name=model_name)
+        return ChatGroq(api_key=self.api_key, model_name=model_name, max_tokens=max_tokens,
+                        base_url=Config.GROQ_API_BASE)
     
     def summarize_chat(self):
         """Summarize the current conversation."""
@@ -56,6 +70,7 @@ class AICore:
         self._db_manager.save_summary({"summary": summary})
         return summary
     
+    @timed("ai.process_file")
     def process_file(self, file_obj):
         """Process an uploaded file."""
         if not file_obj:
@@ -80,6 +95,7 @@ class AICore:
             print(f"Error processing file: {str(e)}")
             return None
     
+    @timed("ai.count_tokens")
     def count_tokens(self, text, model_name=None):
         """Count the number of tokens in the text for the specified model."""
         if not model_name:
@@ -92,6 +108,7 @@ class AICore:
         else:
             return len(tokenizer.encode(text, disallowed_special=()))
     
+    @timed("ai.pricing")
     def calculate_price(self, input_text, output_text, model_name=None):
         """Calculate the price for the input and output text."""
         if not model_name:
@@ -114,19 +131,72 @@ class AICore:
         else:
             return 0.0  # Default price
     
+    @timed("ai.retrieval")
+    def retrieve_context(self, query, model_name=None):
+        """Retrieve knowledge base chunks for a query within the context token budget."""
+        return get_knowledge_base().retrieve_context(
+            query,
+            count_tokens=lambda text: self.count_tokens(text, model_name)
+        )
+    
+    @timed("ai.retrieval_wait")
+    def _wait_for_context(self, context_future):
+        """Wait for background retrieval, answering without context if it fails or is too slow."""
+        if context_future is None:
+            return []
+        try:
+            return context_future.result(timeout=Config.RAG_TIMEOUT)
+        except Exception as e:
+            print(f"Error retrieving knowledge base context: {str(e)}")
+            return []
+    
+    @timed("ai.file_budget")
+    def _budget_file_content(self, file_content, query, model_name=None):
+        """Reduce file content to the parts most relevant to the query if it exceeds the token budget."""
+        if self.count_tokens(file_content, model_name) <= Config.FILE_CONTEXT_TOKEN_BUDGET:
+            return file_content
+        
+        # Split into paragraphs, breaking up very long ones
+        sections = []
+        for paragraph in re.split(r'\n\s*\n', file_content):
+            paragraph = paragraph.strip()
+            for i in range(0, len(paragraph), 2000):
+                sections.append(paragraph[i:i + 2000])
+        
+        # Rank sections by lexical relevance, falling back to document order
+        index = BM25Index()
+        for i, section in enumerate(sections):
+            index.add(str(i), section)
+        ranked = [int(i) for i, _ in index.search(query, len(sections))]
+        matched = set(ranked)
+        ranked += [i for i in range(len(sections)) if i not in matched]
+        
+        chosen = []
+        used_tokens = 0
+        for i in ranked:
+            tokens = self.count_tokens(sections[i], model_name)
+            if used_tokens + tokens > Config.FILE_CONTEXT_TOKEN_BUDGET:
+                continue
+            chosen.append(i)
+            used_tokens += tokens
+        
+        return "\n...\n".join(sections[i] for i in sorted(chosen))
+    
     def remove_think_sections(self, response_text):
-        """Remove <thinking> sections from response text."""
-        return re.sub(r'<thinking>.*?</thinking>', '', response_text, flags=re.DOTALL)
+        """Remove <think> and <thinking> sections from response text."""
+        return get_post_processor(normalize_whitespace=False).process(response_text)
     
     def filter_to_persian(self, text):
         """Filter text to keep only Persian characters."""
-        return re.sub(r'[^\u0600-\u06FF\s]+', '', text)
+        return get_post_processor(strip_thinking=False, persian_only=True, normalize_whitespace=False).process(text)
     
+    @timed("ai.answer_query")
     def answer_query(self, user_id, query, file_obj=None, summarize=False, 
                      tone=ResponseStyle.CONVERSATIONAL, model_name="llama", 
                      creativity=0.7, keywords=None, language=Language.ENGLISH, 
                      response_length=ResponseLength.MEDIUM, welcome_message=False, 
-                     exclusion_words=None, main_prompt=None, chatbot_name="Parviz"):
+                     exclusion_words=None, main_prompt=None, chatbot_name="Parviz",
+                     use_knowledge_base=True):
         """
         Process a user query and generate a response.
         
@@ -145,11 +215,22 @@ class AICore:
             exclusion_words: Words to exclude from the response
             main_prompt: Optional custom prompt to use
             chatbot_name: The name of the chatbot
+            use_knowledge_base: Whether to ground the response in knowledge base content
             
         Returns:
             dict: The response data including the generated text
         """
         try:
+            set_attributes(user_id=user_id, model=model_name)
+            
+            # Retrieve knowledge base context in the background while the prompt is prepared,
+            # carrying the trace over to the retrieval thread
+            context_future = None
+            if use_knowledge_base:
+                context_future = _retrieval_executor.submit(
+                    contextvars.copy_context().run, self.retrieve_context, query, model_name
+                )
+            
             # Process file if provided
             file_content = self.process_file(file_obj) if file_obj else None
             
@@ -176,34 +257,69 @@ class AICore:
                 system_prompt += f" Avoid using these words: {', '.join(exclusion_words)}."
                 
             if file_content:
+                file_content = self._budget_file_content(file_content, query, model_name)
                 system_prompt += f"\nHere is the content of the uploaded file to reference:\n{file_content}\n"
                 
             if language == Language.PERSIAN:
                 system_prompt += "\nRespond in Persian language only."
+            
+            context_docs = self._wait_for_context(context_future)
+            if context_docs:
+                system_prompt += "\nUse these knowledge base excerpts to answer when they are relevant:\n"
+                for i, doc in enumerate(context_docs, start=1):
+                    system_prompt += f"[{i}] {doc.page_content}\n"
                 
-            # Set up the conversation
-            messages = [{"role": "system", "content": system_prompt}]
+            with span("ai.prompt_build"):
+                # Set up the conversation
+                messages = [{"role": "system", "content": system_prompt}]
             
-            # Add conversation history
-            for msg in self._conversation_history:
-                messages.append(msg)
+                # Add conversation history
+                for msg in self._conversation_history:
+                    messages.append(msg)
                 
-            # Add the current user query
-            messages.append({"role": "user", "content": query})
+                # Add the current user query
+                messages.append({"role": "user", "content": query})
+            
+                # Limit the response to the length this kind of request usually takes
+                prompt_tokens = self.count_tokens("\n".join(msg["content"] for msg in messages), model_name)
+                length_estimate = self._length_estimator.predict(
+                    model_name, prompt_tokens, response_length, creativity
+                )
             
             # Initialize the model with ChatGroq
-            model = self._init_model(model_name)
+            max_tokens = self._length_estimator.max_tokens(length_estimate)
+            model = self._init_model(model_name, max_tokens)
             
             # Generate the response using ChatGroq
-            response = model.invoke(messages)
+            with span("ai.model_invoke", model=model_name, prompt_tokens=prompt_tokens,
+                      max_tokens=max_tokens) as trace_span:
+                response = model.invoke(messages)
+                response_metadata = getattr(response, "response_metadata", None) or {}
+                if trace_span is not None:
+                    usage = response_metadata.get("token_usage") or {}
+                    trace_span.set_attribute("finish_reason", str(response_metadata.get("finish_reason")))
+                    trace_span.set_attribute("completion_tokens", usage.get("completion_tokens") or 0)
             ai_response = response.content
             
-            # Process the response based on language
-            if language == Language.PERSIAN:
-                ai_response = self.filter_to_persian(ai_response)
-                
-            # Remove thinking sections if present
-            ai_response = self.remove_think_sections(ai_response)
+            # Learn from the response, counting one cut off at the limit as longer than the limit
+            usage = response_metadata.get("token_usage") or {}
+            truncated = response_metadata.get("finish_reason") == "length"
+            self._length_estimator.observe(
+                model_name,
+                prompt_tokens,
+                usage.get("completion_tokens") or self.count_tokens(ai_response, model_name),
+                response_length,
+                creativity,
+                truncated_at=max_tokens if truncated else None
+            )
+            
+            # Strip reasoning, filter the language and remove excluded words in one pass
+            post_processor = get_post_processor(
+                persian_only=language == Language.PERSIAN,
+                exclusion_words=exclusion_words
+            )
+            with span("ai.postprocess"):
+                ai_response = post_processor.process(ai_response)
             
             # Store the message in history
             self._conversation_history.append({"role": "user", "content": query})
@@ -236,7 +352,12 @@ class AICore:
                 "model": model_name,
                 "tokens": self.count_tokens(ai_response, model_name),
                 "price": price,
-                "summary": summary
+                "summary": summary,
+                "sources": [
+                    {key: doc.metadata[key] for key in ("source", "title", "url") if doc.metadata.get(key)}
+                    for doc in context_docs
+                ],
+                "length_estimate": length_estimate
             }
             
         except Exception as e:
@@ -0,0 +1,111 @@
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+class WarmUpStep(NamedTuple):
+    """A part of the app built before requests are served."""
+    name: str
+    run: Callable[[], None]
+    # Whether the state is read-only and holds no connections, so it can be built before a fork
+    shareable: bool
+
+def _load_ai_core():
+    """Import the model libraries and load the tokenizers."""
+    from core.ai import get_ai_core
+    get_ai_core()
+
+def _load_knowledge_base():
+    """Load the embedding model and build the FAISS index."""
+    from services.knowledge_base import get_knowledge_base
+    get_knowledge_base()
+
+def _check_database():
+    """Open a pooled database connection."""
+    from services.database import get_db_manager
+    with get_db_manager().connection() as cursor:
+        cursor.execute("SELECT 1")
+
+def _connect_storage():
+    """Connect to MinIO and make sure the bucket exists."""
+    from core.storage import get_storage_service
+    get_storage_service()
+
+WARM_UP_STEPS = [
+    WarmUpStep("ai_core", _load_ai_core, True),
+    WarmUpStep("knowledge_base", _load_knowledge_base, True),
+    WarmUpStep("database", _check_database, False),
+    WarmUpStep("storage", _connect_storage, False)
+]
+
+class Startup:
+    """
+    Warms up the services of a process and reports whether it is ready.
+    
+    Shareable steps load read-only state, such as the tokenizers and the
+    embedding model, and can run in the gunicorn master so that workers
+    inherit it after the fork instead of each loading their own. The
+    other steps open connections, which must not cross a fork, and run
+    in each worker before it serves requests.
+    """
+    
+    def __init__(self, steps: List[WarmUpStep] = None):
+        """Initialize with every step pending."""
+        self.steps = list(steps if steps is not None else WARM_UP_STEPS)
+        self._status = {step.name: {"status": "pending", "seconds": None, "error": None} for step in self.steps}
+        self._lock = threading.Lock()
+    
+    def warm_up(self, shareable_only: bool = False) -> bool:
+        """
+        Run the steps that are not ready yet, retrying failed ones.
+        
+        Args:
+            shareable_only: Whether to run only the steps that are safe before a fork
+        
+        Returns:
+            bool: Whether every step that was run is ready
+        """
+        with self._lock:
+            ready = True
+            for step in self.steps:
+                if shareable_only and not step.shareable:
+                    continue
+                status = self._status[step.name]
+                if status["status"] == "ready":
+                    continue
+                
+                status["status"] = "running"
+                start = time.perf_counter()
+                try:
+                    step.run()
+                    status.update(status="ready", error=None)
+                except Exception as e:
+                    status.update(status="failed", error=str(e))
+                    print(f"Error warming up {step.name}: {str(e)}")
+                    ready = False
+                status["seconds"] = round(time.perf_counter() - start, 3)
+            return ready
+    
+    def warm_up_in_background(self) -> threading.Thread:
+        """Warm up in a thread, so that the server starts and reports readiness meanwhile."""
+        thread = threading.Thread(target=self.warm_up, name="warm-up", daemon=True)
+        thread.start()
+        return thread
+    
+    @property
+    def ready(self) -> bool:
+        """Whether every step is ready."""
+        return all(status["status"] == "ready" for status in self._status.values())
+    
+    def status(self) -> Dict:
+        """Get readiness and the status, duration and error of each step."""
+        return {"ready": self.ready, "steps": {name: dict(status) for name, status in self._status.items()}}
+
+# Singleton instance
+_startup_instance = None
+
+def get_startup():
+    """Get the singleton startup state of this process."""
+    global _startup_instance
+    if _startup_instance is None:
+        _startup_instance = Startup()
+    return _startup_instance
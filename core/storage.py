@@ -5,6 +5,7 @@ from minio import Minio
 from minio.error import S3Error
 
 from config import Config
+from utils.metrics import timed
 
 class StorageError(Exception):
     """Base exception for storage-related errors."""
@@ -21,10 +22,15 @@ class StorageOperationError(StorageError):
 class StorageService:
     """Service for handling file storage operations using MinIO."""
     
-    def __init__(self):
-        """Initialize the storage service with MinIO connection."""
+    def __init__(self, client=None):
+        """
+        Initialize the storage service with MinIO connection.
+        
+        Args:
+            client: Optional client with the Minio interface, such as an in-memory stand-in
+        """
         try:
-            self.client = Minio(
+            self.client = client or Minio(
                 endpoint=Config.MINIO_ENDPOINT,
                 access_key=Config.MINIO_ACCESS_KEY,
                 secret_key=Config.MINIO_SECRET_KEY,
@@ -47,6 +53,7 @@ class StorageService:
         except S3Error as e:
             raise StorageOperationError(f"Failed to ensure bucket exists: {str(e)}")
     
+    @timed("storage.upload")
     def upload_file(self, file_data, content_type=None):
         """
         Upload a file to storage.
@@ -100,6 +107,7 @@ class StorageService:
         except Exception as e:
             raise StorageOperationError(f"Unexpected error uploading file: {str(e)}")
     
+    @timed("storage.download")
     def download_file(self, file_id):
         """
         Download a file from storage.
@@ -116,6 +124,7 @@ class StorageService:
         except S3Error as e:
             raise StorageOperationError(f"Failed to download file {file_id}: {str(e)}")
     
+    @timed("storage.delete")
     def delete_file(self, file_id):
         """
         Delete a file from storage.
@@ -134,6 +143,7 @@ class StorageService:
         except Exception as e:
             raise StorageOperationError(f"Unexpected error deleting file: {str(e)}")
     
+    @timed("storage.get_info")
     def get_file_info(self, file_id):
         """
         Get information about a file.
@@ -166,6 +176,7 @@ class StorageService:
         except S3Error as e:
             raise StorageOperationError(f"Failed to get info for file {file_id}: {str(e)}")
     
+    @timed("storage.list")
     def list_files(self, prefix=None):
         """
         List files in storage.
@@ -1,10 +1,18 @@
+# gevent workers patch the standard library only once they start, after a
+# preloaded app has created its locks, threads and connections. Patch it before
+# anything is imported, so that everything preloaded is built on gevent.
+from gevent import monkey
+monkey.patch_all()
+
 import multiprocessing
+import os
+import tempfile
 
 # Bind to 0.0.0.0:5000
 bind = "0.0.0.0:5000"
 
-# Worker settings
-workers = multiprocessing.cpu_count() * 2 + 1
+# Worker settings (GUNICORN_WORKERS overrides the count, such as when sizing with bench.replay)
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
 worker_class = "gevent"
 worker_connections = 1000
 timeout = 300
@@ -18,3 +26,43 @@ errorlog = "-"
 
 # Process naming
 proc_name = "parviz-mind"
+
+# Load the app and its read-only state (tokenizers, embedding model, FAISS index)
+# once in the master, so that workers inherit it when they fork instead of each
+# loading their own while the first requests wait
+preload_app = os.getenv("PRELOAD_APP", "True").lower() == "true"
+if preload_app:
+    # Tokenizers used before the fork would otherwise warn and disable parallelism in every worker
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    # The progress bar monitor of tqdm, started while transformers loads a model, would be a
+    # greenlet of the master that every worker inherits and then fails to run
+    import tqdm
+    tqdm.tqdm.monitor_interval = 0
+
+# Prometheus multiprocess mode: every worker writes its metrics to this
+# directory, and /metrics merges them. It must be set before the app is imported.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "parviz-mind-metrics"))
+
+def on_starting(server):
+    """Start from an empty metrics directory, since samples of old workers would be merged in."""
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith(".db"):
+            os.remove(os.path.join(metrics_dir, name))
+
+def when_ready(server):
+    """Build the state workers can share, before they are forked."""
+    if preload_app:
+        from core.startup import get_startup
+        get_startup().warm_up(shareable_only=True)
+
+def post_worker_init(worker):
+    """Open this worker's connections, and build anything not inherited, before it serves requests."""
+    from core.startup import get_startup
+    get_startup().warm_up()
+
+def child_exit(server, worker):
+    """Drop the live samples of a worker that exited."""
+    from utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
\ No newline at end of file
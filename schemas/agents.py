@@ -3,6 +3,9 @@ from pydantic import BaseModel, Field, validator
 from datetime import datetime
 from enum import Enum
 
+# Maximum number of agents in one bulk request
+MAX_BULK_AGENTS = 1000
+
 class AgentStatus(str, Enum):
     AVAILABLE = "available"
     BUSY = "busy"
@@ -56,6 +59,31 @@ class AgentUpdate(BaseModel):
             }
         }
 
+class AgentBulkCreate(BaseModel):
+    """Schema for creating several agents at once."""
+    agents: List[AgentCreate] = Field(..., min_items=1, max_items=MAX_BULK_AGENTS, description="Agents to create")
+
+class AgentBulkUpdateItem(AgentUpdate):
+    """Schema for one agent in a bulk update."""
+    agent_id: str = Field(..., description="Agent ID")
+
+class AgentBulkUpdate(BaseModel):
+    """Schema for updating several agents at once."""
+    agents: List[AgentBulkUpdateItem] = Field(..., min_items=1, max_items=MAX_BULK_AGENTS, description="Agent updates")
+
+class AgentBulkStatusUpdate(BaseModel):
+    """Schema for setting the status of several agents at once."""
+    agent_ids: List[str] = Field(..., min_items=1, max_items=MAX_BULK_AGENTS, description="Agent IDs")
+    status: AgentStatus = Field(..., description="New agent status")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "agent_ids": ["agent1", "agent2"],
+                "status": "offline"
+            }
+        }
+
 class AgentResponse(AgentBase):
     """Schema for agent response."""
     id: str = Field(..., description="Agent ID")
@@ -87,6 +115,7 @@ class AgentHandoffRequest(BaseModel):
     preferred_language: Optional[str] = Field(None, description="Preferred language")
     preferred_level: Optional[AgentLevel] = Field(None, description="Preferred agent level")
     required_specialties: Optional[List[str]] = Field(None, description="Required specialties")
+    priority: int = Field(0, description="Priority while waiting for an agent, higher is served first")
     
     class Config:
         schema_extra = {
@@ -95,6 +124,7 @@ class AgentHandoffRequest(BaseModel):
                 "reason": "Need help with complex technical issue",
                 "preferred_language": "en",
                 "preferred_level": "senior",
-                "required_specialties": ["Python", "Flask"]
+                "required_specialties": ["Python", "Flask"],
+                "priority": 0
             }
         }
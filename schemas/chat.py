@@ -19,6 +19,7 @@ class ChatRequest(BaseModel):
     exclusion_words: Optional[List[str]] = Field(None, description="Words to exclude from response")
     main_prompt: Optional[str] = Field(None, description="Custom system prompt")
     chatbot_name: str = Field("Parviz", description="Name of the chatbot")
+    use_knowledge_base: bool = Field(True, description="Whether to ground the response in the knowledge base")
     
     class Config:
         schema_extra = {
@@ -81,3 +82,5 @@ class ChatResponse(BaseModel):
     tokens: int = Field(..., description="Number of tokens in response")
     price: float = Field(..., description="Price of the response")
     summary: Optional[str] = Field(None, description="Conversation summary")
+    sources: List[Dict[str, Any]] = Field([], description="Knowledge base sources used for the response")
+    length_estimate: Optional[Dict[str, Any]] = Field(None, description="Predicted p50 and p95 response tokens")
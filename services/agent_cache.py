@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Callable
+
+from config import Config
+from services.events import get_event_broker
+
+# Events after which a cached agent record may be stale
+INVALIDATING_EVENTS = ("status", "rating", "agent_updated", "agent_deleted")
+
+class AgentCache:
+    """
+    Read-through LRU cache of agent records with a time to live.
+    
+    Writers update or invalidate entries directly; other workers learn about
+    changes through agent events, and the time to live bounds staleness when
+    events are not shared between workers.
+    """
+    
+    def __init__(self, max_size: int = 10000, ttl: float = 30):
+        """Initialize an empty cache."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_or_load(self, agent_id: str, loader: Callable[[str], Dict]) -> Dict:
+        """
+        Get an agent record, loading and caching it on a miss.
+        
+        A record loaded while an invalidation happened is returned but not
+        cached, so a slow load can never put a stale record back.
+        
+        Args:
+            agent_id: ID of the agent
+            loader: Function that reads the agent from the database
+            
+        Returns:
+            Dict: A copy of the agent record
+        """
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(agent_id)
+                self.hits += 1
+                return dict(entry[0])
+            self.misses += 1
+            generation = self._generation
+        
+        agent = loader(agent_id)
+        
+        with self._lock:
+            if self._generation == generation:
+                self._store(agent)
+        return dict(agent)
+    
+    def _store(self, agent: Dict):
+        """Cache an agent record, evicting the least recently used ones."""
+        self._entries[agent["id"]] = (dict(agent), time.monotonic() + self.ttl)
+        self._entries.move_to_end(agent["id"])
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def put(self, agent: Dict):
+        """Cache a freshly written agent record."""
+        with self._lock:
+            self._generation += 1
+            self._store(agent)
+    
+    def invalidate(self, agent_id: str):
+        """Drop an agent record from the cache."""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(agent_id, None)
+    
+    def clear(self):
+        """Drop all cached records."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+# Singleton instance
+_agent_cache_instance = None
+
+def get_agent_cache():
+    """Get the singleton agent cache, invalidated by agent events from all workers."""
+    global _agent_cache_instance
+    if _agent_cache_instance is None:
+        cache = AgentCache(Config.AGENT_CACHE_SIZE, Config.AGENT_CACHE_TTL_SECONDS)
+        get_event_broker().add_listener(
+            lambda event: cache.invalidate(event["agent_id"]) if event.get("agent_id") else None,
+            INVALIDATING_EVENTS
+        )
+        _agent_cache_instance = cache
+    return _agent_cache_instance
\ No newline at end of file
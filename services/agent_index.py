@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Iterable
+
+from config import Config
+
+class AgentRoutingIndex:
+    """
+    In-memory index of agents for handoff routing.
+    
+    Agents are indexed by language, level and specialty, and the set of
+    available agents is kept up to date on every status change, so finding
+    a matching agent is a set intersection instead of a table scan.
+    """
+    
+    def __init__(self, db_manager=None):
+        """Initialize an empty index, optionally backed by a database manager for refreshes."""
+        self.db_manager = db_manager
+        self._agents = {}
+        self._available = set()
+        self._by_language = {}
+        self._by_level = {}
+        self._by_specialty = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._last_seen_update = None
+        self._assignments = {}
+    
+    def __len__(self) -> int:
+        return len(self._agents)
+    
+    def _unindex(self, agent_id: str):
+        """Remove an agent from all index sets."""
+        agent = self._agents.pop(agent_id, None)
+        if agent is None:
+            return
+        
+        self._available.discard(agent_id)
+        for language in agent.get("languages") or []:
+            self._discard(self._by_language, language, agent_id)
+        self._discard(self._by_level, agent.get("level"), agent_id)
+        for specialty in agent.get("specialties") or []:
+            self._discard(self._by_specialty, specialty, agent_id)
+    
+    @staticmethod
+    def _discard(index: Dict[str, set], key: str, agent_id: str):
+        """Remove an agent ID from one index set, dropping the set once empty."""
+        members = index.get(key)
+        if members is not None:
+            members.discard(agent_id)
+            if not members:
+                del index[key]
+    
+    def upsert(self, agent: Dict):
+        """
+        Add an agent to the index or replace its indexed record.
+        
+        Args:
+            agent: Agent record as returned by the database manager
+        """
+        agent_id = agent["id"]
+        
+        with self._lock:
+            self._unindex(agent_id)
+            self._agents[agent_id] = agent
+            
+            for language in agent.get("languages") or []:
+                self._by_language.setdefault(language, set()).add(agent_id)
+            self._by_level.setdefault(agent.get("level"), set()).add(agent_id)
+            for specialty in agent.get("specialties") or []:
+                self._by_specialty.setdefault(specialty, set()).add(agent_id)
+            
+            if agent.get("status") == "available":
+                self._available.add(agent_id)
+    
+    def remove(self, agent_id: str):
+        """Remove an agent from the index."""
+        with self._lock:
+            self._unindex(agent_id)
+    
+    def set_status(self, agent_id: str, status: str):
+        """
+        Update the indexed status of an agent.
+        
+        Args:
+            agent_id: ID of the agent
+            status: New status value
+        """
+        with self._lock:
+            agent = self._agents.get(agent_id)
+            if agent is None:
+                return
+            
+            self._agents[agent_id] = {**agent, "status": status}
+            if status == "available":
+                self._available.add(agent_id)
+            else:
+                self._available.discard(agent_id)
+    
+    def record_assignment(self, agent_id: str):
+        """Record that a conversation was assigned to an agent by this worker."""
+        with self._lock:
+            self._assignments.setdefault(agent_id, deque()).append(time.monotonic())
+    
+    def recent_assignments(self, agent_id: str, window: float) -> int:
+        """Count the conversations assigned to an agent by this worker in the last `window` seconds."""
+        with self._lock:
+            assignments = self._assignments.get(agent_id)
+            if not assignments:
+                return 0
+            cutoff = time.monotonic() - window
+            while assignments and assignments[0] < cutoff:
+                assignments.popleft()
+            return len(assignments)
+    
+    def get(self, agent_id: str) -> Optional[Dict]:
+        """Get the indexed record of an agent."""
+        return self._agents.get(agent_id)
+    
+    def find(self, language: Optional[str] = None, level: Optional[str] = None,
+             specialties: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        Find available agents matching all of the given requirements.
+        
+        Args:
+            language: Optional language the agent must speak
+            level: Optional level the agent must have
+            specialties: Optional specialties the agent must all have
+        
+        Returns:
+            List of matching agent records
+        """
+        with self._lock:
+            candidate_sets = [self._available]
+            
+            if language:
+                candidate_sets.append(self._by_language.get(language, set()))
+            if level:
+                candidate_sets.append(self._by_level.get(level, set()))
+            for specialty in specialties or []:
+                candidate_sets.append(self._by_specialty.get(specialty, set()))
+            
+            # Intersect starting from the smallest set
+            candidate_sets.sort(key=len)
+            matches = set(candidate_sets[0])
+            for members in candidate_sets[1:]:
+                if not matches:
+                    break
+                matches &= members
+            
+            return [self._agents[agent_id] for agent_id in matches]
+    
+    def load(self, agents: Iterable[Dict]):
+        """Replace the contents of the index with the given agents."""
+        with self._lock:
+            self._agents = {}
+            self._available = set()
+            self._by_language = {}
+            self._by_level = {}
+            self._by_specialty = {}
+            for agent in agents:
+                self.upsert(agent)
+    
+    def refresh(self, force: bool = False):
+        """
+        Pick up agent changes made by other processes.
+        
+        The first call loads every agent; later calls only read agents
+        updated since the previous refresh, and at most once per
+        AGENT_INDEX_REFRESH_SECONDS unless forced.
+        """
+        if self.db_manager is None:
+            return
+        
+        now = time.monotonic()
+        if not force and self._loaded and now - self._last_refresh < Config.AGENT_INDEX_REFRESH_SECONDS:
+            return
+        
+        started_at = datetime.now()
+        if not self._loaded:
+            self.load(self.db_manager.list_agents())
+            self._loaded = True
+        else:
+            # Overlap the window slightly so updates committed during the last refresh are not missed
+            since = (self._last_seen_update - timedelta(seconds=1)).isoformat()
+            for agent in self.db_manager.list_agents(updated_since=since):
+                self.upsert(agent)
+        
+        self._last_seen_update = started_at
+        self._last_refresh = now
+
+# Singleton instance
+_agent_index_instance = None
+
+def get_agent_index(db_manager=None):
+    """Get the singleton agent routing index."""
+    global _agent_index_instance
+    if _agent_index_instance is None:
+        from services.database import get_db_manager
+        _agent_index_instance = AgentRoutingIndex(db_manager or get_db_manager())
+    return _agent_index_instance
@@ -1,10 +1,117 @@
+import os
+import queue
 import sqlite3
+import time
 import uuid
 import json
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 
 from config import Config
+from utils.metrics import span, timed
+from utils.tracing import current_span, get_tracer
+
+# Hourly buckets for agent statistics over a time period
+STATS_BUCKET_FORMAT = "%Y-%m-%dT%H"
+
+# Monthly billing periods
+BILLING_PERIOD_FORMAT = "%Y-%m"
+
+# Billing ledger columns, in export order
+BILLING_LEDGER_COLUMNS = (
+    "id", "handoff_id", "agent_id", "conversation_id", "user_id", "start_time", "end_time",
+    "duration_minutes", "hourly_rate", "amount", "period", "created_at"
+)
+
+# Agents with their average rating from the materialized aggregates
+AGENT_SELECT = """
+    SELECT a.*,
+        CASE WHEN s.rating_count > 0 THEN s.rating_sum / s.rating_count END AS rating
+    FROM agents a
+    LEFT JOIN agent_stats s ON s.agent_id = a.id
+"""
+
+# Agent fields that can be changed after creation
+AGENT_UPDATE_FIELDS = ("name", "level", "hourly_rate", "specialties", "languages", "status")
+
+# Maximum number of IDs bound in one IN (...) clause
+SQL_IN_CHUNK_SIZE = 500
+
+def _is_busy(error):
+    """Check whether an error means another connection holds the database lock."""
+    message = str(error)
+    return "database is locked" in message or "database is busy" in message
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor recording each statement as a span when the request is traced."""
+    
+    def execute(self, sql, parameters=()):
+        if current_span() is None:
+            return super().execute(sql, parameters)
+        with get_tracer().start_span("sqlite.execute", _statement_attributes(sql)):
+            return super().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        if current_span() is None:
+            return super().executemany(sql, seq_of_parameters)
+        with get_tracer().start_span("sqlite.executemany", _statement_attributes(sql)):
+            return super().executemany(sql, seq_of_parameters)
+
+def _statement_attributes(sql):
+    """Get the span attributes of an SQL statement, with its whitespace collapsed."""
+    return {"db.system": "sqlite", "db.statement": " ".join(sql.split())}
+
+class ConnectionPool:
+    """
+    Pool of SQLite connections shared by the threads of one process.
+    
+    Connections are opened in autocommit mode, so transactions are begun
+    explicitly, and connections inherited across a fork are never reused.
+    """
+    
+    def __init__(self, db_name, size):
+        """Initialize an empty pool keeping at most `size` idle connections."""
+        self.db_name = db_name
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._pid = os.getpid()
+    
+    def _connect(self):
+        """Open a new connection."""
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=Config.DATABASE_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        if Config.DATABASE_JOURNAL_MODE:
+            conn.execute(f"PRAGMA journal_mode = {Config.DATABASE_JOURNAL_MODE}")
+        return conn
+    
+    def acquire(self):
+        """Take an idle connection, or open one if none is idle."""
+        if os.getpid() != self._pid:
+            # Forked since the pool was filled; leave the parent's connections alone
+            self._idle = queue.LifoQueue(maxsize=self.size)
+            self._pid = os.getpid()
+        
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+    
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full."""
+        if conn.in_transaction:
+            conn.close()
+            return
+        
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
 
 class DatabaseManager:
     """Manager for database operations."""
@@ -12,13 +119,71 @@ class DatabaseManager:
     def __init__(self, db_name=None):
         """Initialize the database manager."""
         self.db_name = db_name or Config.DATABASE_PATH
+        self._pool = ConnectionPool(self.db_name, Config.DATABASE_POOL_SIZE)
         self._create_tables()
+    
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection for reads.
+        
+        Each statement runs in its own implicit transaction; use
+        unit_of_work() for anything that writes.
         
+        Yields:
+            sqlite3.Cursor: A cursor returning sqlite3.Row rows
+        """
+        conn = self._pool.acquire()
+        try:
+            yield conn.cursor(TracedCursor)
+        finally:
+            self._pool.release(conn)
+    
+    @contextmanager
+    def unit_of_work(self, write=True):
+        """
+        Run a block of statements as one transaction on a pooled connection.
+        
+        Write transactions begin with BEGIN IMMEDIATE, so the write lock is
+        taken before the first statement instead of being upgraded to
+        halfway through, which SQLite cannot wait for. If the lock is still
+        held by another writer after DATABASE_TIMEOUT, beginning is retried
+        with exponential backoff. The transaction commits when the block
+        exits and rolls back if it raises.
+        
+        Args:
+            write: Whether the block writes
+        
+        Yields:
+            sqlite3.Cursor: A cursor returning sqlite3.Row rows
+        """
+        conn = self._pool.acquire()
+        try:
+            # Time spent beginning, including waits for the write lock
+            with span("database.begin_write" if write else "database.begin_read"):
+                for attempt in range(Config.DATABASE_BUSY_RETRIES + 1):
+                    try:
+                        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+                        break
+                    except sqlite3.OperationalError as e:
+                        if not _is_busy(e) or attempt == Config.DATABASE_BUSY_RETRIES:
+                            raise
+                        time.sleep(Config.DATABASE_BUSY_BACKOFF * 2 ** attempt)
+            
+            try:
+                yield conn.cursor(TracedCursor)
+                with span("database.commit"):
+                    conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+        finally:
+            self._pool.release(conn)
+    
     def _create_tables(self):
         """Create database tables if they don't exist."""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            
+        with self.unit_of_work() as cursor:
             # Users table
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -109,28 +274,420 @@ class DatabaseManager:
             )
             ''')
             
-            conn.commit()
+            # Index for incremental agent routing index refreshes
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_agents_updated_at ON agents (updated_at)"
+            )
+            
+            # Agent stats table (materialized rating and conversation aggregates)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS agent_stats (
+                agent_id TEXT PRIMARY KEY,
+                rating_count INTEGER NOT NULL DEFAULT 0,
+                rating_sum REAL NOT NULL DEFAULT 0,
+                rating_min REAL,
+                rating_max REAL,
+                conversation_count INTEGER NOT NULL DEFAULT 0,
+                minutes_sum REAL NOT NULL DEFAULT 0,
+                minutes_min REAL,
+                minutes_max REAL,
+                earnings REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP,
+                FOREIGN KEY (agent_id) REFERENCES agents (id)
+            )
+            ''')
+            
+            # Hourly agent stats table (for statistics over a time period)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS agent_stats_hourly (
+                agent_id TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                rating_count INTEGER NOT NULL DEFAULT 0,
+                rating_sum REAL NOT NULL DEFAULT 0,
+                rating_min REAL,
+                rating_max REAL,
+                conversation_count INTEGER NOT NULL DEFAULT 0,
+                minutes_sum REAL NOT NULL DEFAULT 0,
+                minutes_min REAL,
+                minutes_max REAL,
+                earnings REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (agent_id, bucket),
+                FOREIGN KEY (agent_id) REFERENCES agents (id)
+            )
+            ''')
+            
+            # Billing ledger table (append-only, one row per completed agent session)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS billing_ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                handoff_id TEXT NOT NULL UNIQUE,
+                agent_id TEXT NOT NULL,
+                conversation_id TEXT NOT NULL,
+                user_id TEXT,
+                start_time TIMESTAMP NOT NULL,
+                end_time TIMESTAMP NOT NULL,
+                duration_minutes REAL NOT NULL,
+                hourly_rate REAL NOT NULL,
+                amount REAL NOT NULL,
+                period TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (handoff_id) REFERENCES agent_conversations (id),
+                FOREIGN KEY (agent_id) REFERENCES agents (id),
+                FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+            )
+            ''')
+            
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_billing_ledger_end_time ON billing_ledger (end_time)"
+            )
+            
+            # Ledger rows are never changed once written
+            for operation in ("UPDATE", "DELETE"):
+                cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS billing_ledger_no_{operation.lower()}
+                BEFORE {operation} ON billing_ledger
+                BEGIN
+                    SELECT RAISE(ABORT, 'billing_ledger is append-only');
+                END
+                ''')
+            
+            # Billing rollups table (ledger totals per period and agent)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS billing_rollups (
+                period TEXT NOT NULL,
+                agent_id TEXT NOT NULL,
+                sessions INTEGER NOT NULL DEFAULT 0,
+                minutes REAL NOT NULL DEFAULT 0,
+                amount REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (period, agent_id),
+                FOREIGN KEY (agent_id) REFERENCES agents (id)
+            )
+            ''')
+            
+            # Handoff tickets table (handoffs waiting for an agent, shared by all workers)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS handoff_tickets (
+                sequence INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                conversation_id TEXT NOT NULL,
+                requirements TEXT NOT NULL,
+                language TEXT NOT NULL,
+                level TEXT NOT NULL,
+                specialties TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                enqueued_at TIMESTAMP NOT NULL,
+                claimed_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                details TEXT
+            )
+            ''')
+            
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_handoff_tickets_waiting ON handoff_tickets (status, priority DESC, sequence)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_handoff_tickets_finished_at ON handoff_tickets (finished_at)"
+            )
+            
+            # Backfill the aggregates from existing ratings and conversations
+            if not cursor.execute("SELECT 1 FROM agent_stats LIMIT 1").fetchone():
+                self._rebuild_agent_stats(cursor)
+    
+    @staticmethod
+    def _rebuild_agent_stats(cursor):
+        """Recompute the agent aggregates from the ratings and conversations tables."""
+        cursor.execute("DELETE FROM agent_stats")
+        cursor.execute("DELETE FROM agent_stats_hourly")
+        
+        for table, key, bucket in (
+            ("agent_stats", "agent_id", ""),
+            ("agent_stats_hourly", "agent_id, bucket", ", strftime('%Y-%m-%dT%H', {time}) AS bucket")
+        ):
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({key}, rating_count, rating_sum, rating_min, rating_max)
+                SELECT agent_id{bucket.format(time="created_at")}, COUNT(*), SUM(rating), MIN(rating), MAX(rating)
+                FROM agent_ratings
+                GROUP BY {key}
+                """
+            )
+            
+            # Earnings use the current hourly rate, since past rates are not recorded
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({key}, conversation_count, minutes_sum, minutes_min, minutes_max, earnings)
+                SELECT ac.agent_id{bucket.format(time="ac.end_time")}, COUNT(*), SUM(ac.duration_minutes),
+                    MIN(ac.duration_minutes), MAX(ac.duration_minutes),
+                    SUM(ac.duration_minutes * a.hourly_rate / 60)
+                FROM agent_conversations ac
+                JOIN agents a ON a.id = ac.agent_id
+                WHERE ac.status = 'completed'
+                GROUP BY {key}
+                ON CONFLICT ({key}) DO UPDATE SET
+                    conversation_count = excluded.conversation_count,
+                    minutes_sum = excluded.minutes_sum,
+                    minutes_min = excluded.minutes_min,
+                    minutes_max = excluded.minutes_max,
+                    earnings = excluded.earnings
+                """
+            )
+        
+        cursor.execute("UPDATE agent_stats SET updated_at = ?", (datetime.now().isoformat(),))
+    
+    @staticmethod
+    def _accumulate_agent_stats(cursor, agent_id, at, rating=None, minutes=None, earnings=0.0):
+        """Fold one rating or completed conversation into an agent's aggregates."""
+        values = (
+            1 if rating is not None else 0, rating or 0, rating, rating,
+            1 if minutes is not None else 0, minutes or 0, minutes, minutes,
+            earnings, at.isoformat()
+        )
+        
+        for table, key, key_values in (
+            ("agent_stats", "agent_id", (agent_id,)),
+            ("agent_stats_hourly", "agent_id, bucket", (agent_id, at.strftime(STATS_BUCKET_FORMAT)))
+        ):
+            cursor.execute(
+                f"""
+                INSERT INTO {table}
+                ({key}, rating_count, rating_sum, rating_min, rating_max,
+                 conversation_count, minutes_sum, minutes_min, minutes_max, earnings, updated_at)
+                VALUES ({", ".join("?" * (len(key_values) + len(values)))})
+                ON CONFLICT ({key}) DO UPDATE SET
+                    rating_count = rating_count + excluded.rating_count,
+                    rating_sum = rating_sum + excluded.rating_sum,
+                    rating_min = MIN(COALESCE(rating_min, excluded.rating_min), COALESCE(excluded.rating_min, rating_min)),
+                    rating_max = MAX(COALESCE(rating_max, excluded.rating_max), COALESCE(excluded.rating_max, rating_max)),
+                    conversation_count = conversation_count + excluded.conversation_count,
+                    minutes_sum = minutes_sum + excluded.minutes_sum,
+                    minutes_min = MIN(COALESCE(minutes_min, excluded.minutes_min), COALESCE(excluded.minutes_min, minutes_min)),
+                    minutes_max = MAX(COALESCE(minutes_max, excluded.minutes_max), COALESCE(excluded.minutes_max, minutes_max)),
+                    earnings = earnings + excluded.earnings,
+                    updated_at = excluded.updated_at
+                """,
+                key_values + values
+            )
+    
+    def record_agent_rating(self, cursor, agent_id, rating, rated_at):
+        """
+        Add a rating to an agent's aggregates.
+        
+        Runs on the caller's cursor so the aggregates are committed together
+        with the rating itself.
+        """
+        self._accumulate_agent_stats(cursor, agent_id, rated_at, rating=rating)
+    
+    def record_agent_conversation(self, cursor, agent_id, minutes, earnings, ended_at):
+        """
+        Add a completed conversation to an agent's aggregates.
+        
+        Runs on the caller's cursor so the aggregates are committed together
+        with the conversation update.
+        """
+        self._accumulate_agent_stats(cursor, agent_id, ended_at, minutes=minutes, earnings=earnings)
+    
+    @timed("database.record_billing_entry")
+    def record_billing_entry(self, cursor, handoff_id, agent_id, conversation_id,
+                             start_time, end_time, duration_minutes, hourly_rate):
+        """
+        Append a completed agent session to the billing ledger and its period rollup.
+        
+        Runs on the caller's cursor so the entry is committed together with
+        the end of the session. The hourly rate is stored as charged, so later
+        rate changes do not affect past entries.
+        
+        Returns:
+            float: The amount charged
+        """
+        amount = (hourly_rate / 60) * duration_minutes
+        period = end_time.strftime(BILLING_PERIOD_FORMAT)
+        
+        cursor.execute(
+            """
+            INSERT INTO billing_ledger
+            (handoff_id, agent_id, conversation_id, user_id, start_time, end_time,
+             duration_minutes, hourly_rate, amount, period, created_at)
+            VALUES (?, ?, ?, (SELECT user_id FROM conversations WHERE id = ?), ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                handoff_id,
+                agent_id,
+                conversation_id,
+                conversation_id,
+                start_time.isoformat(),
+                end_time.isoformat(),
+                duration_minutes,
+                hourly_rate,
+                amount,
+                period,
+                end_time.isoformat()
+            )
+        )
+        
+        cursor.execute(
+            """
+            INSERT INTO billing_rollups (period, agent_id, sessions, minutes, amount, updated_at)
+            VALUES (?, ?, 1, ?, ?, ?)
+            ON CONFLICT (period, agent_id) DO UPDATE SET
+                sessions = sessions + 1,
+                minutes = minutes + excluded.minutes,
+                amount = amount + excluded.amount,
+                updated_at = excluded.updated_at
+            """,
+            (period, agent_id, duration_minutes, amount, end_time.isoformat())
+        )
+        
+        return amount
+    
+    def iter_billing_entries(self, start=None, end=None, agent_id=None, period=None, batch_size=None):
+        """
+        Iterate over billing ledger entries in the order they were written.
+        
+        Entries are read in batches keyed on the ledger ID, each in its own
+        short read, so exporting a large ledger never holds the database
+        lock for long.
+        
+        Args:
+            start: Optional ISO timestamp; only sessions ending at or after it
+            end: Optional ISO timestamp; only sessions ending before it
+            agent_id: Optional agent to export
+            period: Optional billing period (YYYY-MM)
+            batch_size: Number of entries per read
+        
+        Yields:
+            Dict: Ledger entries
+        """
+        batch_size = batch_size or Config.BILLING_EXPORT_BATCH_SIZE
+        filters = ""
+        params = []
+        
+        if start:
+            filters += " AND end_time >= ?"
+            params.append(start)
+        if end:
+            filters += " AND end_time < ?"
+            params.append(end)
+        if agent_id:
+            filters += " AND agent_id = ?"
+            params.append(agent_id)
+        if period:
+            filters += " AND period = ?"
+            params.append(period)
+        
+        last_id = 0
+        while True:
+            with self.connection() as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT {", ".join(BILLING_LEDGER_COLUMNS)}
+                    FROM billing_ledger
+                    WHERE id > ?{filters}
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    [last_id, *params, batch_size]
+                )
+                rows = cursor.fetchall()
+            
+            for row in rows:
+                yield dict(row)
+            
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]["id"]
+    
+    def get_billing_rollups(self, period=None, agent_id=None):
+        """
+        Get billing totals per period and agent.
+        
+        Args:
+            period: Optional billing period (YYYY-MM)
+            agent_id: Optional agent
+        
+        Returns:
+            List[Dict]: Sessions, minutes and amount per period and agent
+        """
+        query = "SELECT * FROM billing_rollups WHERE 1 = 1"
+        params = []
+        
+        if period:
+            query += " AND period = ?"
+            params.append(period)
+        if agent_id:
+            query += " AND agent_id = ?"
+            params.append(agent_id)
+        
+        with self.connection() as cursor:
+            cursor.execute(query + " ORDER BY period, agent_id", params)
+            
+            return [dict(row) for row in cursor.fetchall()]
+    
+    @timed("database.get_agent_stats")
+    def get_agent_stats(self, agent_id, since=None):
+        """
+        Get the aggregated ratings and conversations of an agent.
+        
+        Args:
+            agent_id: ID of the agent
+            since: Optional datetime to aggregate from, rounded down to the hour
+        
+        Returns:
+            Dict: Rating and conversation counts, sums, minimums, maximums and earnings
+        """
+        with self.connection() as cursor:
+            if since is None:
+                cursor.execute("SELECT * FROM agent_stats WHERE agent_id = ?", (agent_id,))
+            else:
+                cursor.execute(
+                    """
+                    SELECT
+                        SUM(rating_count) AS rating_count,
+                        SUM(rating_sum) AS rating_sum,
+                        MIN(rating_min) AS rating_min,
+                        MAX(rating_max) AS rating_max,
+                        SUM(conversation_count) AS conversation_count,
+                        SUM(minutes_sum) AS minutes_sum,
+                        MIN(minutes_min) AS minutes_min,
+                        MAX(minutes_max) AS minutes_max,
+                        SUM(earnings) AS earnings
+                    FROM agent_stats_hourly
+                    WHERE agent_id = ? AND bucket >= ?
+                    """,
+                    (agent_id, since.strftime(STATS_BUCKET_FORMAT))
+                )
+            
+            row = cursor.fetchone()
+            stats = dict(row) if row else {}
+            
+            for column in ("rating_count", "rating_sum", "conversation_count", "minutes_sum", "earnings"):
+                stats[column] = stats.get(column) or 0
+            for column in ("rating_min", "rating_max", "minutes_min", "minutes_max"):
+                stats.setdefault(column, None)
+            
+            return stats
     
+    @timed("database.register_user")
     def register_user(self, user_id):
         """Register a new user."""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
+        with self.unit_of_work() as cursor:
             cursor.execute(
                 "INSERT OR IGNORE INTO users (id) VALUES (?)",
                 (user_id,)
             )
-            conn.commit()
             
             return {"id": user_id}
     
+    @timed("database.create_agent")
     def create_agent(self, agent_data):
         """Create a new agent."""
         agent_id = agent_data.get("agent_id") or str(uuid.uuid4())
         specialties = json.dumps(agent_data.get("specialties", []))
         languages = json.dumps(agent_data.get("languages", []))
         
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
+        with self.unit_of_work() as cursor:
             now = datetime.now().isoformat()
             
             cursor.execute(
@@ -151,14 +708,13 @@ class DatabaseManager:
                     now
                 )
             )
-            conn.commit()
             
-            return self.get_agent(agent_id)
+            return self._fetch_agent(cursor, agent_id)
     
+    @timed("database.update_agent")
     def update_agent(self, agent_id, agent_data):
         """Update an existing agent."""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
+        with self.unit_of_work() as cursor:
             now = datetime.now().isoformat()
             
             # Build the update query dynamically based on provided fields
@@ -168,27 +724,27 @@ class DatabaseManager:
             if "name" in agent_data:
                 update_parts.append("name = ?")
                 params.append(agent_data["name"])
-                
+            
             if "level" in agent_data:
                 update_parts.append("level = ?")
                 params.append(agent_data["level"])
-                
+            
             if "hourly_rate" in agent_data:
                 update_parts.append("hourly_rate = ?")
                 params.append(agent_data["hourly_rate"])
-                
+            
             if "specialties" in agent_data:
                 update_parts.append("specialties = ?")
                 params.append(json.dumps(agent_data["specialties"]))
-                
+            
             if "languages" in agent_data:
                 update_parts.append("languages = ?")
                 params.append(json.dumps(agent_data["languages"]))
-                
+            
             if "status" in agent_data:
                 update_parts.append("status = ?")
                 params.append(agent_data["status"])
-                
+            
             update_parts.append("updated_at = ?")
             params.append(now)
             
@@ -204,68 +760,273 @@ class DatabaseManager:
                 """,
                 params
             )
-            conn.commit()
             
             if cursor.rowcount == 0:
                 raise ValueError(f"Agent with ID {agent_id} not found")
-                
-            return self.get_agent(agent_id)
-    
-    def get_agent(self, agent_id):
-        """Get agent details."""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
             
+            return self._fetch_agent(cursor, agent_id)
+    
+    @staticmethod
+    def _agent_column_value(field, value):
+        """Convert an agent field to the form stored in the agents table."""
+        if field in ("specialties", "languages"):
+            return json.dumps(value or [])
+        return getattr(value, "value", value)
+    
+    def _select_agents(self, cursor, agent_ids):
+        """Read several agents by ID, a chunk of IDs per query."""
+        agents = []
+        for start in range(0, len(agent_ids), SQL_IN_CHUNK_SIZE):
+            chunk = agent_ids[start:start + SQL_IN_CHUNK_SIZE]
             cursor.execute(
-                "SELECT * FROM agents WHERE id = ?",
-                (agent_id,)
+                AGENT_SELECT + f" WHERE a.id IN ({', '.join('?' * len(chunk))})",
+                chunk
             )
+            agents.extend(self._row_to_agent(row) for row in cursor.fetchall())
+        return agents
+    
+    def create_agents(self, agents_data):
+        """
+        Create several agents in one transaction.
+        
+        Args:
+            agents_data: Data for each new agent
+        
+        Returns:
+            List[Dict]: The created agents, built from the inserted values
+        """
+        now = datetime.now().isoformat()
+        agents = [
+            {
+                "id": agent_data.get("agent_id") or str(uuid.uuid4()),
+                "name": agent_data["name"],
+                "level": self._agent_column_value("level", agent_data["level"]),
+                "hourly_rate": agent_data["hourly_rate"],
+                "specialties": agent_data.get("specialties") or [],
+                "languages": agent_data.get("languages") or [],
+                "status": self._agent_column_value("status", agent_data.get("status") or "offline"),
+                "created_at": now,
+                "updated_at": now,
+                "rating": None
+            }
+            for agent_data in agents_data
+        ]
+        
+        with self.unit_of_work() as cursor:
+            cursor.executemany(
+                """
+                INSERT INTO agents 
+                (id, name, level, hourly_rate, specialties, languages, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        agent["id"],
+                        agent["name"],
+                        agent["level"],
+                        agent["hourly_rate"],
+                        json.dumps(agent["specialties"]),
+                        json.dumps(agent["languages"]),
+                        agent["status"],
+                        now,
+                        now
+                    )
+                    for agent in agents
+                ]
+            )
+        
+        return agents
+    
+    def update_agents(self, updates):
+        """
+        Update several agents in one transaction.
+        
+        Updates that change the same set of fields are applied with a single
+        executemany, and the results are read back in batches.
+        
+        Args:
+            updates: Fields to update for each agent, each including its "agent_id"
+        
+        Returns:
+            Dict: The updated agents and the IDs that were not found
+        """
+        now = datetime.now().isoformat()
+        
+        # Group the updates by the fields they change
+        groups = {}
+        for update in updates:
+            fields = tuple(field for field in AGENT_UPDATE_FIELDS if field in update)
+            groups.setdefault(fields, []).append(
+                tuple(self._agent_column_value(field, update[field]) for field in fields)
+                + (now, update["agent_id"])
+            )
+        
+        agent_ids = list(dict.fromkeys(update["agent_id"] for update in updates))
+        
+        with self.unit_of_work() as cursor:
+            for fields, params in groups.items():
+                set_clause = ", ".join(f"{field} = ?" for field in fields + ("updated_at",))
+                cursor.executemany(
+                    f"UPDATE agents SET {set_clause} WHERE id = ?",
+                    params
+                )
             
-            row = cursor.fetchone()
-            
-            if not row:
-                raise ValueError(f"Agent with ID {agent_id} not found")
-                
-            # Calculate average rating
-            cursor.execute(
-                "SELECT AVG(rating) as avg_rating FROM agent_ratings WHERE agent_id = ?",
-                (agent_id,)
+            agents = self._select_agents(cursor, agent_ids)
+        
+        found = {agent["id"]: agent for agent in agents}
+        return {
+            "updated": [found[agent_id] for agent_id in agent_ids if agent_id in found],
+            "not_found": [agent_id for agent_id in agent_ids if agent_id not in found]
+        }
+    
+    def update_agent_statuses(self, agent_ids, status):
+        """
+        Set the status of several agents in one transaction.
+        
+        Args:
+            agent_ids: IDs of the agents
+            status: New status value
+        
+        Returns:
+            Dict: The status, update time, updated agent IDs and the IDs that were not found
+        """
+        now = datetime.now().isoformat()
+        status = self._agent_column_value("status", status)
+        agent_ids = list(dict.fromkeys(agent_ids))
+        
+        with self.unit_of_work() as cursor:
+            cursor.executemany(
+                """
+                UPDATE agents
+                SET status = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                [(status, now, agent_id) for agent_id in agent_ids]
             )
             
-            avg_rating = cursor.fetchone()["avg_rating"]
+            # Find which agents exist within the same transaction
+            found = set()
+            for start in range(0, len(agent_ids), SQL_IN_CHUNK_SIZE):
+                chunk = agent_ids[start:start + SQL_IN_CHUNK_SIZE]
+                cursor.execute(
+                    f"SELECT id FROM agents WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                )
+                found.update(row[0] for row in cursor.fetchall())
+        
+        return {
+            "status": status,
+            "updated_at": now,
+            "updated": [agent_id for agent_id in agent_ids if agent_id in found],
+            "not_found": [agent_id for agent_id in agent_ids if agent_id not in found]
+        }
+    
+    def update_available_agent_statuses(self, agent_ids, status):
+        """
+        Set the status of those of several agents that are still available, in one transaction.
+        
+        Agents claimed as busy in the meantime, possibly through another
+        worker, keep their status.
+        
+        Args:
+            agent_ids: IDs of the agents
+            status: New status value
+        
+        Returns:
+            List[str]: IDs of the agents whose status was changed
+        """
+        now = datetime.now().isoformat()
+        status = self._agent_column_value("status", status)
+        agent_ids = list(dict.fromkeys(agent_ids))
+        
+        with self.unit_of_work() as cursor:
+            # The write lock is held, so the agents found here are the ones updated below
+            available = []
+            for start in range(0, len(agent_ids), SQL_IN_CHUNK_SIZE):
+                chunk = agent_ids[start:start + SQL_IN_CHUNK_SIZE]
+                cursor.execute(
+                    f"SELECT id FROM agents WHERE id IN ({', '.join('?' * len(chunk))}) AND status = 'available'",
+                    chunk
+                )
+                available.extend(row[0] for row in cursor.fetchall())
             
-            agent = dict(row)
-            agent["specialties"] = json.loads(agent["specialties"]) if agent["specialties"] else []
-            agent["languages"] = json.loads(agent["languages"]) if agent["languages"] else []
-            agent["rating"] = avg_rating
+            cursor.executemany(
+                """
+                UPDATE agents
+                SET status = ?, updated_at = ?
+                WHERE id = ? AND status = 'available'
+                """,
+                [(status, now, agent_id) for agent_id in available]
+            )
+        
+        return available
+    
+    @timed("database.get_agent")
+    def get_agent(self, agent_id):
+        """Get agent details."""
+        with self.connection() as cursor:
+            return self._fetch_agent(cursor, agent_id)
+    
+    def _fetch_agent(self, cursor, agent_id):
+        """Read an agent on the caller's cursor, so uncommitted changes are visible."""
+        cursor.execute(
+            AGENT_SELECT + " WHERE a.id = ?",
+            (agent_id,)
+        )
+        
+        row = cursor.fetchone()
+        
+        if not row:
+            raise ValueError(f"Agent with ID {agent_id} not found")
+        
+        return self._row_to_agent(row)
+    
+    @staticmethod
+    def _row_to_agent(row):
+        """Convert an agents table row to an agent dict."""
+        agent = dict(row)
+        agent["specialties"] = json.loads(agent["specialties"]) if agent["specialties"] else []
+        agent["languages"] = json.loads(agent["languages"]) if agent["languages"] else []
+        return agent
+    
+    @timed("database.list_agents")
+    def list_agents(self, status=None, updated_since=None):
+        """List agents, optionally filtered by status or last update time."""
+        query = AGENT_SELECT + " WHERE 1 = 1"
+        params = []
+        
+        if status:
+            query += " AND a.status = ?"
+            params.append(status)
+        
+        if updated_since:
+            query += " AND a.updated_at >= ?"
+            params.append(updated_since)
+        
+        with self.connection() as cursor:
+            cursor.execute(query, params)
             
-            return agent
+            return [self._row_to_agent(row) for row in cursor.fetchall()]
     
     def delete_agent(self, agent_id):
         """Delete an agent."""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            
+        with self.unit_of_work() as cursor:
             cursor.execute(
                 "DELETE FROM agents WHERE id = ?",
                 (agent_id,)
             )
-            conn.commit()
             
             if cursor.rowcount == 0:
                 raise ValueError(f"Agent with ID {agent_id} not found")
-                
+            
             return {"success": True, "message": f"Agent {agent_id} deleted successfully"}
     
+    @timed("database.list_conversations")
     def list_conversations(self, user_id, page=1, limit=20):
         """List conversations for a user."""
         offset = (page - 1) * limit
         
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
+        with self.connection() as cursor:
             cursor.execute(
                 """
                 SELECT * FROM conversations 
@@ -281,12 +1042,12 @@ class DatabaseManager:
             
             return conversations
     
+    @timed("database.create_conversation")
     def create_conversation(self, conversation_data):
         """Create a new conversation."""
         conversation_id = str(uuid.uuid4())
         
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
+        with self.unit_of_work() as cursor:
             now = datetime.now().isoformat()
             
             cursor.execute(
@@ -305,12 +1066,8 @@ class DatabaseManager:
                     now
                 )
             )
-            conn.commit()
             
             # Return the created conversation
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
             cursor.execute(
                 "SELECT * FROM conversations WHERE id = ?",
                 (conversation_id,)
@@ -321,13 +1078,12 @@ class DatabaseManager:
             
             return conversation
     
+    @timed("database.save_summary")
     def save_summary(self, summary_data):
         """Save a conversation summary."""
         summary_id = str(uuid.uuid4())
         
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            
+        with self.unit_of_work() as cursor:
             cursor.execute(
                 """
                 INSERT INTO summaries
@@ -340,18 +1096,15 @@ class DatabaseManager:
                     summary_data["summary"]
                 )
             )
-            conn.commit()
             
             return {"id": summary_id, **summary_data}
     
+    @timed("database.list_messages")
     def list_messages(self, conversation_id, page=1, limit=50):
         """List messages in a conversation."""
         offset = (page - 1) * limit
         
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
+        with self.connection() as cursor:
             cursor.execute(
                 """
                 SELECT * FROM messages 
@@ -367,40 +1120,51 @@ class DatabaseManager:
             
             return messages
     
-    def create_message(self, message_data):
-        """Create a new message."""
+    @staticmethod
+    def add_message(cursor, conversation_id, role, content, at=None):
+        """
+        Add a message to a conversation and touch the conversation.
+        
+        Runs on the caller's cursor so the message is committed together
+        with whatever caused it.
+        
+        Returns:
+            str: ID of the new message
+        """
         message_id = str(uuid.uuid4())
         
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                """
-                INSERT INTO messages 
-                (id, conversation_id, role, content)
-                VALUES (?, ?, ?, ?)
-                """,
-                (
-                    message_id,
-                    message_data["conversation_id"],
-                    message_data["role"],
-                    message_data["content"]
-                )
-            )
-            
-            # Update the conversation's updated_at timestamp
-            now = datetime.now().isoformat()
-            cursor.execute(
-                """
-                UPDATE conversations
-                SET updated_at = ?
-                WHERE id = ?
-                """,
-                (now, message_data["conversation_id"])
+        cursor.execute(
+            """
+            INSERT INTO messages 
+            (id, conversation_id, role, content)
+            VALUES (?, ?, ?, ?)
+            """,
+            (message_id, conversation_id, role, content)
+        )
+        
+        # Update the conversation's updated_at timestamp
+        cursor.execute(
+            """
+            UPDATE conversations
+            SET updated_at = ?
+            WHERE id = ?
+            """,
+            ((at or datetime.now()).isoformat(), conversation_id)
+        )
+        
+        return message_id
+    
+    @timed("database.create_message")
+    def create_message(self, message_data):
+        """Create a new message."""
+        with self.unit_of_work() as cursor:
+            message_id = self.add_message(
+                cursor,
+                message_data["conversation_id"],
+                message_data["role"],
+                message_data["content"]
             )
             
-            conn.commit()
-            
             return {"id": message_id, **message_data}
 
 # Singleton instance
@@ -0,0 +1,201 @@
+import json
+import queue
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Iterable, Any, Callable
+
+from config import Config
+
+class EventError(Exception):
+    """Exception raised for errors in the event broker."""
+    pass
+
+class Subscription:
+    """A subscriber's queue of events, optionally limited to one agent and some event types."""
+    
+    def __init__(self, broker, agent_id: Optional[str] = None,
+                 event_types: Optional[Iterable[str]] = None, max_size: int = 1000):
+        """Initialize an empty subscription."""
+        self.broker = broker
+        self.agent_id = agent_id
+        self.event_types = set(event_types) if event_types else None
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_size)
+    
+    def matches(self, event: Dict) -> bool:
+        """Check whether an event is for this subscriber."""
+        if self.agent_id is not None and event.get("agent_id") != self.agent_id:
+            return False
+        return self.event_types is None or event["type"] in self.event_types
+    
+    def put(self, event: Dict):
+        """Queue an event, dropping the oldest one if the subscriber is not keeping up."""
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+    
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Wait for the next event, or return None after `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def close(self):
+        """Stop receiving events."""
+        self.broker.unsubscribe(self)
+
+class EventBroker:
+    """
+    In-process publish/subscribe broker for agent events.
+    
+    Each subscriber gets its own bounded queue, so a slow consumer only
+    loses its own oldest events and never blocks publishers.
+    """
+    
+    def __init__(self):
+        """Initialize a broker without subscribers."""
+        self._subscriptions = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _event(event_type: str, data: Dict, agent_id: Optional[str], conversation_id: Optional[str]) -> Dict:
+        """Build an event."""
+        return {
+            "id": str(uuid.uuid4()),
+            "type": event_type,
+            "agent_id": agent_id,
+            "conversation_id": conversation_id,
+            "data": data,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def publish(self, event_type: str, data: Optional[Dict[str, Any]] = None,
+                agent_id: Optional[str] = None, conversation_id: Optional[str] = None) -> Dict:
+        """
+        Publish an event to all matching subscribers.
+        
+        Args:
+            event_type: Type of the event
+            data: Event payload
+            agent_id: Optional agent the event is about
+            conversation_id: Optional conversation the event is about
+        
+        Returns:
+            Dict: The published event
+        """
+        event = self._event(event_type, data or {}, agent_id, conversation_id)
+        self._deliver(event)
+        return event
+    
+    def _deliver(self, event: Dict):
+        """Hand an event to the subscribers in this process."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            listeners = list(self._listeners)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.put(event)
+        for callback, event_types in listeners:
+            if event_types is None or event["type"] in event_types:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Error in event listener: {str(e)}")
+    
+    def subscribe(self, agent_id: Optional[str] = None,
+                  event_types: Optional[Iterable[str]] = None) -> Subscription:
+        """
+        Subscribe to events.
+        
+        Args:
+            agent_id: Optional agent to receive events for, all agents if omitted
+            event_types: Optional event types to receive, all types if omitted
+        
+        Returns:
+            Subscription: The subscription; close it when done
+        """
+        subscription = Subscription(self, agent_id, event_types, Config.EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        """Remove a subscription."""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+    
+    def add_listener(self, callback: Callable[[Dict], None], event_types: Optional[Iterable[str]] = None):
+        """
+        Call `callback` with every matching event delivered to this process.
+        
+        Listeners run synchronously on delivery, so they must be quick.
+        
+        Args:
+            callback: Function called with each event
+            event_types: Optional event types to listen for, all types if omitted
+        """
+        with self._lock:
+            self._listeners.append((callback, set(event_types) if event_types else None))
+
+class RedisEventBroker(EventBroker):
+    """
+    Event broker that fans events out across workers through Redis pub/sub.
+    
+    Events are published to a Redis channel, and each worker runs a single
+    listener thread that delivers them to its local subscribers, including
+    the events it published itself.
+    """
+    
+    def __init__(self, redis_url: str, channel: str):
+        """Connect to Redis and start listening on the channel."""
+        super().__init__()
+        try:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+            self._channel = channel
+            self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{channel: self._on_message})
+            self._listener = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except Exception as e:
+            raise EventError(f"Error connecting to Redis: {str(e)}")
+    
+    def _on_message(self, message: Dict):
+        """Deliver an event received from Redis."""
+        try:
+            self._deliver(json.loads(message["data"]))
+        except Exception as e:
+            print(f"Error delivering event: {str(e)}")
+    
+    def publish(self, event_type: str, data: Optional[Dict[str, Any]] = None,
+                agent_id: Optional[str] = None, conversation_id: Optional[str] = None) -> Dict:
+        event = self._event(event_type, data or {}, agent_id, conversation_id)
+        try:
+            self._redis.publish(self._channel, json.dumps(event, default=str))
+        except Exception as e:
+            # Publishing is best effort; still reach the subscribers of this worker
+            print(f"Error publishing event: {str(e)}")
+            self._deliver(event)
+        return event
+
+# Singleton instance
+_event_broker_instance = None
+
+def get_event_broker():
+    """Get the singleton event broker, backed by Redis when REDIS_URL is set."""
+    global _event_broker_instance
+    if _event_broker_instance is None:
+        if Config.REDIS_URL:
+            _event_broker_instance = RedisEventBroker(Config.REDIS_URL, Config.EVENT_CHANNEL)
+        else:
+            _event_broker_instance = EventBroker()
+    return _event_broker_instance
@@ -0,0 +1,304 @@
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple, Callable
+
+from config import Config
+
+# Ticket columns other than the JSON encoded ones, in select order
+TICKET_COLUMNS = ("id", "sequence", "conversation_id", "priority", "status", "enqueued_at", "finished_at")
+
+class HandoffQueue:
+    """
+    Per-skill priority queues of handoffs waiting for an agent.
+    
+    Handoffs with the same language, level and specialty requirements share
+    a queue. Within a queue, higher priority handoffs go first and equal
+    priorities are served in arrival order.
+    
+    Tickets are kept in the handoff_tickets table, so every worker sees the
+    same queues and waiting handoffs survive worker restarts. A ticket taken
+    for dispatch is marked as dispatching in the same transaction that finds
+    it, so concurrent dispatchers in different workers never assign it twice.
+    """
+    
+    def __init__(self, db_manager, max_finished: int = 10000, dispatch_timeout: float = 60):
+        """
+        Initialize the queue.
+        
+        Args:
+            db_manager: Database manager holding the handoff_tickets table
+            max_finished: Number of assigned and cancelled tickets kept for lookups
+            dispatch_timeout: Seconds after which a ticket taken by a worker that
+                never completed or released it is queued again
+        """
+        self.db_manager = db_manager
+        self._max_finished = max_finished
+        self._dispatch_timeout = dispatch_timeout
+        self._lock = threading.Lock()
+        self._dispatcher = None
+    
+    def __len__(self) -> int:
+        with self.db_manager.connection() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM handoff_tickets WHERE status IN ('queued', 'dispatching')")
+            return cursor.fetchone()[0]
+    
+    def has_waiting(self) -> bool:
+        """Check whether any ticket is waiting or being dispatched, without counting them."""
+        with self.db_manager.connection() as cursor:
+            cursor.execute(
+                "SELECT EXISTS (SELECT 1 FROM handoff_tickets WHERE status IN ('queued', 'dispatching'))"
+            )
+            return bool(cursor.fetchone()[0])
+    
+    @staticmethod
+    def skill_key(requirements: Dict) -> Tuple:
+        """Get the queue key for a set of handoff requirements."""
+        level = requirements.get("preferred_level")
+        level = getattr(level, "value", level)
+        return (
+            requirements.get("preferred_language") or "",
+            level or "",
+            tuple(sorted(requirements.get("required_specialties") or []))
+        )
+    
+    @staticmethod
+    def _row_to_ticket(row) -> Dict:
+        """Convert a handoff_tickets row to a ticket."""
+        ticket = {column: row[column] for column in TICKET_COLUMNS}
+        ticket["requirements"] = json.loads(row["requirements"])
+        if ticket["finished_at"] is None:
+            del ticket["finished_at"]
+        if row["details"]:
+            ticket.update(json.loads(row["details"]))
+        return ticket
+    
+    def enqueue(self, conversation_id: str, requirements: Dict, priority: int = 0) -> Dict:
+        """
+        Add a handoff to the queue for its skills.
+        
+        Args:
+            conversation_id: ID of the conversation
+            requirements: Requirements for the agent
+            priority: Priority of the handoff, higher is served first
+        
+        Returns:
+            Dict: The queued ticket
+        """
+        language, level, specialties = self.skill_key(requirements)
+        ticket = {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "requirements": requirements,
+            "priority": priority,
+            "status": "queued",
+            "enqueued_at": datetime.now().isoformat()
+        }
+        
+        with self.db_manager.unit_of_work() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO handoff_tickets
+                (id, conversation_id, requirements, language, level, specialties, priority, status, enqueued_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?)
+                """,
+                (
+                    ticket["id"],
+                    conversation_id,
+                    json.dumps(requirements, default=str),
+                    language,
+                    level,
+                    json.dumps(specialties),
+                    priority,
+                    ticket["enqueued_at"]
+                )
+            )
+            ticket["sequence"] = cursor.lastrowid
+        
+        return ticket
+    
+    def _finish(self, ticket_id: str, status: str, from_statuses: Tuple[str, ...], cursor=None,
+                **details) -> Optional[Dict]:
+        """Record the outcome of a ticket that is in one of `from_statuses`."""
+        if cursor is None:
+            with self.db_manager.unit_of_work() as cursor:
+                return self._finish(ticket_id, status, from_statuses, cursor, **details)
+        
+        placeholders = ", ".join("?" for _ in from_statuses)
+        cursor.execute(
+            f"""
+            UPDATE handoff_tickets
+            SET status = ?, finished_at = ?, details = ?
+            WHERE id = ? AND status IN ({placeholders})
+            """,
+            (status, datetime.now().isoformat(), json.dumps(details) if details else None,
+             ticket_id, *from_statuses)
+        )
+        if not cursor.rowcount:
+            return None
+        
+        # Keep only the most recently finished tickets
+        cursor.execute(
+            """
+            DELETE FROM handoff_tickets WHERE sequence IN (
+                SELECT sequence FROM handoff_tickets
+                WHERE finished_at IS NOT NULL
+                ORDER BY finished_at DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self._max_finished,)
+        )
+        
+        cursor.execute("SELECT * FROM handoff_tickets WHERE id = ?", (ticket_id,))
+        return self._row_to_ticket(cursor.fetchone())
+    
+    def complete(self, ticket_id: str, cursor=None, **details) -> Optional[Dict]:
+        """
+        Mark a ticket taken for dispatch as assigned to an agent.
+        
+        Pass the cursor of an open unit of work to complete the ticket in the
+        same transaction that claims the agent.
+        """
+        return self._finish(ticket_id, "assigned", ("dispatching",), cursor, **details)
+    
+    @staticmethod
+    def is_dispatching(cursor, ticket_id: str) -> bool:
+        """Check within a unit of work whether a ticket is still taken for dispatch."""
+        cursor.execute("SELECT 1 FROM handoff_tickets WHERE id = ? AND status = 'dispatching'", (ticket_id,))
+        return cursor.fetchone() is not None
+    
+    def cancel(self, ticket_id: str) -> Optional[Dict]:
+        """Cancel a waiting ticket."""
+        return self._finish(ticket_id, "cancelled", ("queued", "dispatching"))
+    
+    def release(self, ticket_id: str):
+        """Return a ticket taken for dispatch to its original place in the queue."""
+        with self.db_manager.unit_of_work() as cursor:
+            cursor.execute(
+                "UPDATE handoff_tickets SET status = 'queued', claimed_at = NULL WHERE id = ? AND status = 'dispatching'",
+                (ticket_id,)
+            )
+    
+    def get(self, ticket_id: str) -> Optional[Dict]:
+        """Get a ticket, including its queue position while it is waiting."""
+        with self.db_manager.connection() as cursor:
+            cursor.execute("SELECT * FROM handoff_tickets WHERE id = ?", (ticket_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            
+            ticket = self._row_to_ticket(row)
+            if ticket["status"] == "queued":
+                ticket["position"] = self._position(cursor, row)
+            return ticket
+    
+    def position(self, ticket_id: str) -> Optional[int]:
+        """Get the 1-based position of a ticket within its queue."""
+        with self.db_manager.connection() as cursor:
+            cursor.execute("SELECT * FROM handoff_tickets WHERE id = ? AND status = 'queued'", (ticket_id,))
+            row = cursor.fetchone()
+            return self._position(cursor, row) if row is not None else None
+    
+    @staticmethod
+    def _position(cursor, row) -> int:
+        """Count the waiting tickets of the same queue that go before a ticket."""
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM handoff_tickets
+            WHERE status = 'queued' AND language = ? AND level = ? AND specialties = ?
+            AND (priority > ? OR (priority = ? AND sequence < ?))
+            """,
+            (row["language"], row["level"], row["specialties"], row["priority"], row["priority"], row["sequence"])
+        )
+        return 1 + cursor.fetchone()[0]
+    
+    def take_for_agent(self, agent: Dict) -> Optional[Dict]:
+        """
+        Take the waiting ticket an agent should handle next.
+        
+        Among the queues whose requirements the agent satisfies, the head
+        ticket with the highest priority wins, then the one waiting longest.
+        The ticket is held out of the queue until it is completed or released,
+        so concurrent dispatchers never assign it twice.
+        
+        Args:
+            agent: Agent record
+        
+        Returns:
+            Optional[Dict]: The ticket, or None if nothing is waiting for this agent
+        """
+        languages = agent.get("languages") or []
+        specialties = agent.get("specialties") or []
+        language_filter = ", ".join("?" for _ in languages)
+        specialty_filter = ", ".join("?" for _ in specialties)
+        now = datetime.now()
+        stale_before = (now - timedelta(seconds=self._dispatch_timeout)).isoformat()
+        
+        with self.db_manager.unit_of_work() as cursor:
+            # Every requirement is matched in SQL, so only the chosen row is read under the write lock
+            cursor.execute(
+                f"""
+                SELECT * FROM handoff_tickets
+                WHERE (status = 'queued' OR (status = 'dispatching' AND claimed_at < ?))
+                AND (language = ''{f" OR language IN ({language_filter})" if languages else ""})
+                AND (level = '' OR level = ?)
+                AND NOT EXISTS (
+                    SELECT 1 FROM json_each(handoff_tickets.specialties)
+                    {f"WHERE value NOT IN ({specialty_filter})" if specialties else ""}
+                )
+                ORDER BY priority DESC, sequence
+                LIMIT 1
+                """,
+                (stale_before, *languages, agent.get("level") or "", *specialties)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            
+            ticket = self._row_to_ticket(row)
+            cursor.execute(
+                "UPDATE handoff_tickets SET status = 'dispatching', claimed_at = ? WHERE id = ?",
+                (now.isoformat(), ticket["id"])
+            )
+            return ticket
+    
+    def start_dispatcher(self, dispatch: Callable[[], None], interval: float):
+        """
+        Run `dispatch` periodically in a background thread while tickets are waiting.
+        
+        This picks up agents that become available through other workers. The
+        thread exits once the queues are empty and is restarted by the next call.
+        """
+        with self._lock:
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        with self._lock:
+                            if not self.has_waiting():
+                                self._dispatcher = None
+                                return
+                        dispatch()
+                    except Exception as e:
+                        print(f"Error dispatching queued handoffs: {str(e)}")
+            
+            self._dispatcher = threading.Thread(target=run, name="handoff-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+# Singleton instance
+_handoff_queue_instance = None
+
+def get_handoff_queue(db_manager=None):
+    """Get the singleton handoff queue."""
+    global _handoff_queue_instance
+    if _handoff_queue_instance is None:
+        from services.database import get_db_manager
+        _handoff_queue_instance = HandoffQueue(db_manager or get_db_manager(),
+                                               dispatch_timeout=Config.HANDOFF_DISPATCH_TIMEOUT)
+    return _handoff_queue_instance
@@ -1,30 +1,58 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+import random
+import time
 import uuid
 import json
 
+from config import Config
 from schemas.agents import AgentStatus, AgentLevel
+from services.agent_index import get_agent_index
+from services.handoff_queue import get_handoff_queue
+from services.presence import get_presence_table
+from services.events import get_event_broker
+from services.agent_cache import get_agent_cache
 
 class HumanAgentError(Exception):
     """Exception for human agent errors."""
     pass
 
+@dataclass(frozen=True, slots=True)
 class HumanAgent:
     """Represents a human agent that can assist with conversations."""
+    id: str
+    name: str
+    level: AgentLevel
+    hourly_rate: float
+    status: AgentStatus = AgentStatus.OFFLINE
+    specialties: Tuple[str, ...] = ()
+    languages: Tuple[str, ...] = ()
+    rating: Optional[float] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    updated_at: Optional[str] = None
+    
+    def __post_init__(self):
+        """Default the update time to the creation time."""
+        if self.updated_at is None:
+            object.__setattr__(self, "updated_at", self.created_at)
+    
+    @classmethod
+    def from_dict(cls, agent: Dict) -> "HumanAgent":
+        """Build an agent from a record as returned by the database manager."""
+        return cls(
+            id=agent["id"],
+            name=agent["name"],
+            level=AgentLevel(agent["level"]),
+            hourly_rate=agent["hourly_rate"],
+            status=AgentStatus(agent.get("status") or AgentStatus.OFFLINE),
+            specialties=tuple(agent.get("specialties") or ()),
+            languages=tuple(agent.get("languages") or ()),
+            rating=agent.get("rating"),
+            created_at=agent.get("created_at") or datetime.now().isoformat(),
+            updated_at=agent.get("updated_at")
+        )
     
-    def __init__(self, agent_id: str, name: str, level: AgentLevel, hourly_rate: float):
-        """Initialize a human agent."""
-        self.id = agent_id
-        self.name = name
-        self.level = level
-        self.hourly_rate = hourly_rate
-        self.status = AgentStatus.OFFLINE
-        self.specialties = []
-        self.languages = []
-        self.rating = None
-        self.created_at = datetime.now().isoformat()
-        self.updated_at = self.created_at
-        
     def to_dict(self) -> Dict:
         """Convert agent to dictionary representation."""
         return {
@@ -33,8 +61,8 @@ class HumanAgent:
             "level": self.level,
             "hourly_rate": self.hourly_rate,
             "status": self.status,
-            "specialties": self.specialties,
-            "languages": self.languages,
+            "specialties": list(self.specialties),
+            "languages": list(self.languages),
             "rating": self.rating,
             "created_at": self.created_at,
             "updated_at": self.updated_at
@@ -43,17 +71,49 @@ class HumanAgent:
 class HumanAgentManager:
     """Manager for human agents."""
     
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, agent_index=None, handoff_queue=None, presence=None, events=None,
+                 agent_cache=None):
         """Initialize the human agent manager."""
         self.db_manager = db_manager
+        self.agent_index = agent_index if agent_index is not None else get_agent_index(db_manager)
+        self.handoff_queue = handoff_queue if handoff_queue is not None else get_handoff_queue(db_manager)
+        self.presence = presence if presence is not None else get_presence_table()
+        self.events = events if events is not None else get_event_broker()
+        self.agent_cache = agent_cache if agent_cache is not None else get_agent_cache()
+        
+        # Resume dispatching handoffs queued before this worker started
+        if self.handoff_queue.has_waiting():
+            self.handoff_queue.start_dispatcher(self.dispatch_queued_handoffs, Config.HANDOFF_DISPATCH_INTERVAL)
+    
+    def _index_agent(self, agent: Dict):
+        """Update the routing index, presence table and cache with a freshly written agent record."""
+        previous = self.agent_index.get(agent["id"])
+        self.agent_index.upsert(agent)
+        self.presence.set_status(agent["id"], agent["status"])
+        
+        if previous is None or previous["status"] != agent["status"]:
+            self.events.publish("status", {"status": agent["status"]}, agent_id=agent["id"])
         
+        # Cache last, after any events that invalidate it
+        self.agent_cache.put(agent)
+    
+    def _set_status(self, agent_id: str, status: str):
+        """Update an agent's status in the routing index and presence table."""
+        previous = self.agent_index.get(agent_id)
+        self.agent_index.set_status(agent_id, status)
+        self.presence.set_status(agent_id, status)
+        self.agent_cache.invalidate(agent_id)
+        
+        if previous is None or previous["status"] != status:
+            self.events.publish("status", {"status": status}, agent_id=agent_id)
+    
     def register_agent(self, agent_data: Dict) -> Dict:
         """
         Register a new human agent.
         
         Args:
             agent_data: Data for the new agent
-            
+        
         Returns:
             Dict: The created agent
         """
@@ -77,12 +137,172 @@ class HumanAgentManager:
                 raise HumanAgentError(f"Invalid hourly rate: {agent_data['hourly_rate']}")
             
             # Create agent in database
-            return self.db_manager.create_agent(agent_data)
+            agent = self.db_manager.create_agent(agent_data)
+            self._index_agent(agent)
+            if agent["status"] == AgentStatus.AVAILABLE.value:
+                self.dispatch_queued_handoffs([agent["id"]])
+            return agent
         except Exception as e:
             if isinstance(e, HumanAgentError):
                 raise
             raise HumanAgentError(f"Error registering agent: {str(e)}")
     
+    def get_agent(self, agent_id: str) -> Dict:
+        """
+        Get an agent's details.
+        
+        Args:
+            agent_id: ID of the agent
+        
+        Returns:
+            Dict: The agent
+        """
+        try:
+            agent = self.agent_cache.get_or_load(agent_id, self.db_manager.get_agent)
+            
+            # Agents sending heartbeats have their live status in the presence table, except that
+            # busy is set in the database by the claim, which the presence table of this worker may miss
+            presence = self.presence.get(agent_id)
+            if presence is not None:
+                if agent["status"] != AgentStatus.BUSY.value:
+                    agent["status"] = presence["status"]
+                agent["last_seen"] = presence["last_seen"]
+            
+            return agent
+        except Exception as e:
+            raise HumanAgentError(f"Error getting agent: {str(e)}")
+    
+    def heartbeat(self, agent_id: str, status: Optional[AgentStatus] = None) -> Dict:
+        """
+        Record a heartbeat from an agent.
+        
+        Heartbeats only update the presence table; the database is written
+        when the reported status differs from the current one. Agents that
+        stop sending heartbeats while available are set offline by the sweeper.
+        
+        Args:
+            agent_id: ID of the agent
+            status: Optional status reported by the agent
+        
+        Returns:
+            Dict: The agent's presence entry
+        """
+        try:
+            # Validate status
+            if status is not None:
+                try:
+                    status = AgentStatus(status)
+                except ValueError:
+                    raise HumanAgentError(f"Invalid agent status: {status}")
+            
+            # Pick up agents claimed as busy through other workers
+            self.agent_index.refresh()
+            agent = self.agent_index.get(agent_id)
+            if agent is None:
+                self.agent_index.refresh(force=True)
+                agent = self.agent_index.get(agent_id)
+                if agent is None:
+                    raise HumanAgentError(f"Agent {agent_id} not found")
+            
+            # A busy status from the database wins over the presence table, as in get_agent
+            presence = self.presence.get(agent_id)
+            if presence is None or agent["status"] == AgentStatus.BUSY.value:
+                current_status = agent["status"]
+            else:
+                current_status = presence["status"]
+            
+            if status is not None and status.value != current_status:
+                self.update_agent_status(agent_id, status)
+                current_status = status.value
+            
+            presence = self.presence.heartbeat(agent_id, current_status)
+            
+            self.presence.start_sweeper(self.sweep_stale_agents, Config.PRESENCE_SWEEP_INTERVAL)
+            
+            return presence
+        except Exception as e:
+            if isinstance(e, HumanAgentError):
+                raise
+            raise HumanAgentError(f"Error recording heartbeat: {str(e)}")
+    
+    def sweep_stale_agents(self) -> List[str]:
+        """
+        Set available agents whose heartbeats stopped offline.
+        
+        Busy agents are left alone until their conversation ends, and are
+        swept afterwards if they are still silent.
+        
+        Returns:
+            List[str]: IDs of the agents set offline
+        """
+        cutoff = time.time() - Config.PRESENCE_TIMEOUT_SECONDS
+        swept = []
+        
+        while True:
+            agent_ids = self.presence.take_stale(cutoff, Config.PRESENCE_SWEEP_BATCH_SIZE)
+            if not agent_ids:
+                break
+            
+            # Agents claimed as busy meanwhile, possibly through another worker, are left alone
+            offline_ids = self.db_manager.update_available_agent_statuses(agent_ids, AgentStatus.OFFLINE.value)
+            for agent_id in offline_ids:
+                self._set_status(agent_id, AgentStatus.OFFLINE.value)
+            left_alone = set(agent_ids).difference(offline_ids)
+            if left_alone:
+                # Give their presence entries and cached records the status the database has
+                self.agent_index.refresh(force=True)
+                for agent_id in left_alone:
+                    agent = self.agent_index.get(agent_id)
+                    if agent is not None:
+                        self._set_status(agent_id, agent["status"])
+            swept.extend(offline_ids)
+            
+            if len(agent_ids) < Config.PRESENCE_SWEEP_BATCH_SIZE:
+                break
+        
+        return swept
+    
+    def update_agent(self, agent_id: str, agent_data: Dict) -> Dict:
+        """
+        Update an agent's details.
+        
+        Args:
+            agent_id: ID of the agent
+            agent_data: Fields to update
+        
+        Returns:
+            Dict: The updated agent
+        """
+        try:
+            agent = self.db_manager.update_agent(agent_id, agent_data)
+            self.events.publish("agent_updated", {"fields": sorted(agent_data)}, agent_id=agent_id)
+            self._index_agent(agent)
+            if agent["status"] == AgentStatus.AVAILABLE.value:
+                self.dispatch_queued_handoffs([agent_id])
+            return agent
+        except Exception as e:
+            raise HumanAgentError(f"Error updating agent: {str(e)}")
+    
+    def delete_agent(self, agent_id: str) -> Dict:
+        """
+        Delete an agent.
+        
+        Args:
+            agent_id: ID of the agent
+        
+        Returns:
+            Dict: Result of the deletion
+        """
+        try:
+            result = self.db_manager.delete_agent(agent_id)
+            self.agent_index.remove(agent_id)
+            self.presence.remove(agent_id)
+            self.agent_cache.invalidate(agent_id)
+            self.events.publish("agent_deleted", {}, agent_id=agent_id)
+            return result
+        except Exception as e:
+            raise HumanAgentError(f"Error deleting agent: {str(e)}")
+    
     def update_agent_status(self, agent_id: str, status: AgentStatus) -> Dict:
         """
         Update an agent's status.
@@ -90,7 +310,7 @@ class HumanAgentManager:
         Args:
             agent_id: ID of the agent
             status: New status
-            
+        
         Returns:
             Dict: The updated agent
         """
@@ -103,183 +323,427 @@ class HumanAgentManager:
                 raise HumanAgentError(f"Invalid agent status: {status}")
             
             # Update in database
-            return self.db_manager.update_agent(agent_id, {"status": status.value})
+            agent = self.db_manager.update_agent(agent_id, {"status": status.value})
+            self._index_agent(agent)
+            
+            # Give the agent a waiting handoff straight away
+            if status == AgentStatus.AVAILABLE:
+                self.dispatch_queued_handoffs([agent_id])
+            
+            return agent
         except Exception as e:
             if isinstance(e, HumanAgentError):
                 raise
             raise HumanAgentError(f"Error updating agent status: {str(e)}")
     
+    def register_agents(self, agents_data: List[Dict]) -> List[Dict]:
+        """
+        Register several human agents in one transaction.
+        
+        Args:
+            agents_data: Data for each new agent
+        
+        Returns:
+            List[Dict]: The created agents
+        """
+        try:
+            agents = self.db_manager.create_agents(agents_data)
+            for agent in agents:
+                self._index_agent(agent)
+            
+            self._dispatch_to_available(agents)
+            return agents
+        except Exception as e:
+            raise HumanAgentError(f"Error registering agents: {str(e)}")
+    
+    def update_agents(self, updates: List[Dict]) -> Dict:
+        """
+        Update several agents in one transaction.
+        
+        Args:
+            updates: Fields to update for each agent, each including its "agent_id"
+        
+        Returns:
+            Dict: The updated agents and the IDs that were not found
+        """
+        try:
+            result = self.db_manager.update_agents(updates)
+            fields = {update["agent_id"]: sorted(set(update) - {"agent_id"}) for update in updates}
+            for agent in result["updated"]:
+                self.events.publish("agent_updated", {"fields": fields[agent["id"]]}, agent_id=agent["id"])
+                self._index_agent(agent)
+            
+            self._dispatch_to_available(result["updated"])
+            return result
+        except Exception as e:
+            raise HumanAgentError(f"Error updating agents: {str(e)}")
+    
+    def update_agent_statuses(self, agent_ids: List[str], status: AgentStatus) -> Dict:
+        """
+        Set the status of several agents in one transaction.
+        
+        Args:
+            agent_ids: IDs of the agents
+            status: New status
+        
+        Returns:
+            Dict: The updated agent IDs and the IDs that were not found
+        """
+        try:
+            # Validate status
+            try:
+                status = AgentStatus(status)
+            except ValueError:
+                raise HumanAgentError(f"Invalid agent status: {status}")
+            
+            result = self.db_manager.update_agent_statuses(agent_ids, status.value)
+            for agent_id in result["updated"]:
+                self._set_status(agent_id, status.value)
+            
+            if status == AgentStatus.AVAILABLE:
+                self.dispatch_queued_handoffs(result["updated"])
+            
+            return result
+        except Exception as e:
+            if isinstance(e, HumanAgentError):
+                raise
+            raise HumanAgentError(f"Error updating agent statuses: {str(e)}")
+    
+    def _dispatch_to_available(self, agents: List[Dict]):
+        """Give waiting handoffs to those of the agents that are available."""
+        available_ids = [agent["id"] for agent in agents if agent["status"] == AgentStatus.AVAILABLE.value]
+        if available_ids:
+            self.dispatch_queued_handoffs(available_ids)
+    
+    def find_available_agents(self, requirements: Dict) -> List[Dict]:
+        """
+        Find all available agents matching the requirements.
+        
+        Args:
+            requirements: Requirements for the agent
+        
+        Returns:
+            List[Dict]: Matching agents
+        """
+        try:
+            level = requirements.get("preferred_level")
+            try:
+                if isinstance(level, str):
+                    level = AgentLevel(level)
+            except ValueError:
+                # Invalid level, ignore this filter
+                level = None
+            
+            # Pick up changes made by other workers
+            self.agent_index.refresh()
+            
+            return self.agent_index.find(
+                language=requirements.get("preferred_language"),
+                level=level.value if level else None,
+                specialties=requirements.get("required_specialties")
+            )
+        except Exception as e:
+            raise HumanAgentError(f"Error finding available agent: {str(e)}")
+    
     def find_available_agent(self, requirements: Dict) -> Optional[Dict]:
         """
         Find an available agent matching the requirements.
         
         Args:
             requirements: Requirements for the agent
-            
+        
         Returns:
             Optional[Dict]: Matching agent or None
         """
-        try:
-            # Get all agents from database
-            with self.db_manager.db_name.connect() as conn:
-                conn.row_factory = dict
-                cursor = conn.cursor()
-                
-                # Base query for available agents
-                query = """
-                SELECT * FROM agents WHERE status = 'available'
+        agents = self.find_available_agents(requirements)
+        return agents[0] if agents else None
+    
+    def _claim_agent(self, agent: Dict, conversation_id: str, ticket_id: Optional[str] = None) -> Optional[str]:
+        """
+        Atomically claim an available agent and record the handoff.
+        
+        The agent is only marked busy if it is still available when the write
+        lock is held, and the handoff record, system message and status change
+        commit together, so two workers can never claim the same agent. The
+        ticket of a queued handoff is completed in the same transaction, so a
+        ticket is never dispatched again once its handoff exists.
+        
+        Args:
+            agent: The agent to claim
+            conversation_id: ID of the conversation
+            ticket_id: Optional ID of the queue ticket taken for this handoff
+        
+        Returns:
+            Optional[str]: The handoff ID, or None if the agent was claimed by someone else
+                or the ticket is no longer taken for dispatch
+        """
+        handoff_id = str(uuid.uuid4())
+        now = datetime.now()
+        
+        with self.db_manager.unit_of_work() as cursor:
+            # The ticket may have been cancelled, or assigned by a worker that took it over
+            if ticket_id is not None and not self.handoff_queue.is_dispatching(cursor, ticket_id):
+                return None
+            
+            # Claim the agent only if it is still available
+            cursor.execute(
                 """
-                params = []
-                
-                # Add filters based on requirements
-                if "preferred_language" in requirements:
-                    # This is a simplification, in reality we'd need to do a proper JSON search
-                    query += f" AND languages LIKE ?"
-                    params.append(f"%{requirements['preferred_language']}%")
-                
-                if "preferred_level" in requirements:
-                    level = requirements["preferred_level"]
-                    try:
-                        if isinstance(level, str):
-                            level = AgentLevel(level)
-                        query += f" AND level = ?"
-                        params.append(level.value)
-                    except ValueError:
-                        # Invalid level, ignore this filter
-                        pass
-                
-                # Execute query
-                cursor.execute(query, params)
-                agents = cursor.fetchall()
-                
-                # Further filter by specialties if needed
-                if "required_specialties" in requirements and requirements["required_specialties"]:
-                    filtered_agents = []
-                    for agent in agents:
-                        specialties = json.loads(agent["specialties"]) if agent["specialties"] else []
-                        
-                        # Check if agent has all required specialties
-                        has_all_specialties = True
-                        for specialty in requirements["required_specialties"]:
-                            if specialty not in specialties:
-                                has_all_specialties = False
-                                break
-                                
-                        if has_all_specialties:
-                            filtered_agents.append(agent)
-                            
-                    agents = filtered_agents
-                
-                # Return the first matching agent, if any
-                return agents[0] if agents else None
-                
-        except Exception as e:
-            raise HumanAgentError(f"Error finding available agent: {str(e)}")
+                UPDATE agents
+                SET status = ?, updated_at = ?
+                WHERE id = ? AND status = ?
+                """,
+                ("busy", now.isoformat(), agent["id"], "available")
+            )
+            
+            if cursor.rowcount == 0:
+                return None
+            
+            # Record the handoff
+            cursor.execute(
+                """
+                INSERT INTO agent_conversations
+                (id, agent_id, conversation_id, start_time, status)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (handoff_id, agent["id"], conversation_id, now.isoformat(), "active")
+            )
+            
+            # Add a system message to the conversation
+            self.db_manager.add_message(
+                cursor,
+                conversation_id,
+                "system",
+                f"Conversation handed off to human agent: {agent['name']}",
+                now
+            )
+            
+            if ticket_id is not None:
+                self.handoff_queue.complete(
+                    ticket_id,
+                    cursor,
+                    handoff_id=handoff_id,
+                    agent_id=agent["id"],
+                    agent_name=agent["name"]
+                )
+        
+        return handoff_id
+    
+    def rank_agents(self, agents: List[Dict]) -> List[Dict]:
+        """
+        Order candidate agents from most to least preferred.
+        
+        Agents with fewer recent assignments, higher ratings and lower hourly
+        rates are preferred, weighted by the HANDOFF_WEIGHT_* settings.
+        
+        Args:
+            agents: Candidate agents
+        
+        Returns:
+            List[Dict]: The agents, best first
+        """
+        if len(agents) < 2:
+            return list(agents)
+        
+        loads = {
+            agent["id"]: self.agent_index.recent_assignments(agent["id"], Config.HANDOFF_LOAD_WINDOW_SECONDS)
+            for agent in agents
+        }
+        max_load = max(loads.values()) or 1
+        rates = [agent["hourly_rate"] for agent in agents]
+        min_rate, rate_range = min(rates), (max(rates) - min(rates)) or 1
+        
+        def score(agent):
+            rating = agent.get("rating")
+            rating_penalty = (5 - rating) / 4 if rating else 0.5
+            return (
+                Config.HANDOFF_WEIGHT_LOAD * loads[agent["id"]] / max_load
+                + Config.HANDOFF_WEIGHT_RATING * rating_penalty
+                + Config.HANDOFF_WEIGHT_COST * (agent["hourly_rate"] - min_rate) / rate_range
+            )
+        
+        return sorted(agents, key=score)
     
-    def handoff_conversation(self, conversation_id: str, requirements: Dict) -> Dict:
+    def _assign(self, agent: Dict, conversation_id: str, ticket_id: Optional[str] = None) -> Optional[str]:
+        """Claim an agent for a conversation and update the routing index."""
+        handoff_id = self._claim_agent(agent, conversation_id, ticket_id)
+        
+        # Either way the agent is no longer available, unless the claim stopped at a ticket finished elsewhere
+        if handoff_id is not None or ticket_id is None:
+            self._set_status(agent["id"], "busy")
+        if handoff_id is not None:
+            self.agent_index.record_assignment(agent["id"])
+            self.events.publish(
+                "handoff",
+                {"handoff_id": handoff_id, "agent_name": agent["name"]},
+                agent_id=agent["id"],
+                conversation_id=conversation_id
+            )
+        
+        return handoff_id
+    
+    def handoff_conversation(self, conversation_id: str, requirements: Dict,
+                             priority: int = 0, queue: bool = True) -> Dict:
         """
         Hand off a conversation to a human agent.
         
+        The best ranked candidates are tried in turn; if another worker claims
+        one first, the next is tried. When no agent is available the handoff
+        is queued and assigned as soon as a matching agent becomes available.
+        
         Args:
             conversation_id: ID of the conversation
             requirements: Requirements for the agent
-            
+            priority: Priority of the handoff if it has to wait, higher is served first
+            queue: Whether to queue the handoff if no agent is available
+        
         Returns:
             Dict: Result of the handoff
         """
         try:
-            # Find an available agent
-            agent = self.find_available_agent(requirements)
+            for _ in range(Config.HANDOFF_CLAIM_ATTEMPTS):
+                # Find available agents
+                agents = self.find_available_agents(requirements)
+                
+                if not agents:
+                    break
+                
+                # Spread concurrent handoffs over the best few candidates to avoid contending for one agent
+                agent = random.choice(self.rank_agents(agents)[:Config.HANDOFF_CANDIDATE_POOL])
+                
+                handoff_id = self._assign(agent, conversation_id)
+                
+                if handoff_id is None:
+                    # Lost the race for this agent, try the next candidate
+                    continue
+                
+                return {
+                    "success": True,
+                    "message": f"Conversation handed off to agent {agent['name']}",
+                    "handoff_id": handoff_id,
+                    "agent": {**agent, "status": "busy"}
+                }
             
-            if not agent:
+            if not queue:
                 return {
                     "success": False,
                     "message": "No available agents matching the requirements"
                 }
             
-            # Create a record of the handoff
-            handoff_id = str(uuid.uuid4())
+            ticket = self.handoff_queue.enqueue(conversation_id, requirements, priority)
+            self.handoff_queue.start_dispatcher(self.dispatch_queued_handoffs, Config.HANDOFF_DISPATCH_INTERVAL)
             
-            with self.db_manager.db_name.connect() as conn:
-                cursor = conn.cursor()
-                
-                # Record the handoff
-                cursor.execute(
-                    """
-                    INSERT INTO agent_conversations
-                    (id, agent_id, conversation_id, status)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (handoff_id, agent["id"], conversation_id, "active")
-                )
-                
-                # Update agent status to busy
-                cursor.execute(
-                    """
-                    UPDATE agents
-                    SET status = ?, updated_at = ?
-                    WHERE id = ?
-                    """,
-                    ("busy", datetime.now().isoformat(), agent["id"])
-                )
-                
-                # Add a system message to the conversation
-                message_id = str(uuid.uuid4())
-                cursor.execute(
-                    """
-                    INSERT INTO messages
-                    (id, conversation_id, role, content)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (
-                        message_id,
-                        conversation_id,
-                        "system",
-                        f"Conversation handed off to human agent: {agent['name']}"
-                    )
-                )
-                
-                # Update the conversation's updated_at timestamp
-                cursor.execute(
-                    """
-                    UPDATE conversations
-                    SET updated_at = ?
-                    WHERE id = ?
-                    """,
-                    (datetime.now().isoformat(), conversation_id)
-                )
-                
-                conn.commit()
+            position = self.handoff_queue.position(ticket["id"])
+            self.events.publish(
+                "handoff_queued",
+                {"ticket_id": ticket["id"], "priority": priority, "position": position},
+                conversation_id=conversation_id
+            )
             
             return {
-                "success": True,
-                "message": f"Conversation handed off to agent {agent['name']}",
-                "handoff_id": handoff_id,
-                "agent": agent
+                "success": False,
+                "queued": True,
+                "message": "No available agents matching the requirements, the handoff has been queued",
+                "ticket_id": ticket["id"],
+                "position": position
             }
         except Exception as e:
             raise HumanAgentError(f"Error in conversation handoff: {str(e)}")
     
+    def dispatch_queued_handoffs(self, agent_ids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Assign queued handoffs to available agents.
+        
+        Args:
+            agent_ids: Optional agents that just became available; all available agents if omitted
+        
+        Returns:
+            List[Dict]: The tickets that were assigned
+        """
+        try:
+            if not self.handoff_queue.has_waiting():
+                return []
+            
+            if agent_ids is None:
+                self.agent_index.refresh()
+                agents = self.agent_index.find()
+            else:
+                agents = [
+                    agent for agent in (self.agent_index.get(agent_id) for agent_id in agent_ids)
+                    if agent and agent["status"] == AgentStatus.AVAILABLE.value
+                ]
+            
+            assigned = []
+            for agent in self.rank_agents(agents):
+                ticket = self.handoff_queue.take_for_agent(agent)
+                if ticket is None:
+                    continue
+                
+                try:
+                    handoff_id = self._assign(agent, ticket["conversation_id"], ticket["id"])
+                except Exception:
+                    self.handoff_queue.release(ticket["id"])
+                    raise
+                
+                if handoff_id is None:
+                    self.handoff_queue.release(ticket["id"])
+                    continue
+                
+                # The ticket was completed together with the claim
+                assigned.append(self.handoff_queue.get(ticket["id"]))
+            
+            return assigned
+        except Exception as e:
+            raise HumanAgentError(f"Error dispatching queued handoffs: {str(e)}")
+    
+    def get_handoff_ticket(self, ticket_id: str) -> Dict:
+        """
+        Get the state of a queued handoff.
+        
+        Args:
+            ticket_id: ID of the ticket
+        
+        Returns:
+            Dict: The ticket
+        """
+        ticket = self.handoff_queue.get(ticket_id)
+        if ticket is None:
+            raise HumanAgentError(f"Handoff ticket {ticket_id} not found")
+        return ticket
+    
+    def cancel_handoff(self, ticket_id: str) -> Dict:
+        """
+        Cancel a queued handoff.
+        
+        Args:
+            ticket_id: ID of the ticket
+        
+        Returns:
+            Dict: The cancelled ticket
+        """
+        ticket = self.handoff_queue.cancel(ticket_id)
+        if ticket is None:
+            raise HumanAgentError(f"Handoff ticket {ticket_id} is not queued")
+        return ticket
+    
     def end_conversation(self, conversation_id: str) -> Dict:
         """
         End a conversation with a human agent.
         
         Args:
             conversation_id: ID of the conversation
-            
+        
         Returns:
             Dict: Result of ending the conversation
         """
         try:
-            with self.db_manager.db_name.connect() as conn:
-                conn.row_factory = dict
-                cursor = conn.cursor()
-                
-                # Find the active agent conversation
+            with self.db_manager.unit_of_work() as cursor:
+                # Find the active agent conversation and its agent
                 cursor.execute(
                     """
-                    SELECT * FROM agent_conversations
-                    WHERE conversation_id = ? AND status = 'active'
+                    SELECT ac.id, ac.agent_id, ac.start_time, a.name, a.hourly_rate
+                    FROM agent_conversations ac
+                    JOIN agents a ON a.id = ac.agent_id
+                    WHERE ac.conversation_id = ? AND ac.status = 'active'
                     """,
                     (conversation_id,)
                 )
@@ -297,12 +761,13 @@ class HumanAgentManager:
                 end_time = datetime.now()
                 duration_minutes = (end_time - start_time).total_seconds() / 60
                 
-                # Update the agent conversation
+                # Update the agent conversation; the write lock is held from the
+                # start, so no other request can have ended it since it was read
                 cursor.execute(
                     """
                     UPDATE agent_conversations
                     SET status = ?, end_time = ?, duration_minutes = ?
-                    WHERE id = ?
+                    WHERE id = ? AND status = 'active'
                     """,
                     (
                         "completed",
@@ -312,6 +777,18 @@ class HumanAgentManager:
                     )
                 )
                 
+                # Bill the session at the agent's current hourly rate
+                cost = self.db_manager.record_billing_entry(
+                    cursor,
+                    agent_conversation["id"],
+                    agent_conversation["agent_id"],
+                    conversation_id,
+                    start_time,
+                    end_time,
+                    duration_minutes,
+                    agent_conversation["hourly_rate"]
+                )
+                
                 # Update agent status back to available
                 cursor.execute(
                     """
@@ -323,56 +800,38 @@ class HumanAgentManager:
                 )
                 
                 # Add a system message to the conversation
-                message_id = str(uuid.uuid4())
-                cursor.execute(
-                    """
-                    INSERT INTO messages
-                    (id, conversation_id, role, content)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (
-                        message_id,
-                        conversation_id,
-                        "system",
-                        f"Conversation with human agent ended. Duration: {duration_minutes:.2f} minutes"
-                    )
+                self.db_manager.add_message(
+                    cursor,
+                    conversation_id,
+                    "system",
+                    f"Conversation with human agent ended. Duration: {duration_minutes:.2f} minutes",
+                    end_time
                 )
                 
-                # Update the conversation's updated_at timestamp
-                cursor.execute(
-                    """
-                    UPDATE conversations
-                    SET updated_at = ?
-                    WHERE id = ?
-                    """,
-                    (end_time.isoformat(), conversation_id)
-                )
-                
-                conn.commit()
-                
-                # Get agent details
-                cursor.execute(
-                    """
-                    SELECT * FROM agents WHERE id = ?
-                    """,
-                    (agent_conversation["agent_id"],)
+                # Update the agent's aggregates in the same transaction
+                self.db_manager.record_agent_conversation(
+                    cursor, agent_conversation["agent_id"], duration_minutes, cost, end_time
                 )
-                
-                agent = cursor.fetchone()
-                
-                # Calculate cost based on hourly rate
-                hourly_rate = agent["hourly_rate"]
-                cost = (hourly_rate / 60) * duration_minutes
-                
-                return {
-                    "success": True,
-                    "message": "Conversation with human agent ended",
-                    "agent_id": agent_conversation["agent_id"],
-                    "agent_name": agent["name"],
-                    "duration_minutes": duration_minutes,
-                    "cost": cost
-                }
-                
+            
+            self.events.publish(
+                "conversation_ended",
+                {"duration_minutes": duration_minutes, "cost": cost},
+                agent_id=agent_conversation["agent_id"],
+                conversation_id=conversation_id
+            )
+            
+            self._set_status(agent_conversation["agent_id"], "available")
+            self.dispatch_queued_handoffs([agent_conversation["agent_id"]])
+            
+            return {
+                "success": True,
+                "message": "Conversation with human agent ended",
+                "agent_id": agent_conversation["agent_id"],
+                "agent_name": agent_conversation["name"],
+                "duration_minutes": duration_minutes,
+                "cost": cost
+            }
+        
         except Exception as e:
             raise HumanAgentError(f"Error ending conversation: {str(e)}")
     
@@ -384,7 +843,7 @@ class HumanAgentManager:
             agent_id: ID of the agent
             rating: Rating (1-5)
             feedback: Optional feedback
-            
+        
         Returns:
             Dict: Result of rating the agent
         """
@@ -395,62 +854,61 @@ class HumanAgentManager:
             
             rating_id = str(uuid.uuid4())
             
-            with self.db_manager.db_name.connect() as conn:
-                cursor = conn.cursor()
-                
-                # Get the user ID from an active conversation
+            with self.db_manager.unit_of_work() as cursor:
+                # Add the rating from the user of the agent's latest completed conversation
+                rated_at = datetime.now()
                 cursor.execute(
                     """
-                    SELECT c.user_id
+                    INSERT INTO agent_ratings
+                    (id, agent_id, user_id, rating, feedback, created_at)
+                    SELECT ?, ?, c.user_id, ?, ?, ?
                     FROM agent_conversations ac
                     JOIN conversations c ON ac.conversation_id = c.id
                     WHERE ac.agent_id = ? AND ac.status = 'completed'
                     ORDER BY ac.end_time DESC
                     LIMIT 1
                     """,
-                    (agent_id,)
+                    (rating_id, agent_id, rating, feedback, rated_at.isoformat(), agent_id)
                 )
                 
-                result = cursor.fetchone()
-                
-                if not result:
+                if cursor.rowcount == 0:
                     raise HumanAgentError(f"No completed conversations found for agent {agent_id}")
-                    
-                user_id = result[0]
                 
-                # Add the rating
-                cursor.execute(
-                    """
-                    INSERT INTO agent_ratings
-                    (id, agent_id, user_id, rating, feedback)
-                    VALUES (?, ?, ?, ?, ?)
-                    """,
-                    (rating_id, agent_id, user_id, rating, feedback)
-                )
-                
-                conn.commit()
+                # Update the agent's aggregates in the same transaction
+                self.db_manager.record_agent_rating(cursor, agent_id, rating, rated_at)
                 
-                # Calculate new average rating
+                # Read the new average rating from the aggregates
                 cursor.execute(
                     """
-                    SELECT AVG(rating) as avg_rating
-                    FROM agent_ratings
+                    SELECT rating_sum / rating_count
+                    FROM agent_stats
                     WHERE agent_id = ?
                     """,
                     (agent_id,)
                 )
                 
                 avg_rating = cursor.fetchone()[0]
-                
-                return {
-                    "success": True,
-                    "message": "Agent rated successfully",
-                    "rating_id": rating_id,
-                    "agent_id": agent_id,
-                    "rating": rating,
-                    "average_rating": avg_rating
-                }
-                
+            
+            # Keep the rating used for routing current
+            agent = self.agent_index.get(agent_id)
+            if agent is not None:
+                self.agent_index.upsert({**agent, "rating": avg_rating})
+            
+            self.events.publish(
+                "rating",
+                {"rating_id": rating_id, "rating": rating, "average_rating": avg_rating},
+                agent_id=agent_id
+            )
+            
+            return {
+                "success": True,
+                "message": "Agent rated successfully",
+                "rating_id": rating_id,
+                "agent_id": agent_id,
+                "rating": rating,
+                "average_rating": avg_rating
+            }
+        
         except Exception as e:
             if isinstance(e, HumanAgentError):
                 raise
@@ -462,87 +920,39 @@ class HumanAgentManager:
         
         Args:
             agent_id: ID of the agent
-            time_period: Optional time period to filter by
-            
+            time_period: Optional time period to filter by, counted in whole hours
+        
         Returns:
             Dict: Agent statistics
         """
         try:
-            with self.db_manager.db_name.connect() as conn:
-                conn.row_factory = dict
-                cursor = conn.cursor()
-                
-                # Get agent details
-                cursor.execute(
-                    """
-                    SELECT * FROM agents WHERE id = ?
-                    """,
-                    (agent_id,)
-                )
-                
-                agent = cursor.fetchone()
-                
-                if not agent:
-                    raise HumanAgentError(f"Agent {agent_id} not found")
-                
-                # Build the time filter if needed
-                time_filter = ""
-                params = [agent_id]
-                
-                if time_period:
-                    cutoff_time = (datetime.now() - time_period).isoformat()
-                    time_filter = "AND start_time >= ?"
-                    params.append(cutoff_time)
-                
-                # Get conversation statistics
-                cursor.execute(
-                    f"""
-                    SELECT
-                        COUNT(*) as total_conversations,
-                        SUM(duration_minutes) as total_minutes,
-                        AVG(duration_minutes) as avg_minutes
-                    FROM agent_conversations
-                    WHERE agent_id = ? {time_filter} AND status = 'completed'
-                    """,
-                    params
-                )
-                
-                stats = cursor.fetchone()
-                
-                # Get rating statistics
-                cursor.execute(
-                    f"""
-                    SELECT
-                        COUNT(*) as total_ratings,
-                        AVG(rating) as avg_rating,
-                        MIN(rating) as min_rating,
-                        MAX(rating) as max_rating
-                    FROM agent_ratings
-                    WHERE agent_id = ? {time_filter}
-                    """,
-                    params
-                )
-                
-                rating_stats = cursor.fetchone()
-                
-                # Calculate earnings
-                total_minutes = stats["total_minutes"] or 0
-                hourly_rate = agent["hourly_rate"]
-                total_earnings = (hourly_rate / 60) * total_minutes
-                
-                return {
-                    "agent_id": agent_id,
-                    "agent_name": agent["name"],
-                    "total_conversations": stats["total_conversations"],
-                    "total_minutes": total_minutes,
-                    "average_minutes_per_conversation": stats["avg_minutes"],
-                    "total_earnings": total_earnings,
-                    "total_ratings": rating_stats["total_ratings"],
-                    "average_rating": rating_stats["avg_rating"],
-                    "minimum_rating": rating_stats["min_rating"],
-                    "maximum_rating": rating_stats["max_rating"]
-                }
-                
+            try:
+                agent = self.db_manager.get_agent(agent_id)
+            except ValueError:
+                raise HumanAgentError(f"Agent {agent_id} not found")
+            
+            # Read the materialized aggregates, bucketed by hour when a time period is given
+            since = datetime.now() - time_period if time_period else None
+            stats = self.db_manager.get_agent_stats(agent_id, since)
+            
+            conversation_count = stats["conversation_count"]
+            rating_count = stats["rating_count"]
+            
+            return {
+                "agent_id": agent_id,
+                "agent_name": agent["name"],
+                "total_conversations": conversation_count,
+                "total_minutes": stats["minutes_sum"],
+                "average_minutes_per_conversation": stats["minutes_sum"] / conversation_count if conversation_count else None,
+                "minimum_minutes": stats["minutes_min"],
+                "maximum_minutes": stats["minutes_max"],
+                "total_earnings": stats["earnings"],
+                "total_ratings": rating_count,
+                "average_rating": stats["rating_sum"] / rating_count if rating_count else None,
+                "minimum_rating": stats["rating_min"],
+                "maximum_rating": stats["rating_max"]
+            }
+        
         except Exception as e:
             if isinstance(e, HumanAgentError):
                 raise
@@ -1,15 +1,48 @@
 import os
+import re
+import gzip
 import json
+import queue
+import threading
 import requests
-from typing import List, Dict, Optional, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any, Iterator, Callable
 from datetime import datetime
+from enum import Enum
 import uuid
 
+import faiss
+import numpy as np
+from langchain.docstore.in_memory import InMemoryDocstore
 from langchain.document_loaders import WebBaseLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.vectorstores import FAISS
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.schema import Document
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+from config import Config
+from services.lexical_index import BM25Index, reciprocal_rank_fusion
+from utils.metrics import timed
+
+# Knowledge base export format
+EXPORT_FORMAT_VERSION = 1
+EXPORT_MANIFEST_FILE = "manifest.json"
+EXPORT_VECTORS_FILE = "vectors.npy"
+EXPORT_DOCUMENTS_FILE = "documents.jsonl.gz"
+EXPORT_BATCH_SIZE = 10000
+
+# Minimum shared characters for two retrieved chunks to be merged
+RAG_MIN_OVERLAP = 50
+
+class SearchMode(str, Enum):
+    VECTOR = "vector"
+    LEXICAL = "lexical"
+    HYBRID = "hybrid"
 
 class KnowledgeBaseError(Exception):
     """Exception for knowledge base errors."""
@@ -21,20 +54,40 @@ class KnowledgeBase:
     def __init__(self, vector_store=None):
         """Initialize the knowledge base with an optional vector store."""
         self.vector_store = vector_store or self._create_vector_store()
+        self._text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+        self._http_session = None
+        self._blog_sync_state = {}
+        self._lexical_index = BM25Index()
+        self._rebuild_lexical_index()
+        self._query_embeddings = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
         
     def _create_vector_store(self):
         """Create a new vector store."""
-        # Initialize embeddings
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        
         # Create an empty FAISS index
         return FAISS.from_documents(
             [Document(page_content="Initialization document", metadata={"source": "init"})],
-            embeddings
+            get_embeddings()
         )
     
+    def _add_documents(self, documents: List[Document]) -> List[str]:
+        """Add documents to the vector store and the lexical index."""
+        doc_ids = self.vector_store.add_documents(documents)
+        for doc_id, doc in zip(doc_ids, documents):
+            self._lexical_index.add(doc_id, doc.page_content)
+        return doc_ids
+    
+    def _rebuild_lexical_index(self):
+        """Rebuild the lexical index from the documents in the vector store."""
+        self._lexical_index.clear()
+        for doc_id in self.vector_store.index_to_docstore_id.values():
+            doc = self.vector_store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                self._lexical_index.add(doc_id, doc.page_content)
+    
     def scrape_website(self, url: str, max_pages: int = 10) -> List[Document]:
         """
         Scrape content from a website and add it to the knowledge base.
@@ -75,105 +128,292 @@ class KnowledgeBase:
                 })
             
             # Add to vector store
-            self.vector_store.add_documents(split_docs)
+            self._add_documents(split_docs)
             
             return split_docs
         except Exception as e:
             raise KnowledgeBaseError(f"Error scraping website {url}: {str(e)}")
     
-    def learn_from_blog(self, blog_url: str, api_key: Optional[str] = None) -> List[Document]:
+    def _get_http_session(self) -> requests.Session:
+        """Get the pooled HTTP session used for ingestion requests."""
+        if self._http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=Config.BLOG_FETCH_CONCURRENCY,
+                pool_maxsize=Config.BLOG_FETCH_CONCURRENCY,
+                max_retries=Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=["GET"]
+                )
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._http_session = session
+        return self._http_session
+    
+    def _iter_blog_pages(self, blog_url: str, headers: Dict[str, str],
+                         since: Optional[str] = None) -> Iterator[List[Dict]]:
+        """
+        Iterate over the paginated post listing of a blog.
+        
+        Args:
+            blog_url: URL of the blog
+            headers: Request headers
+            since: Optional published date watermark from the previous sync
+            
+        Yields:
+            List of post summaries for each page
+        """
+        session = self._get_http_session()
+        page = 1
+        listed_keys = set()
+        
+        while True:
+            params = {"page": page, "per_page": Config.BLOG_PAGE_SIZE}
+            if since:
+                params["since"] = since
+                
+            response = session.get(
+                f"{blog_url}/api/posts",
+                headers=headers,
+                params=params,
+                timeout=Config.HTTP_TIMEOUT
+            )
+            response.raise_for_status()
+            payload = response.json()
+            
+            # Accept both a bare list and an envelope such as {"posts": [...], "has_more": true}
+            if isinstance(payload, dict):
+                posts = payload.get("posts") or payload.get("items") or payload.get("data") or []
+                has_more = bool(payload.get("has_more") or payload.get("next"))
+            else:
+                posts = payload
+                has_more = len(posts) >= Config.BLOG_PAGE_SIZE
+            
+            # Stop if the server ignores pagination and keeps returning the same posts
+            page_keys = {self._blog_post_key(post) for post in posts}
+            if not posts or (page_keys and page_keys <= listed_keys):
+                return
+            listed_keys.update(page_keys)
+            
+            yield posts
+            
+            # Listings are newest first, so a page reaching the watermark is the last one we need
+            if since and any(post.get("published_date") and post["published_date"] < since for post in posts):
+                return
+            
+            if not has_more:
+                return
+            page += 1
+    
+    @staticmethod
+    def _blog_post_key(post: Dict) -> str:
+        """Get the key identifying a blog post across syncs."""
+        if post.get("id") is not None:
+            return str(post["id"])
+        return post.get("url") or f"{post.get('title', '')}|{post.get('published_date', '')}"
+    
+    def _fetch_blog_post(self, blog_url: str, post: Dict, headers: Dict[str, str]) -> Dict:
+        """Fetch the full content of a post if the listing did not include it."""
+        if "content" in post:
+            return post
+            
+        response = self._get_http_session().get(
+            f"{blog_url}/api/posts/{post['id']}",
+            headers=headers,
+            timeout=Config.HTTP_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def learn_from_blog(self, blog_url: str, api_key: Optional[str] = None,
+                        full_sync: bool = False) -> List[Document]:
         """
         Learn from a blog by extracting articles and adding them to the knowledge base.
         
+        Posts are listed page by page and only posts not ingested by a previous
+        sync of the same blog are fetched. Each page is chunked and added to the
+        vector store as soon as its posts have been fetched.
+        
         Args:
             blog_url: URL of the blog
             api_key: Optional API key for blog API
+            full_sync: Whether to ignore the previous sync state and refetch all posts
             
         Returns:
             List of documents added to the knowledge base
         """
         try:
-            # This would normally use a blog-specific API or RSS feed
-            # Here's a simplified implementation that assumes blog_url has an API endpoint
-            
             headers = {}
             if api_key:
                 headers["Authorization"] = f"Bearer {api_key}"
-                
-            # Get blog posts (this is a placeholder - actual implementation would vary)
-            response = requests.get(f"{blog_url}/api/posts", headers=headers)
-            response.raise_for_status()
-            
-            blog_posts = response.json()
-            documents = []
             
-            # Process each blog post
-            for post in blog_posts:
-                # Get full post content if needed
-                if "content" not in post:
-                    post_response = requests.get(f"{blog_url}/api/posts/{post['id']}", headers=headers)
-                    post_response.raise_for_status()
-                    post = post_response.json()
-                
-                # Create a document
-                doc = Document(
-                    page_content=post["content"],
-                    metadata={
-                        "title": post.get("title", ""),
-                        "author": post.get("author", ""),
-                        "published_date": post.get("published_date", ""),
-                        "url": post.get("url", ""),
-                        "source": blog_url,
-                        "source_type": "blog",
-                        "date_added": datetime.now().isoformat(),
-                        "id": str(uuid.uuid4())
-                    }
-                )
-                documents.append(doc)
-            
-            # Split into chunks for longer posts
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
-            )
-            
-            split_docs = text_splitter.split_documents(documents)
-            
-            # Add to vector store
-            self.vector_store.add_documents(split_docs)
+            # Incremental sync state, keyed by blog URL
+            if full_sync or blog_url not in self._blog_sync_state:
+                self._blog_sync_state[blog_url] = {"last_published_date": None, "seen_ids": set()}
+            sync_state = self._blog_sync_state[blog_url]
+            seen_ids = sync_state["seen_ids"]
+            since = sync_state["last_published_date"]
+            
+            split_docs = []
+            newest_date = since
+            
+            with ThreadPoolExecutor(max_workers=Config.BLOG_FETCH_CONCURRENCY) as executor:
+                for page in self._iter_blog_pages(blog_url, headers, since):
+                    # Skip posts that were already ingested
+                    new_posts = [post for post in page if self._blog_post_key(post) not in seen_ids]
+                    if not new_posts:
+                        continue
+                    
+                    # Fetch missing post content concurrently
+                    posts = list(executor.map(
+                        lambda post: self._fetch_blog_post(blog_url, post, headers),
+                        new_posts
+                    ))
+                    
+                    documents = []
+                    for post in posts:
+                        documents.append(Document(
+                            page_content=post["content"],
+                            metadata={
+                                "title": post.get("title", ""),
+                                "author": post.get("author", ""),
+                                "published_date": post.get("published_date", ""),
+                                "url": post.get("url", ""),
+                                "post_id": post.get("id"),
+                                "source": blog_url,
+                                "source_type": "blog",
+                                "date_added": datetime.now().isoformat(),
+                                "id": str(uuid.uuid4())
+                            }
+                        ))
+                    
+                    # Split this page into chunks and add it to the vector store
+                    page_docs = self._text_splitter.split_documents(documents)
+                    if page_docs:
+                        self._add_documents(page_docs)
+                        split_docs.extend(page_docs)
+                    
+                    # Only mark posts as seen once their page is in the vector store
+                    for post in new_posts:
+                        seen_ids.add(self._blog_post_key(post))
+                    for post in posts:
+                        published_date = post.get("published_date")
+                        if published_date and (not newest_date or published_date > newest_date):
+                            newest_date = published_date
+            
+            # Listings are newest first, so the watermark may only move once every page
+            # is in, or posts on a page that failed would be skipped by the next sync
+            sync_state["last_published_date"] = newest_date
             
             return split_docs
         except Exception as e:
             raise KnowledgeBaseError(f"Error learning from blog {blog_url}: {str(e)}")
     
-    def connect_external_db(self, connection_string: str, query: str, metadata_fields: List[str]) -> List[Document]:
+    def _iter_http_rows(self, url: str, query: str, metadata_fields: List[str],
+                        batch_size: int) -> Iterator[List[Dict]]:
         """
-        Connect to an external database and add data to the knowledge base.
+        Iterate over rows returned by a REST endpoint in batches.
+        
+        NDJSON responses are consumed line by line. JSON responses may either be
+        a bare list of rows or a page envelope such as
+        {"rows": [...], "next_cursor": "..."}, in which case pages are requested
+        until no cursor is returned.
         
         Args:
-            connection_string: Database connection string
-            query: SQL query to get data
+            url: Endpoint URL
+            query: Query to send to the endpoint
             metadata_fields: Fields to include in metadata
+            batch_size: Maximum number of rows per batch
             
-        Returns:
-            List of documents added to the knowledge base
+        Yields:
+            Batches of row dicts
         """
-        try:
-            # This would normally use a database connector like SQLAlchemy
-            # Here's a simplified implementation that assumes the connection string is a REST API endpoint
-            
-            # Get data from the external source
-            response = requests.post(
-                connection_string,
-                json={"query": query, "metadata_fields": metadata_fields}
-            )
+        session = self._get_http_session()
+        payload = {"query": query, "metadata_fields": metadata_fields, "page_size": batch_size}
+        
+        while True:
+            response = session.post(url, json=payload, stream=True, timeout=Config.HTTP_TIMEOUT)
             response.raise_for_status()
             
+            content_type = response.headers.get("Content-Type", "")
+            if "ndjson" in content_type or "jsonl" in content_type:
+                batch = []
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    batch.append(json.loads(line))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+                return
+            
             data = response.json()
+            if isinstance(data, list):
+                rows, next_cursor = data, None
+            else:
+                rows = data.get("rows") or data.get("data") or data.get("items") or []
+                next_cursor = data.get("next_cursor") or data.get("next_page")
+            
+            for i in range(0, len(rows), batch_size):
+                yield rows[i:i + batch_size]
+            
+            if not next_cursor or not rows:
+                return
+            payload["cursor"] = next_cursor
+    
+    def _iter_sql_rows(self, connection_string: str, query: str,
+                       batch_size: int) -> Iterator[List[Dict]]:
+        """
+        Iterate over rows of a SQL query in batches using a server-side cursor.
+        
+        Args:
+            connection_string: SQLAlchemy database URL
+            query: SQL query to get data
+            batch_size: Maximum number of rows per batch
+            
+        Yields:
+            Batches of row dicts
+        """
+        engine = create_engine(connection_string)
+        try:
+            with engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(query))
+                for partition in result.mappings().partitions(batch_size):
+                    yield [dict(row) for row in partition]
+        finally:
+            engine.dispose()
+    
+    def _iter_external_documents(self, connection_string: str, query: str, metadata_fields: List[str],
+                                 batch_size: int) -> Iterator[List[Document]]:
+        """
+        Iterate over documents built from an external data source in batches.
+        
+        Args:
+            connection_string: REST endpoint URL or SQLAlchemy database URL
+            query: Query to get data
+            metadata_fields: Fields to include in metadata
+            batch_size: Maximum number of rows per batch
+            
+        Yields:
+            Batches of documents
+        """
+        if connection_string.startswith(("http://", "https://")):
+            source = connection_string
+            batches = self._iter_http_rows(connection_string, query, metadata_fields, batch_size)
+        else:
+            # Never store database credentials in document metadata
+            source = make_url(connection_string).render_as_string(hide_password=True)
+            batches = self._iter_sql_rows(connection_string, query, batch_size)
+        
+        for rows in batches:
             documents = []
             
-            # Process each data row
-            for item in data:
+            for item in rows:
                 # Extract content and metadata
                 if "content" not in item:
                     continue
@@ -182,7 +422,7 @@ class KnowledgeBase:
                 
                 # Create metadata dict with only the specified fields
                 metadata = {
-                    "source": connection_string,
+                    "source": source,
                     "source_type": "external_db",
                     "date_added": datetime.now().isoformat(),
                     "id": str(uuid.uuid4())
@@ -193,15 +433,116 @@ class KnowledgeBase:
                     if field in item:
                         metadata[field] = item[field]
                 
-                # Create a document
-                doc = Document(
+                documents.append(Document(
                     page_content=content,
                     metadata=metadata
-                )
-                documents.append(doc)
+                ))
             
-            # Add to vector store
-            self.vector_store.add_documents(documents)
+            if documents:
+                yield documents
+    
+    @staticmethod
+    def _prefetch(iterator: Iterator, depth: int) -> Iterator:
+        """
+        Run an iterator in a background thread, buffering at most `depth` items.
+        
+        The producer blocks while the buffer is full, so a slow consumer
+        throttles fetching instead of letting batches pile up in memory.
+        """
+        buffer = queue.Queue(maxsize=max(1, depth))
+        done = object()
+        stop = threading.Event()
+        
+        def put(item):
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                for item in iterator:
+                    if not put(item):
+                        return
+                put(done)
+            except Exception as e:
+                put(e)
+        
+        producer = threading.Thread(target=produce, name="knowledge-base-prefetch", daemon=True)
+        producer.start()
+        
+        try:
+            while True:
+                item = buffer.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+    
+    def ingest_external_db(self, connection_string: str, query: str, metadata_fields: List[str],
+                           batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Stream data from an external database into the knowledge base.
+        
+        Rows are read in bounded batches (NDJSON or paged responses for REST
+        endpoints, server-side cursors for SQLAlchemy URLs) and each batch is
+        embedded and inserted before more than a few batches are buffered, so
+        memory use does not grow with the size of the result set.
+        
+        Args:
+            connection_string: REST endpoint URL or SQLAlchemy database URL
+            query: Query to get data
+            metadata_fields: Fields to include in metadata
+            batch_size: Optional number of rows per batch
+            
+        Returns:
+            Dict: Counts of batches and documents added
+        """
+        try:
+            batch_size = batch_size or Config.EXTERNAL_DB_BATCH_SIZE
+            total_batches = 0
+            total_documents = 0
+            
+            batches = self._iter_external_documents(connection_string, query, metadata_fields, batch_size)
+            for documents in self._prefetch(batches, Config.INGEST_PREFETCH_BATCHES):
+                self._add_documents(documents)
+                total_batches += 1
+                total_documents += len(documents)
+            
+            return {"batches": total_batches, "documents": total_documents}
+        except Exception as e:
+            raise KnowledgeBaseError(f"Error ingesting from external database: {str(e)}")
+    
+    def connect_external_db(self, connection_string: str, query: str, metadata_fields: List[str]) -> List[Document]:
+        """
+        Connect to an external database and add data to the knowledge base.
+        
+        This keeps every added document in memory for the return value; use
+        `ingest_external_db` for large result sets.
+        
+        Args:
+            connection_string: REST endpoint URL or SQLAlchemy database URL
+            query: Query to get data
+            metadata_fields: Fields to include in metadata
+            
+        Returns:
+            List of documents added to the knowledge base
+        """
+        try:
+            documents = []
+            
+            batches = self._iter_external_documents(
+                connection_string, query, metadata_fields, Config.EXTERNAL_DB_BATCH_SIZE
+            )
+            for batch in batches:
+                self._add_documents(batch)
+                documents.extend(batch)
             
             return documents
         except Exception as e:
@@ -242,96 +583,354 @@ class KnowledgeBase:
             )
             
             # Add to vector store
-            self.vector_store.add_documents([doc])
+            self._add_documents([doc])
             
             return doc
         except Exception as e:
             raise KnowledgeBaseError(f"Error adding verified response: {str(e)}")
     
-    def search_knowledge_base(self, query: str, filter_criteria: Optional[Dict[str, Any]] = None, limit: int = 5) -> List[Document]:
+    @staticmethod
+    def _matches_filter(doc: Document, filter_criteria: Optional[Dict[str, Any]]) -> bool:
+        """Check whether a document's metadata matches all filter criteria."""
+        if not filter_criteria:
+            return True
+        return all(doc.metadata.get(key) == value for key, value in filter_criteria.items())
+    
+    @timed("knowledge_base.embed_query")
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing recent embeddings from an LRU cache."""
+        key = query.strip()
+        
+        with self._query_embeddings_lock:
+            embedding = self._query_embeddings.get(key)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(key)
+                return embedding
+        
+        embedding = self.vector_store.embedding_function(key)
+        
+        with self._query_embeddings_lock:
+            self._query_embeddings[key] = embedding
+            while len(self._query_embeddings) > Config.QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        
+        return embedding
+    
+    @timed("knowledge_base.vector_search")
+    def _vector_search(self, query: str, limit: int,
+                       filter_criteria: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Get the IDs of the documents closest to the query embedding."""
+        embedding = np.array([self._embed_query(query)], dtype=np.float32)
+        
+        # Over-fetch when filtering, since filtered out documents still take up slots
+        fetch_k = limit * 4 if filter_criteria else limit
+        _, indices = self.vector_store.index.search(embedding, fetch_k)
+        
+        doc_ids = []
+        for i in indices[0]:
+            if i == -1:
+                continue
+            doc_id = self.vector_store.index_to_docstore_id[i]
+            if filter_criteria and not self._matches_filter(self.vector_store.docstore.search(doc_id), filter_criteria):
+                continue
+            doc_ids.append(doc_id)
+            if len(doc_ids) >= limit:
+                break
+        return doc_ids
+    
+    @timed("knowledge_base.lexical_search")
+    def _lexical_search(self, query: str, limit: int,
+                        filter_criteria: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Get the IDs of the best BM25 matches for the query."""
+        doc_filter = None
+        if filter_criteria:
+            doc_filter = lambda doc_id: self._matches_filter(self.vector_store.docstore.search(doc_id), filter_criteria)
+        return [doc_id for doc_id, _ in self._lexical_index.search(query, limit, doc_filter)]
+    
+    @staticmethod
+    def _is_exact_lookup(query: str) -> bool:
+        """Check whether a query looks like a code or identifier rather than natural language."""
+        query = query.strip()
+        return len(query.split()) == 1 and bool(re.search(r'\d|[-_./:]', query))
+    
+    @timed("knowledge_base.search")
+    def search_knowledge_base(self, query: str, filter_criteria: Optional[Dict[str, Any]] = None, limit: int = 5,
+                              mode: SearchMode = SearchMode.HYBRID) -> List[Document]:
         """
         Search the knowledge base for relevant documents.
         
+        Hybrid search fuses the vector and BM25 rankings with reciprocal rank
+        fusion. Queries that look like codes or identifiers are answered from
+        the lexical index alone when it has matches, without embedding the query.
+        
         Args:
             query: Search query
             filter_criteria: Optional criteria to filter results
             limit: Maximum number of results
+            mode: Retrieval mode (vector, lexical or hybrid)
             
         Returns:
             List of relevant documents
         """
         try:
-            # If filter is provided, use it
-            if filter_criteria:
-                docs = self.vector_store.similarity_search_with_filter(
-                    query,
-                    filter=filter_criteria,
-                    k=limit
-                )
+            mode = SearchMode(mode)
+            
+            if mode == SearchMode.LEXICAL:
+                doc_ids = self._lexical_search(query, limit, filter_criteria)
+            elif mode == SearchMode.VECTOR:
+                doc_ids = self._vector_search(query, limit, filter_criteria)
             else:
-                docs = self.vector_store.similarity_search(
-                    query,
-                    k=limit
-                )
+                lexical_ids = self._lexical_search(query, limit * 2, filter_criteria)
+                
+                if lexical_ids and self._is_exact_lookup(query):
+                    doc_ids = lexical_ids[:limit]
+                else:
+                    vector_ids = self._vector_search(query, limit * 2, filter_criteria)
+                    fused = reciprocal_rank_fusion([vector_ids, lexical_ids])
+                    doc_ids = [doc_id for doc_id, _ in fused[:limit]]
                 
-            return docs
+            return [self.vector_store.docstore.search(doc_id) for doc_id in doc_ids]
         except Exception as e:
             raise KnowledgeBaseError(f"Error searching knowledge base: {str(e)}")
     
+    @staticmethod
+    def _chunk_overlap(first: str, second: str, max_overlap: int = 1000) -> int:
+        """Get the length of the longest suffix of `first` that is a prefix of `second`."""
+        for size in range(min(len(first), len(second), max_overlap), 0, -1):
+            if second.startswith(first[-size:]):
+                return size
+        return 0
+    
+    @timed("knowledge_base.retrieve_context")
+    def retrieve_context(self, query: str, limit: Optional[int] = None, token_budget: Optional[int] = None,
+                         count_tokens: Optional[Callable[[str], int]] = None) -> List[Document]:
+        """
+        Retrieve knowledge base chunks to ground an answer to a query.
+        
+        Chunks from the same source that overlap (as consecutive splitter
+        chunks do) are merged, duplicates are dropped, and chunks are added
+        in rank order until the token budget is used up.
+        
+        Args:
+            query: The user's query
+            limit: Optional maximum number of chunks
+            token_budget: Optional maximum number of context tokens
+            count_tokens: Optional token counter; defaults to a character-based estimate
+            
+        Returns:
+            List of context documents, best first
+        """
+        limit = limit or Config.RAG_TOP_K
+        token_budget = token_budget or Config.RAG_TOKEN_BUDGET
+        count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+        
+        candidates = self.search_knowledge_base(query, limit=limit * 2)
+        
+        selected = []
+        for doc in candidates:
+            if doc.metadata.get("source") == "init":
+                continue
+            
+            content = doc.page_content.strip()
+            merged = False
+            
+            for i, chosen in enumerate(selected):
+                chosen_content = chosen.page_content
+                if content in chosen_content:
+                    merged = True
+                    break
+                
+                if doc.metadata.get("source") != chosen.metadata.get("source"):
+                    continue
+                
+                if chosen_content in content:
+                    combined = content
+                else:
+                    overlap = self._chunk_overlap(chosen_content, content)
+                    if overlap >= RAG_MIN_OVERLAP:
+                        combined = chosen_content + content[overlap:]
+                    else:
+                        overlap = self._chunk_overlap(content, chosen_content)
+                        if overlap < RAG_MIN_OVERLAP:
+                            continue
+                        combined = content + chosen_content[overlap:]
+                
+                selected[i] = Document(page_content=combined, metadata=chosen.metadata)
+                merged = True
+                break
+            
+            if not merged:
+                selected.append(Document(page_content=content, metadata=doc.metadata))
+        
+        # Keep the best ranked chunks that fit in the budget
+        context = []
+        used_tokens = 0
+        for doc in selected:
+            tokens = count_tokens(doc.page_content)
+            if used_tokens + tokens > token_budget:
+                continue
+            context.append(doc)
+            used_tokens += tokens
+            if len(context) >= limit:
+                break
+        
+        return context
+    
     def export_knowledge_base(self, output_file: str):
         """
-        Export the knowledge base to a file.
+        Export the knowledge base to a directory.
+        
+        The export contains:
+            manifest.json: embedding model, dimension and document count
+            vectors.npy: float32 vectors in index order, loadable with mmap
+            documents.jsonl.gz: one document per line, in index order
         
         Args:
-            output_file: Path to save the export
+            output_file: Path of the directory to save the export in
         """
         try:
-            # Get all documents from the vector store
-            # Note: FAISS doesn't have a built-in way to retrieve all documents
-            # This is a simplified approach
-            
-            # Save the FAISS index
-            self.vector_store.save_local(output_file)
-            
-            # Also save metadata as JSON
-            docs = []  # This would be all documents in a real implementation
+            index = self.vector_store.index
+            docstore = self.vector_store.docstore
+            index_to_docstore_id = self.vector_store.index_to_docstore_id
+            count = index.ntotal
+            dimension = index.d
+            
+            os.makedirs(output_file, exist_ok=True)
+            
+            # Write vectors straight from the index into a memory-mapped .npy file
+            vectors = np.lib.format.open_memmap(
+                os.path.join(output_file, EXPORT_VECTORS_FILE),
+                mode="w+",
+                dtype=np.float32,
+                shape=(count, dimension)
+            )
+            for i in range(0, count, EXPORT_BATCH_SIZE):
+                n = min(EXPORT_BATCH_SIZE, count - i)
+                vectors[i:i + n] = index.reconstruct_n(i, n)
+            vectors.flush()
+            del vectors
+            
+            # Write documents in index order
+            with gzip.open(os.path.join(output_file, EXPORT_DOCUMENTS_FILE), "wt", encoding="utf-8") as f:
+                for i in range(count):
+                    docstore_id = index_to_docstore_id[i]
+                    doc = docstore.search(docstore_id)
+                    f.write(json.dumps({
+                        "id": docstore_id,
+                        "content": doc.page_content,
+                        "metadata": doc.metadata
+                    }, ensure_ascii=False, default=str))
+                    f.write("\n")
+            
+            manifest = {
+                "format_version": EXPORT_FORMAT_VERSION,
+                "embedding_model": Config.EMBEDDING_MODEL,
+                "dimension": dimension,
+                "count": count,
+                "vectors": EXPORT_VECTORS_FILE,
+                "documents": EXPORT_DOCUMENTS_FILE,
+                "created_at": datetime.now().isoformat(),
+                "blog_sync_state": {
+                    blog_url: {
+                        "last_published_date": state["last_published_date"],
+                        "seen_ids": sorted(state["seen_ids"])
+                    }
+                    for blog_url, state in self._blog_sync_state.items()
+                }
+            }
             
-            with open(f"{output_file}_metadata.json", "w") as f:
-                json.dump([{
-                    "content": doc.page_content,
-                    "metadata": doc.metadata
-                } for doc in docs], f)
+            with open(os.path.join(output_file, EXPORT_MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f, indent=2)
                 
         except Exception as e:
             raise KnowledgeBaseError(f"Error exporting knowledge base: {str(e)}")
     
     def import_knowledge_base(self, input_file: str):
         """
-        Import a knowledge base from a file.
+        Import a knowledge base from a directory created by `export_knowledge_base`.
+        
+        Vectors are read from the memory-mapped file in batches and documents
+        are streamed from the compressed file, so nothing is re-embedded.
         
         Args:
-            input_file: Path to the import file
+            input_file: Path of the export directory
         """
         try:
-            # Load FAISS index
-            embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2"
-            )
+            manifest_path = os.path.join(input_file, EXPORT_MANIFEST_FILE)
             
-            self.vector_store = FAISS.load_local(input_file, embeddings)
+            # Fall back to a plain FAISS.save_local directory
+            if not os.path.exists(manifest_path):
+                self.vector_store = FAISS.load_local(input_file, get_embeddings())
+                self._rebuild_lexical_index()
+                return
             
-            # Also load metadata if available
-            if os.path.exists(f"{input_file}_metadata.json"):
-                with open(f"{input_file}_metadata.json", "r") as f:
-                    docs_data = json.load(f)
-                    
-                # Create documents from metadata (in a real implementation)
-                # This might involve updating the vector store with the metadata
-                pass
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            
+            if manifest.get("format_version") != EXPORT_FORMAT_VERSION:
+                raise KnowledgeBaseError(f"Unsupported export format version: {manifest.get('format_version')}")
+            
+            if manifest["embedding_model"] != Config.EMBEDDING_MODEL:
+                raise KnowledgeBaseError(
+                    f"Export was built with embedding model {manifest['embedding_model']}, "
+                    f"but {Config.EMBEDDING_MODEL} is configured"
+                )
+            
+            vectors = np.load(os.path.join(input_file, manifest["vectors"]), mmap_mode="r")
+            if vectors.shape != (manifest["count"], manifest["dimension"]):
+                raise KnowledgeBaseError(f"Vector file shape {vectors.shape} does not match manifest")
+            
+            # Build the index in batches from the memory-mapped vectors
+            index = faiss.IndexFlatL2(manifest["dimension"])
+            for i in range(0, manifest["count"], EXPORT_BATCH_SIZE):
+                index.add(np.ascontiguousarray(vectors[i:i + EXPORT_BATCH_SIZE], dtype=np.float32))
+            del vectors
+            
+            # Stream documents into the docstore
+            docs = {}
+            index_to_docstore_id = {}
+            with gzip.open(os.path.join(input_file, manifest["documents"]), "rt", encoding="utf-8") as f:
+                for i, line in enumerate(f):
+                    record = json.loads(line)
+                    docs[record["id"]] = Document(page_content=record["content"], metadata=record["metadata"])
+                    index_to_docstore_id[i] = record["id"]
+            
+            if len(index_to_docstore_id) != manifest["count"]:
+                raise KnowledgeBaseError("Document file does not match the number of vectors")
+            
+            self.vector_store = FAISS(
+                get_embeddings().embed_query,
+                index,
+                InMemoryDocstore(docs),
+                index_to_docstore_id
+            )
+            self._rebuild_lexical_index()
+            
+            self._blog_sync_state = {
+                blog_url: {
+                    "last_published_date": state["last_published_date"],
+                    "seen_ids": set(state["seen_ids"])
+                }
+                for blog_url, state in manifest.get("blog_sync_state", {}).items()
+            }
                 
+        except KnowledgeBaseError:
+            raise
         except Exception as e:
             raise KnowledgeBaseError(f"Error importing knowledge base: {str(e)}")
 
+# Shared embedding model
+_embeddings_instance = None
+
+def get_embeddings():
+    """Get the shared embedding model instance."""
+    global _embeddings_instance
+    if _embeddings_instance is None:
+        _embeddings_instance = HuggingFaceEmbeddings(
+            model_name=Config.EMBEDDING_MODEL
+        )
+    return _embeddings_instance
+
 # Singleton instance
 _knowledge_base_instance = None
 
@@ -0,0 +1,196 @@
+import math
+import threading
+from bisect import insort
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile using the P-square algorithm.
+    
+    Keeps five markers whatever the number of observations, so memory and
+    update cost are constant (Jain and Chlamtac, 1985).
+    """
+    
+    __slots__ = ("p", "count", "_heights", "_positions", "_desired", "_increments")
+    
+    def __init__(self, p: float):
+        """Initialize an empty estimator for quantile `p` (0 to 1)."""
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+    
+    def add(self, value: float):
+        """Add an observation."""
+        self.count += 1
+        heights = self._heights
+        
+        # The first five observations are the initial markers
+        if len(heights) < 5:
+            insort(heights, value)
+            return
+        
+        positions = self._positions
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+        
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            offset = self._desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (offset <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                positions[i] += step
+    
+    def _parabolic(self, i: int, step: int) -> float:
+        """Piecewise-parabolic prediction of marker i moved by `step`."""
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+    
+    def _linear(self, i: int, step: int) -> float:
+        """Linear prediction of marker i moved by `step`."""
+        q, n = self._heights, self._positions
+        return q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+    
+    def value(self) -> Optional[float]:
+        """Get the current estimate, or None without observations."""
+        if not self._heights:
+            return None
+        if self.count < 5:
+            return self._heights[round(self.p * (len(self._heights) - 1))]
+        return self._heights[2]
+
+class ResponseLengthEstimator:
+    """
+    Learns how many tokens responses take from the responses actually generated.
+    
+    Each observation updates p50 and p95 sketches for progressively coarser
+    keys: model, requested length, creativity and prompt size; then without
+    prompt size; then without creativity; then the model alone. Predictions
+    use the most specific key with enough observations.
+    """
+    
+    QUANTILES = (0.5, 0.95)
+    
+    def __init__(self, min_observations: Optional[int] = None):
+        """Initialize an estimator without observations."""
+        self.min_observations = min_observations or Config.LENGTH_ESTIMATE_MIN_OBSERVATIONS
+        self._sketches = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _keys(model: str, prompt_tokens: int, response_length: Optional[str], creativity: float) -> List[Tuple]:
+        """Get the sketch keys for a request, most specific first."""
+        response_length = getattr(response_length, "value", response_length)
+        creativity_band = min(2, int(creativity * 3))
+        # Prompt sizes in powers of two
+        prompt_band = max(0, int(prompt_tokens)).bit_length()
+        return [
+            (model, response_length, creativity_band, prompt_band),
+            (model, response_length, creativity_band),
+            (model, response_length),
+            (model,)
+        ]
+    
+    def observe(self, model: str, prompt_tokens: int, response_tokens: int,
+                response_length: Optional[str] = None, creativity: float = 0.7,
+                truncated_at: Optional[int] = None):
+        """
+        Record the length of a generated response.
+        
+        A response cut off at its token limit would have been longer, so it is
+        recorded as the limit with headroom. Repeated truncations then raise
+        the p95, and with it the next limit.
+        
+        Args:
+            model: Model that generated the response
+            prompt_tokens: Tokens in the prompt
+            response_tokens: Tokens in the response
+            response_length: Requested response length, if any
+            creativity: Creativity level (0.0 to 1.0)
+            truncated_at: Token limit the response was cut off at, if it was
+        """
+        if truncated_at is not None:
+            response_tokens = max(response_tokens, math.ceil(truncated_at * Config.MAX_TOKENS_HEADROOM))
+        
+        with self._lock:
+            for key in self._keys(model, prompt_tokens, response_length, creativity):
+                sketches = self._sketches.get(key)
+                if sketches is None:
+                    sketches = self._sketches[key] = tuple(P2Quantile(p) for p in self.QUANTILES)
+                for sketch in sketches:
+                    sketch.add(response_tokens)
+    
+    def predict(self, model: str, prompt_tokens: int, response_length: Optional[str] = None,
+                creativity: float = 0.7) -> Optional[Dict]:
+        """
+        Predict the length of a response.
+        
+        Args:
+            model: Model that will generate the response
+            prompt_tokens: Tokens in the prompt
+            response_length: Requested response length, if any
+            creativity: Creativity level (0.0 to 1.0)
+        
+        Returns:
+            Optional[Dict]: The p50 and p95 response tokens and the number of
+                observations behind them, or None until enough responses were seen
+        """
+        with self._lock:
+            for key in self._keys(model, prompt_tokens, response_length, creativity):
+                median, tail = self._sketches.get(key, (None, None))
+                if median is not None and median.count >= self.min_observations:
+                    return {
+                        "p50": median.value(),
+                        "p95": tail.value(),
+                        "observations": median.count
+                    }
+        return None
+    
+    def max_tokens(self, prediction: Optional[Dict]) -> Optional[int]:
+        """
+        Get the completion token limit for a predicted response.
+        
+        Args:
+            prediction: Result of predict()
+        
+        Returns:
+            Optional[int]: The p95 length with headroom, within the configured
+                floor and ceiling, or None to leave the model's default
+        """
+        if prediction is None:
+            return None
+        limit = math.ceil(prediction["p95"] * Config.MAX_TOKENS_HEADROOM)
+        return max(Config.MAX_TOKENS_FLOOR, min(limit, Config.MAX_TOKENS_CEILING))
+
+# Singleton instance
+_length_estimator_instance = None
+
+def get_length_estimator():
+    """Get the singleton response length estimator."""
+    global _length_estimator_instance
+    if _length_estimator_instance is None:
+        _length_estimator_instance = ResponseLengthEstimator()
+    return _length_estimator_instance
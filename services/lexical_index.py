@@ -0,0 +1,122 @@
+import heapq
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Callable
+
+from utils.language import tokenize
+
+class BM25Index:
+    """In-memory BM25 inverted index over knowledge base documents."""
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """Initialize an empty index."""
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self._doc_lengths = {}
+        self._doc_terms = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+    
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+    
+    def add(self, doc_id: str, text: str):
+        """
+        Add a document to the index, replacing any previous version.
+        
+        Args:
+            doc_id: Document ID
+            text: Document text
+        """
+        term_counts = Counter(tokenize(text))
+        
+        with self._lock:
+            if doc_id in self._doc_lengths:
+                self.remove(doc_id)
+            
+            for term, count in term_counts.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+            
+            length = sum(term_counts.values())
+            self._doc_lengths[doc_id] = length
+            self._doc_terms[doc_id] = list(term_counts)
+            self._total_length += length
+    
+    def remove(self, doc_id: str):
+        """Remove a document from the index."""
+        with self._lock:
+            length = self._doc_lengths.pop(doc_id, None)
+            if length is None:
+                return
+            self._total_length -= length
+            
+            for term in self._doc_terms.pop(doc_id):
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+    
+    def clear(self):
+        """Remove all documents from the index."""
+        with self._lock:
+            self._postings = {}
+            self._doc_lengths = {}
+            self._doc_terms = {}
+            self._total_length = 0
+    
+    def search(self, query: str, limit: int = 10,
+               doc_filter: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        Search the index.
+        
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            doc_filter: Optional predicate on document IDs
+        
+        Returns:
+            List of (document ID, score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        scores = {}
+        
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count or not terms:
+                return []
+            avg_length = self._total_length / doc_count
+            
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        
+        candidates = scores.items()
+        if doc_filter:
+            candidates = [item for item in candidates if doc_filter(item[0])]
+        return heapq.nlargest(limit, candidates, key=lambda item: item[1])
+
+def reciprocal_rank_fusion(result_lists: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked lists of document IDs with reciprocal rank fusion.
+    
+    Args:
+        result_lists: Ranked lists of document IDs, best first
+        k: Rank smoothing constant
+    
+    Returns:
+        List of (document ID, fused score) pairs, best first
+    """
+    scores = {}
+    for results in result_lists:
+        for rank, doc_id in enumerate(results, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
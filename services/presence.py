@@ -0,0 +1,218 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Callable
+
+from config import Config
+
+# Claims up to ARGV[2] available agents last seen before ARGV[1] by marking them offline
+REDIS_TAKE_STALE_SCRIPT = """
+local claimed = {}
+local limit = tonumber(ARGV[2])
+for _, agent_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])) do
+    if redis.call('HGET', KEYS[1], agent_id) == 'available' then
+        redis.call('HSET', KEYS[1], agent_id, 'offline')
+        table.insert(claimed, agent_id)
+        if #claimed >= limit then
+            break
+        end
+    end
+end
+return claimed
+"""
+
+class PresenceError(Exception):
+    """Exception raised for errors in the presence table."""
+    pass
+
+class PresenceTable(ABC):
+    """
+    Last heartbeat and status of each agent that sends heartbeats.
+    
+    Heartbeats only touch this table; the database is written when an
+    agent's status actually changes. Agents that have never sent a
+    heartbeat are not tracked, and are never timed out.
+    """
+    
+    def __init__(self):
+        """Initialize the sweeper state."""
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+    
+    @staticmethod
+    def _entry(agent_id: str, status: str, last_seen: float) -> Dict:
+        """Build a presence entry."""
+        return {
+            "agent_id": agent_id,
+            "status": status,
+            "last_seen": datetime.fromtimestamp(last_seen).isoformat()
+        }
+    
+    @abstractmethod
+    def heartbeat(self, agent_id: str, status: str) -> Dict:
+        """
+        Record a heartbeat from an agent.
+        
+        Args:
+            agent_id: ID of the agent
+            status: Current status of the agent
+        
+        Returns:
+            Dict: The presence entry
+        """
+    
+    @abstractmethod
+    def get(self, agent_id: str) -> Optional[Dict]:
+        """Get the presence entry of an agent, or None if it is not tracked."""
+    
+    @abstractmethod
+    def set_status(self, agent_id: str, status: str):
+        """Update the status of a tracked agent without counting as a heartbeat."""
+    
+    @abstractmethod
+    def remove(self, agent_id: str):
+        """Stop tracking an agent."""
+    
+    @abstractmethod
+    def take_stale(self, cutoff: float, limit: int) -> List[str]:
+        """
+        Claim available agents whose last heartbeat is older than `cutoff`.
+        
+        The claimed agents are marked offline in the table, so each one is
+        returned to only one caller even when several workers sweep.
+        
+        Args:
+            cutoff: Timestamp before which a heartbeat is stale
+            limit: Maximum number of agents to claim
+        
+        Returns:
+            List[str]: IDs of the claimed agents
+        """
+    
+    def start_sweeper(self, sweep: Callable[[], None], interval: float):
+        """Run `sweep` every `interval` seconds in a background thread, if not already running."""
+        with self._sweeper_lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        sweep()
+                    except Exception as e:
+                        print(f"Error sweeping stale agents: {str(e)}")
+            
+            self._sweeper = threading.Thread(target=run, name="presence-sweeper", daemon=True)
+            self._sweeper.start()
+
+class InMemoryPresenceTable(PresenceTable):
+    """
+    Presence table held in process memory.
+    
+    Each worker only sees the heartbeats it received, so deployments with
+    more than one worker should use the Redis table instead.
+    """
+    
+    def __init__(self):
+        """Initialize an empty table."""
+        super().__init__()
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def heartbeat(self, agent_id: str, status: str) -> Dict:
+        now = time.time()
+        with self._lock:
+            self._entries[agent_id] = (status, now)
+        return self._entry(agent_id, status, now)
+    
+    def get(self, agent_id: str) -> Optional[Dict]:
+        entry = self._entries.get(agent_id)
+        return self._entry(agent_id, *entry) if entry else None
+    
+    def set_status(self, agent_id: str, status: str):
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None:
+                self._entries[agent_id] = (status, entry[1])
+    
+    def remove(self, agent_id: str):
+        with self._lock:
+            self._entries.pop(agent_id, None)
+    
+    def take_stale(self, cutoff: float, limit: int) -> List[str]:
+        claimed = []
+        with self._lock:
+            for agent_id, (status, last_seen) in self._entries.items():
+                if status == "available" and last_seen < cutoff:
+                    claimed.append(agent_id)
+                    if len(claimed) >= limit:
+                        break
+            for agent_id in claimed:
+                self._entries[agent_id] = ("offline", self._entries[agent_id][1])
+        return claimed
+
+class RedisPresenceTable(PresenceTable):
+    """
+    Presence table in Redis, shared by all workers.
+    
+    Statuses are kept in a hash and heartbeat times in a sorted set, so
+    stale agents are found with a range query.
+    """
+    
+    def __init__(self, redis_url: str, key_prefix: str = "presence"):
+        """Connect to Redis."""
+        super().__init__()
+        try:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+            self._status_key = f"{key_prefix}:status"
+            self._last_seen_key = f"{key_prefix}:last_seen"
+            self._take_stale = self._redis.register_script(REDIS_TAKE_STALE_SCRIPT)
+        except Exception as e:
+            raise PresenceError(f"Error connecting to Redis: {str(e)}")
+    
+    def heartbeat(self, agent_id: str, status: str) -> Dict:
+        now = time.time()
+        pipeline = self._redis.pipeline()
+        pipeline.hset(self._status_key, agent_id, status)
+        pipeline.zadd(self._last_seen_key, {agent_id: now})
+        pipeline.execute()
+        return self._entry(agent_id, status, now)
+    
+    def get(self, agent_id: str) -> Optional[Dict]:
+        pipeline = self._redis.pipeline()
+        pipeline.hget(self._status_key, agent_id)
+        pipeline.zscore(self._last_seen_key, agent_id)
+        status, last_seen = pipeline.execute()
+        if status is None or last_seen is None:
+            return None
+        return self._entry(agent_id, status, last_seen)
+    
+    def set_status(self, agent_id: str, status: str):
+        # Only agents that already sent a heartbeat are tracked
+        if self._redis.hexists(self._status_key, agent_id):
+            self._redis.hset(self._status_key, agent_id, status)
+    
+    def remove(self, agent_id: str):
+        pipeline = self._redis.pipeline()
+        pipeline.hdel(self._status_key, agent_id)
+        pipeline.zrem(self._last_seen_key, agent_id)
+        pipeline.execute()
+    
+    def take_stale(self, cutoff: float, limit: int) -> List[str]:
+        return self._take_stale(keys=[self._status_key, self._last_seen_key], args=[cutoff, limit])
+
+# Singleton instance
+_presence_table_instance = None
+
+def get_presence_table():
+    """Get the singleton presence table, backed by Redis when REDIS_URL is set."""
+    global _presence_table_instance
+    if _presence_table_instance is None:
+        if Config.REDIS_URL:
+            _presence_table_instance = RedisPresenceTable(Config.REDIS_URL)
+        else:
+            _presence_table_instance = InMemoryPresenceTable()
+    return _presence_table_instance
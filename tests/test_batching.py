@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from utils.batching import BatchWorker
+
+def test_items_are_handled_in_bounded_batches():
+    batches = []
+    worker = BatchWorker(batches.append, "test-batches", batch_size=3, interval=60)
+    
+    for i in range(10):
+        worker.put(i)
+    
+    assert worker.flush()
+    assert [item for batch in batches for item in batch] == list(range(10))
+    assert max(len(batch) for batch in batches) <= 3
+
+def test_handler_errors_do_not_stop_the_thread():
+    handled = []
+    
+    def handle(batch):
+        if batch == ["bad"]:
+            raise ValueError("bad batch")
+        handled.extend(batch)
+    
+    worker = BatchWorker(handle, "test-errors", interval=60)
+    worker.put("bad")
+    assert worker.flush()
+    worker.put("good")
+    assert worker.flush()
+    
+    assert handled == ["good"]
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_gets_its_own_thread(tmp_path):
+    path = tmp_path / "items.txt"
+    
+    def handle(batch):
+        with open(path, "a") as items:
+            items.writelines(f"{os.getpid()} {item}\n" for item in batch)
+    
+    worker = BatchWorker(handle, "test-fork", interval=60)
+    worker.put("parent")
+    assert worker.flush()
+    
+    pid = os.fork()
+    if pid == 0:
+        worker.put("child")
+        os._exit(0 if worker.flush() else 1)
+    _, status = os.waitpid(pid, 0)
+    
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert path.read_text().splitlines() == [f"{os.getpid()} parent", f"{pid} child"]
@@ -0,0 +1,82 @@
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from services.database import DatabaseManager
+from services.handoff_queue import HandoffQueue
+
+ENGLISH_AGENT = {"id": "agent-1", "languages": ["en"], "level": "senior", "specialties": ["billing"]}
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two queues on one database file, as two gunicorn workers have."""
+    db_path = str(tmp_path / "handoffs.db")
+    return HandoffQueue(DatabaseManager(db_path)), HandoffQueue(DatabaseManager(db_path))
+
+def test_tickets_are_shared_between_workers(workers):
+    first, second = workers
+    ticket = first.enqueue("conversation-1", {"preferred_language": "en"})
+    
+    assert len(second) == 1
+    assert second.get(ticket["id"])["position"] == 1
+    
+    cancelled = second.cancel(ticket["id"])
+    
+    assert cancelled["status"] == "cancelled"
+    assert first.get(ticket["id"])["status"] == "cancelled"
+    assert len(first) == 0
+
+def test_a_ticket_is_taken_by_one_worker_only(workers):
+    first, second = workers
+    low = first.enqueue("conversation-1", {"preferred_language": "en"}, priority=0)
+    high = first.enqueue("conversation-2", {"required_specialties": ["billing"]}, priority=5)
+    first.enqueue("conversation-3", {"preferred_language": "fa"}, priority=9)
+    
+    assert second.take_for_agent(ENGLISH_AGENT)["id"] == high["id"]
+    assert first.take_for_agent(ENGLISH_AGENT)["id"] == low["id"]
+    assert first.take_for_agent(ENGLISH_AGENT) is None
+    
+    second.release(high["id"])
+    assert first.take_for_agent(ENGLISH_AGENT)["id"] == high["id"]
+    
+    assigned = first.complete(high["id"], handoff_id="handoff-1", agent_id="agent-1")
+    assert assigned["status"] == "assigned"
+    assert second.get(high["id"])["handoff_id"] == "handoff-1"
+
+def test_waiting_tickets_survive_a_worker_restart(tmp_path):
+    db_path = str(tmp_path / "handoffs.db")
+    ticket = HandoffQueue(DatabaseManager(db_path)).enqueue("conversation-1", {})
+    HandoffQueue(DatabaseManager(db_path)).take_for_agent(ENGLISH_AGENT)
+    
+    # The worker that took the ticket stopped before completing it
+    restarted = HandoffQueue(DatabaseManager(db_path), dispatch_timeout=0)
+    
+    assert restarted.take_for_agent(ENGLISH_AGENT)["id"] == ticket["id"]
+
+def test_specialties_are_matched_when_taking(workers):
+    first, _ = workers
+    billing = first.enqueue("conversation-1", {"required_specialties": ["billing"]}, priority=5)
+    general = first.enqueue("conversation-2", {})
+    
+    generalist = {"id": "agent-2", "languages": ["en"], "level": "junior", "specialties": []}
+    assert first.take_for_agent(generalist)["id"] == general["id"]
+    assert first.take_for_agent(generalist) is None
+    assert first.take_for_agent(ENGLISH_AGENT)["id"] == billing["id"]
+
+def test_a_ticket_taken_again_is_assigned_once(tmp_path):
+    db_path = str(tmp_path / "handoffs.db")
+    stalled = HandoffQueue(DatabaseManager(db_path))
+    ticket = stalled.enqueue("conversation-1", {})
+    stalled.take_for_agent(ENGLISH_AGENT)
+    
+    # Another worker takes the ticket over and assigns it along with its claim on an agent
+    other = HandoffQueue(DatabaseManager(db_path), dispatch_timeout=0)
+    assert other.take_for_agent(ENGLISH_AGENT)["id"] == ticket["id"]
+    with other.db_manager.unit_of_work() as cursor:
+        assert other.complete(ticket["id"], cursor, handoff_id="handoff-1")["status"] == "assigned"
+    
+    # The first worker resumes, and finds that it may no longer assign the ticket
+    with stalled.db_manager.unit_of_work() as cursor:
+        assert not stalled.is_dispatching(cursor, ticket["id"])
+    assert other.take_for_agent(ENGLISH_AGENT) is None
+    assert not other.has_waiting()
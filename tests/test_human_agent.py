@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from config import Config
+from services.agent_cache import AgentCache
+from services.agent_index import AgentRoutingIndex
+from services.database import DatabaseManager
+from services.events import EventBroker
+from services.handoff_queue import HandoffQueue
+from services.human_agent import HumanAgentManager
+from services.presence import InMemoryPresenceTable
+
+def worker(db_manager):
+    """A manager with the per-process state of one gunicorn worker without Redis."""
+    return HumanAgentManager(
+        db_manager,
+        agent_index=AgentRoutingIndex(db_manager),
+        handoff_queue=HandoffQueue(db_manager),
+        presence=InMemoryPresenceTable(),
+        events=EventBroker(),
+        agent_cache=AgentCache()
+    )
+
+@pytest.fixture
+def workers(tmp_path):
+    db_path = str(tmp_path / "agents.db")
+    return worker(DatabaseManager(db_path)), worker(DatabaseManager(db_path))
+
+def test_sweep_leaves_an_agent_claimed_by_another_worker_busy(workers, monkeypatch):
+    first, second = workers
+    agent = first.register_agent({"name": "Ann", "level": "senior", "hourly_rate": 20, "languages": ["en"]})
+    first.heartbeat(agent["id"], "available")
+    conversation = first.db_manager.create_conversation(
+        {"user_id": "user-1", "title": "Refund", "model": "llama", "language": "en"}
+    )
+    
+    assert second.handoff_conversation(conversation["id"], {"preferred_language": "en"})["success"]
+    
+    # The agent's heartbeats stop reaching the first worker, whose presence table still says available
+    monkeypatch.setattr(Config, "PRESENCE_TIMEOUT_SECONDS", -1)
+    
+    assert first.sweep_stale_agents() == []
+    assert first.db_manager.get_agent(agent["id"])["status"] == "busy"
+    assert first.get_agent(agent["id"])["status"] == "busy"
+
+def test_sweep_sets_silent_available_agents_offline(workers, monkeypatch):
+    first, _ = workers
+    agent = first.register_agent({"name": "Ann", "level": "senior", "hourly_rate": 20, "languages": ["en"]})
+    first.heartbeat(agent["id"], "available")
+    monkeypatch.setattr(Config, "PRESENCE_TIMEOUT_SECONDS", -1)
+    
+    assert first.sweep_stale_agents() == [agent["id"]]
+    assert first.db_manager.get_agent(agent["id"])["status"] == "offline"
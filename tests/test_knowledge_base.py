@@ -0,0 +1,309 @@
+import json
+import math
+import sqlite3
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain")
+
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langchain.vectorstores import FAISS
+
+from config import Config
+from services.knowledge_base import KnowledgeBase, KnowledgeBaseError, SearchMode
+from utils.language import tokenize
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings, so tests need no model download."""
+    
+    dimension = 256
+    
+    def embed_query(self, text):
+        vector = [0.0] * self.dimension
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode("utf-8")) % self.dimension] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+    
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+@pytest.fixture
+def knowledge_base():
+    vector_store = FAISS.from_documents(
+        [Document(page_content="Initialization document", metadata={"source": "init"})],
+        HashingEmbeddings()
+    )
+    return KnowledgeBase(vector_store)
+
+VERIFIED_RESPONSES = [
+    ("How do I reset my password?", "Open account settings and choose reset password."),
+    ("When will my refund arrive?", "Refunds reach your card within five business days."),
+    ("What does ERR_QUOTA_42 mean?", "ERR_QUOTA_42 means the monthly API quota is used up."),
+]
+
+def test_ingested_documents_are_found_by_every_search_mode(knowledge_base):
+    docs = [knowledge_base.add_verified_response(question, answer, {"topic": "faq"})
+            for question, answer in VERIFIED_RESPONSES]
+    
+    assert len(knowledge_base._lexical_index) == len(docs) + 1
+    
+    for doc in docs:
+        query = doc.metadata["question"]
+        for mode in SearchMode:
+            results = knowledge_base.search_knowledge_base(query, limit=1, mode=mode)
+            assert [result.metadata["id"] for result in results] == [doc.metadata["id"]], mode
+
+def test_hybrid_search_answers_codes_from_the_lexical_index(knowledge_base):
+    for question, answer in VERIFIED_RESPONSES:
+        knowledge_base.add_verified_response(question, answer, {})
+    
+    results = knowledge_base.search_knowledge_base("ERR_QUOTA_42", limit=3)
+    
+    assert results[0].metadata["question"] == "What does ERR_QUOTA_42 mean?"
+    # Identifier lookups are answered without embedding the query
+    assert "ERR_QUOTA_42" not in knowledge_base._query_embeddings
+
+class LocalHttpServer:
+    """
+    A local HTTP server answering every request with `route(method, path, params, body)`.
+    
+    The route gets the parsed query string and JSON body, and returns the
+    status, Content-Type and body bytes of the response.
+    """
+    
+    def __init__(self, route):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler(route))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="local-http", daemon=True).start()
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    @staticmethod
+    def _handler(route):
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, content_type, data = route(self.command, url.path, parse_qs(url.query), body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            do_GET = do_POST = respond
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+def json_response(body, status=200):
+    return status, "application/json", json.dumps(body).encode("utf-8")
+
+@pytest.fixture
+def serve():
+    """Start local HTTP servers with a routing function each, and stop them after the test."""
+    servers = []
+    
+    def start(route):
+        server = LocalHttpServer(route)
+        servers.append(server)
+        return server.url
+    
+    yield start
+    for server in servers:
+        server.stop()
+
+class FakeBlog:
+    """A blog API listing posts newest first, a page at a time, with content fetched per post."""
+    
+    def __init__(self, posts):
+        self.posts = posts
+        self.paginate = True
+        self.failing_page = None
+        self.requests = []
+    
+    def add_post(self, post_id):
+        self.posts.insert(0, blog_post(post_id))
+    
+    def route(self, method, path, params, body):
+        self.requests.append(path)
+        if path == "/api/posts":
+            if params["page"] == [str(self.failing_page)]:
+                # Not a status the session retries, so the sync fails at once
+                return json_response({"error": "forbidden"}, status=403)
+            return json_response(self.listing(params))
+        post_id = int(path.rsplit("/", 1)[1])
+        return json_response(next(post for post in self.posts if post["id"] == post_id))
+    
+    def listing(self, params):
+        page, per_page = int(params["page"][0]), int(params["per_page"][0])
+        posts = sorted(self.posts, key=lambda post: post["published_date"], reverse=True)
+        if not self.paginate:
+            return posts[:per_page]
+        start = (page - 1) * per_page
+        return {
+            "posts": [{key: value for key, value in post.items() if key != "content"}
+                      for post in posts[start:start + per_page]],
+            "has_more": start + per_page < len(posts)
+        }
+
+def blog_post(post_id):
+    return {
+        "id": post_id,
+        "title": f"Release notes {post_id}",
+        "content": f"Release {post_id} adds feature{post_id} to the dashboard.",
+        "published_date": f"2024-01-{post_id:02d}T00:00:00"
+    }
+
+@pytest.fixture
+def fake_blog(monkeypatch, serve):
+    monkeypatch.setattr(Config, "BLOG_PAGE_SIZE", 2)
+    blog = FakeBlog([blog_post(post_id) for post_id in range(1, 6)])
+    blog.url = serve(blog.route)
+    return blog
+
+def test_blog_sync_pages_through_posts_and_skips_seen_ones(knowledge_base, fake_blog):
+    docs = knowledge_base.learn_from_blog(fake_blog.url)
+    
+    assert sorted(doc.metadata["post_id"] for doc in docs) == [1, 2, 3, 4, 5]
+    assert fake_blog.requests.count("/api/posts") == 3
+    assert sorted(path for path in fake_blog.requests if path != "/api/posts") == [
+        f"/api/posts/{post_id}" for post_id in range(1, 6)
+    ]
+    
+    fake_blog.add_post(6)
+    fake_blog.requests.clear()
+    docs = knowledge_base.learn_from_blog(fake_blog.url)
+    
+    assert [doc.metadata["post_id"] for doc in docs] == [6]
+    # Paging stops at the page reaching the previous sync, and only the new post is fetched
+    assert fake_blog.requests == ["/api/posts", "/api/posts/6", "/api/posts"]
+    assert [doc.metadata["post_id"] for doc in knowledge_base.search_knowledge_base("feature6", limit=1)] == [6]
+
+def test_blog_sync_resumes_posts_of_a_page_that_failed(knowledge_base, fake_blog):
+    fake_blog.failing_page = 2
+    
+    with pytest.raises(KnowledgeBaseError):
+        knowledge_base.learn_from_blog(fake_blog.url)
+    
+    fake_blog.failing_page = None
+    docs = knowledge_base.learn_from_blog(fake_blog.url)
+    
+    # Posts 5 and 4 were ingested from page 1 and are not fetched again
+    assert sorted(doc.metadata["post_id"] for doc in docs) == [1, 2, 3]
+
+def test_blog_sync_stops_when_the_server_ignores_paging(knowledge_base, fake_blog):
+    fake_blog.paginate = False
+    
+    docs = knowledge_base.learn_from_blog(fake_blog.url)
+    
+    assert sorted(doc.metadata["post_id"] for doc in docs) == [4, 5]
+    assert fake_blog.requests == ["/api/posts", "/api/posts"]
+
+class FakeRowSource:
+    """A REST endpoint returning query rows as NDJSON or as pages linked by a cursor."""
+    
+    def __init__(self, rows):
+        self.rows = rows
+        self.format = "ndjson"
+        self.requests = []
+    
+    def route(self, method, path, params, payload):
+        self.requests.append(payload)
+        if self.format == "ndjson":
+            return 200, "application/x-ndjson", "".join(json.dumps(row) + "\n" for row in self.rows).encode("utf-8")
+        start = int(payload.get("cursor", 0))
+        end = start + payload["page_size"]
+        return json_response({
+            "rows": self.rows[start:end],
+            "next_cursor": str(end) if end < len(self.rows) else None
+        })
+
+def external_rows(count):
+    return [{"content": f"Row {row_id} describes topic{row_id}.", "row_id": row_id} for row_id in range(count)]
+
+@pytest.fixture
+def row_source(serve):
+    source = FakeRowSource(external_rows(25))
+    source.url = serve(source.route) + "/query"
+    return source
+
+@pytest.fixture
+def sqlite_source(tmp_path):
+    """SQLAlchemy URL of a SQLite database with 100 rows."""
+    path = tmp_path / "external.db"
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE rows (content TEXT, row_id INTEGER)")
+        conn.executemany("INSERT INTO rows VALUES (:content, :row_id)", external_rows(100))
+    conn.close()
+    return f"sqlite:///{path}"
+
+@pytest.fixture
+def added_batches(knowledge_base, monkeypatch):
+    """Row IDs of each batch added to the knowledge base."""
+    batches = []
+    add_documents = knowledge_base._add_documents
+    
+    def record(documents):
+        batches.append([doc.metadata["row_id"] for doc in documents])
+        return add_documents(documents)
+    
+    monkeypatch.setattr(knowledge_base, "_add_documents", record)
+    return batches
+
+@pytest.mark.parametrize("response_format", ["ndjson", "cursor"])
+def test_http_rows_are_ingested_in_bounded_batches(knowledge_base, row_source, added_batches, response_format):
+    row_source.format = response_format
+    
+    result = knowledge_base.ingest_external_db(row_source.url, "recent tickets", ["row_id"], batch_size=10)
+    
+    assert result == {"batches": 3, "documents": 25}
+    assert [len(batch) for batch in added_batches] == [10, 10, 5]
+    assert sorted(row_id for batch in added_batches for row_id in batch) == list(range(25))
+    assert len(row_source.requests) == (1 if response_format == "ndjson" else 3)
+    assert [doc.metadata["row_id"] for doc in knowledge_base.search_knowledge_base("topic17", limit=1)] == [17]
+
+def test_sql_rows_are_ingested_in_bounded_batches(knowledge_base, sqlite_source, added_batches):
+    result = knowledge_base.ingest_external_db(sqlite_source, "SELECT content, row_id FROM rows", ["row_id"],
+                                               batch_size=30)
+    
+    assert result == {"batches": 4, "documents": 100}
+    assert [len(batch) for batch in added_batches] == [30, 30, 30, 10]
+    assert sorted(row_id for batch in added_batches for row_id in batch) == list(range(100))
+    assert all(doc.metadata["source"] == sqlite_source
+               for doc in knowledge_base.search_knowledge_base("topic42", limit=1))
+
+def test_prefetch_thread_stops_when_adding_a_batch_fails(knowledge_base, sqlite_source, monkeypatch):
+    def fail(documents):
+        raise RuntimeError("vector store unavailable")
+    
+    monkeypatch.setattr(knowledge_base, "_add_documents", fail)
+    running = set(threading.enumerate())
+    
+    with pytest.raises(KnowledgeBaseError, match="vector store unavailable"):
+        knowledge_base.ingest_external_db(sqlite_source, "SELECT content, row_id FROM rows", ["row_id"],
+                                          batch_size=10)
+    
+    # 100 rows make more batches than are prefetched, so the producer was still reading
+    producers = [thread for thread in threading.enumerate() if thread not in running]
+    for producer in producers:
+        producer.join(timeout=2)
+    assert not any(producer.is_alive() for producer in producers)
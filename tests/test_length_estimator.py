@@ -0,0 +1,23 @@
+from services.length_estimator import ResponseLengthEstimator
+
+def test_truncated_responses_raise_the_limit():
+    estimator = ResponseLengthEstimator(min_observations=5)
+    for _ in range(20):
+        estimator.observe("model", 100, 100, "medium")
+    limit = estimator.max_tokens(estimator.predict("model", 100, "medium"))
+    
+    # Responses now run past every limit they are given
+    limits = [limit]
+    for _ in range(60):
+        estimator.observe("model", 100, limits[-1], "medium", truncated_at=limits[-1])
+        limits.append(estimator.max_tokens(estimator.predict("model", 100, "medium")))
+    
+    assert limits == sorted(limits)
+    assert limits[-1] > limit
+
+def test_untruncated_responses_are_recorded_as_generated():
+    estimator = ResponseLengthEstimator(min_observations=5)
+    for _ in range(20):
+        estimator.observe("model", 100, 300, "medium")
+    
+    assert estimator.predict("model", 100, "medium")["p95"] == 300
@@ -0,0 +1,109 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, List
+
+class BatchWorker:
+    """
+    Hands queued items to a function in batches from a background thread.
+    
+    Items are queued without waiting, and the thread passes them on once
+    `batch_size` have arrived or `interval` seconds have passed, so callers
+    never wait for the disk or the network. When the queue is full, items
+    are dropped and counted.
+    
+    The thread is started on first use in each process. A gunicorn worker
+    forked from a master that already used the worker starts its own
+    thread with an empty queue, since neither the parent's thread nor the
+    items it had queued survive the fork.
+    """
+    
+    def __init__(self, handle: Callable[[List[Any]], None], name: str, queue_size: int = 10000,
+                 batch_size: int = 512, interval: float = 1.0):
+        """
+        Initialize a worker.
+        
+        Args:
+            handle: Function called on the thread with each batch of items
+            name: Name of the thread
+            queue_size: Maximum number of items waiting to be handled
+            batch_size: Maximum number of items handled at once
+            interval: Seconds between batches when few items are queued
+        """
+        self.handle = handle
+        self.name = name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue_size = queue_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def put(self, item: Any):
+        """Queue an item, dropping it if the queue is full."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+    
+    def _ensure_thread(self):
+        """Start the thread in this process, including after a fork."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Items queued before a fork belong to the parent
+                self._queue = queue.Queue(maxsize=self._queue_size)
+                threading.Thread(target=self._run, name=self.name, daemon=True).start()
+                if self._pid is None:
+                    atexit.register(self.flush)
+                self._pid = os.getpid()
+    
+    def _run(self):
+        """Hand queued items on in batches."""
+        while True:
+            batch = []
+            flushed = None
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    flushed = item
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self.handle(batch)
+                except Exception as e:
+                    print(f"Error in {self.name}: {str(e)}")
+            if flushed is not None:
+                flushed.set()
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Handle every item queued so far.
+        
+        Args:
+            timeout: Maximum seconds to wait
+        
+        Returns:
+            bool: Whether the items were handled in time
+        """
+        if self._pid != os.getpid():
+            return True
+        flushed = threading.Event()
+        try:
+            self._queue.put(flushed, timeout=timeout)
+        except queue.Full:
+            return False
+        return flushed.wait(timeout)
@@ -1,3 +1,4 @@
+import re
 from enum import Enum
 
 class Language(Enum):
@@ -14,3 +15,41 @@ class ResponseStyle(Enum):
     CONVERSATIONAL = "conversational"
     SCIENTIFIC = "scientific"
     HUMOROUS = "humorous"
+
+# Arabic code points that have a distinct Persian form, plus Persian and Arabic-Indic digits
+_PERSIAN_TRANSLATION = str.maketrans({
+    "\u064A": "\u06CC",  # Arabic yeh -> Persian yeh
+    "\u0649": "\u06CC",  # Alef maksura -> Persian yeh
+    "\u0643": "\u06A9",  # Arabic kaf -> Persian kaf
+    "\u0629": "\u0647",  # Teh marbuta -> heh
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+})
+
+# Diacritics, superscript alef, tatweel and zero-width non-joiner
+_PERSIAN_IGNORED = re.compile(r'[\u064B-\u065F\u0670\u0640\u200C]')
+
+# Words, optionally joined into codes such as "ERR-404" or "v1.2.3"
+_TOKEN_PATTERN = re.compile(r'\w+(?:[-_./:]\w+)*')
+_TOKEN_PART_PATTERN = re.compile(r'[^\W_]+')
+
+def normalize_text(text):
+    """Normalize text for matching, unifying Persian and Arabic letter forms."""
+    text = text.translate(_PERSIAN_TRANSLATION)
+    text = _PERSIAN_IGNORED.sub('', text)
+    return text.lower()
+
+def tokenize(text):
+    """
+    Split text into normalized tokens for lexical search.
+    
+    Compound tokens such as product codes are kept whole and their parts
+    are emitted as well, so "ERR-404" matches both "err-404" and "404".
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(normalize_text(text)):
+        tokens.append(token)
+        parts = _TOKEN_PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
@@ -0,0 +1,96 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Tuple
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+from utils.recording import add_stage_time
+from utils.tracing import get_tracer
+
+# Latency buckets in seconds, from pooled database reads up to slow model calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "parviz_stage_seconds",
+    "Time spent in each stage of request handling",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "parviz_stage_errors_total",
+    "Stages that raised an exception",
+    ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "parviz_http_request_seconds",
+    "Time to handle HTTP requests, by route and status",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+@contextmanager
+def span(stage: str, **attributes):
+    """
+    Time a stage of request handling.
+    
+    Inside a traced request the stage is also recorded as a span of the trace,
+    and inside a recorded request its time is added to the record.
+    
+    Args:
+        stage: Name of the stage, such as "ai.model_invoke"; keep the set of names fixed
+        **attributes: Attributes of the trace span, such as the model name
+    
+    Yields:
+        Optional[Span]: The trace span, or None outside a traced request
+    """
+    start = time.perf_counter()
+    try:
+        with get_tracer().start_span(stage, attributes) as trace_span:
+            yield trace_span
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        add_stage_time(stage, elapsed)
+
+def timed(stage: str) -> Callable:
+    """Decorate a function so that each call is timed as `stage`."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """Record a handled HTTP request."""
+    REQUEST_SECONDS.labels(method, route, str(status)).observe(seconds)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+    
+    Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set and every worker writes
+    its samples there, so the metrics of all workers are merged whichever
+    worker serves the scrape.
+    
+    Returns:
+        Tuple[bytes, str]: The metrics and their content type
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int):
+    """Drop the live samples of a worker that exited, keeping its counters and histograms."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,266 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+# Tags that models wrap their reasoning in
+THINK_TAGS = ("think", "thinking")
+
+# Characters kept by the Persian filter besides whitespace: the Arabic block and the zero-width non-joiner
+PERSIAN_CHARACTERS = r"\u0600-\u06FF\u200C"
+
+# A reasoning section, up to its closing tag and the whitespace after it, or to the end of a truncated response.
+# The body is matched up to each `<` rather than one character at a time.
+_THINK_TAG_NAMES = "|".join(THINK_TAGS)
+_THINK = rf"<(?P<tag>{_THINK_TAG_NAMES})>[^<]*(?:<(?!/(?P=tag)>)[^<]*)*(?:(?P<closed></(?P=tag)>)\s*|\Z)"
+
+# Spaces at the end of a line, and newlines that would leave more than one blank line.
+# Every step only removes text, so the substitution never calls back into Python.
+_TRAILING_SPACE = (r" [ \t]*(?=\n)", r"\t[ \t]*(?=\n)")
+_EXTRA_NEWLINE = r"\n(?=[ \t]*\n[ \t]*\n)"
+
+# Whitespace, then the last (possibly incomplete) word of a streamed buffer
+_LAST_WORD = re.compile(r"\s*\S*\Z")
+
+class ResponsePostProcessor:
+    """
+    Cleans up generated responses in a single pass.
+    
+    The enabled steps are compiled into one regular expression, so the
+    response is scanned once and copied once whatever the number of steps.
+    Removed text takes the spaces before it along, so no double spaces are
+    left behind.
+    
+    Unless Persian filtering is on, every alternative of the expression
+    starts with a literal character, which lets the regex engine skip
+    straight to the characters where a match can start.
+    """
+    
+    def __init__(self, strip_thinking: bool = True, persian_only: bool = False,
+                 exclusion_words: Optional[Iterable[str]] = None, normalize_whitespace: bool = True):
+        """
+        Compile a post-processor.
+        
+        Args:
+            strip_thinking: Remove <think> and <thinking> sections
+            persian_only: Remove text that is not Persian
+            exclusion_words: Words and phrases to remove, matched case-insensitively
+            normalize_whitespace: Remove trailing spaces, collapse runs of blank
+                lines and strip the response
+        """
+        self.strip_thinking = strip_thinking
+        self.normalize_whitespace = normalize_whitespace
+        self.exclusion_words = tuple(sorted({word.strip() for word in exclusion_words or () if word.strip()},
+                                            key=len, reverse=True))
+        # Words a streamed buffer holds back, so that excluded phrases are never split
+        self.hold_words = max((len(word.split()) for word in self.exclusion_words), default=1)
+        
+        parts = []
+        if strip_thinking:
+            parts.append(_THINK)
+        if self.exclusion_words:
+            parts.extend(self._exclusion_parts())
+        if persian_only:
+            space = r"[ \t]*" if normalize_whitespace else ""
+            if strip_thinking:
+                # Stop before reasoning tags so that they are still recognized
+                parts.append(rf"{space}(?:[^{PERSIAN_CHARACTERS}\s<]|<(?!(?:{_THINK_TAG_NAMES})>))+")
+            else:
+                parts.append(rf"{space}[^{PERSIAN_CHARACTERS}\s]+")
+        if normalize_whitespace:
+            parts.extend(_TRAILING_SPACE)
+            parts.append(_EXTRA_NEWLINE)
+        
+        self._pattern = re.compile("|".join(parts)) if parts else None
+    
+    def _exclusion_parts(self) -> List[str]:
+        """Build the alternatives matching excluded words, each starting with a literal character."""
+        words = "|".join(re.escape(word) for word in self.exclusion_words)
+        parts = []
+        if self.normalize_whitespace:
+            parts.extend(rf"{re.escape(space)}[ \t]*(?i:{words})(?!\w)" for space in " \t")
+        
+        # Spell out the cases of the first letter, and match the rest case-insensitively
+        by_first = {}
+        for word in self.exclusion_words:
+            for first in {word[0], word[0].lower(), word[0].upper()}:
+                if len(first) == 1:
+                    by_first.setdefault(first, []).append(re.escape(word[1:]))
+        for first, rests in by_first.items():
+            parts.append(rf"{re.escape(first)}(?<!\w.)(?i:{'|'.join(rests)})(?!\w)")
+        return parts
+    
+    def process(self, text: str) -> str:
+        """
+        Post-process a complete response.
+        
+        Args:
+            text: The generated response
+        
+        Returns:
+            str: The cleaned response
+        """
+        if self._pattern is not None:
+            text = self._pattern.sub("", text)
+        return text.strip() if self.normalize_whitespace else text
+    
+    def stream(self) -> "StreamingPostProcessor":
+        """Create a post-processor for a response that is still being generated."""
+        return StreamingPostProcessor(self)
+    
+    def _is_open_think(self, match: re.Match) -> bool:
+        """Check whether a match is a reasoning section that has not been closed yet."""
+        return self.strip_thinking and match.group("tag") is not None and match.group("closed") is None
+
+class StreamingPostProcessor:
+    """
+    Post-processes a response as its text arrives.
+    
+    Text is only processed once no pattern can match across its end, so
+    the concatenated output equals ResponsePostProcessor.process() of the
+    whole response. The last words are held back until whitespace follows
+    them, and an open reasoning section is dropped as it arrives, keeping
+    only enough text to recognize its closing tag.
+    """
+    
+    __slots__ = ("processor", "_buffer", "_pending", "_started", "_think_close", "_skip_space")
+    
+    def __init__(self, processor: ResponsePostProcessor):
+        """Initialize a streaming post-processor without text."""
+        self.processor = processor
+        self._buffer = ""
+        self._pending = ""
+        self._started = False
+        self._think_close = None
+        self._skip_space = False
+    
+    def feed(self, delta: str) -> str:
+        """
+        Add text to the response.
+        
+        Args:
+            delta: The next piece of the response
+        
+        Returns:
+            str: Cleaned text that is now final, possibly empty
+        """
+        self._buffer += delta
+        return self._emit(self._drain(final=False), final=False)
+    
+    def flush(self) -> str:
+        """
+        End the response.
+        
+        Returns:
+            str: The remaining cleaned text
+        """
+        text = self._drain(final=True)
+        self._buffer = ""
+        self._think_close = None
+        return self._emit(text, final=True)
+    
+    def _drain(self, final: bool) -> str:
+        """Process as much of the buffer as is final."""
+        output = []
+        while self._buffer:
+            if self._think_close is not None:
+                end = self._buffer.find(self._think_close)
+                if end < 0:
+                    # Keep only what could be the start of the closing tag
+                    self._buffer = self._buffer[-(len(self._think_close) - 1):]
+                    break
+                self._buffer = self._buffer[end + len(self._think_close):]
+                self._think_close = None
+                self._skip_space = True
+            
+            if self._skip_space:
+                self._buffer = self._buffer.lstrip()
+                if not self._buffer:
+                    break
+                self._skip_space = False
+            
+            cut = len(self._buffer) if final else self._cut()
+            if cut == 0:
+                break
+            if not self._process(cut, output):
+                break
+        
+        return "".join(output)
+    
+    def _process(self, cut: int, output: list) -> bool:
+        """
+        Process the buffer up to `cut`, or up to the first match that crosses it.
+        
+        Returns:
+            bool: Whether a reasoning section was opened, so that draining continues
+        """
+        processor = self.processor
+        buffer = self._buffer
+        position = 0
+        if processor._pattern is not None:
+            for match in processor._pattern.finditer(buffer):
+                start, end = match.span()
+                if start >= cut:
+                    break
+                if end > cut:
+                    if processor._is_open_think(match):
+                        # Drop the section as it arrives, without scanning it again
+                        self._think_close = f"</{match.group('tag')}>"
+                        output.append(buffer[position:start])
+                        self._buffer = buffer[match.end("tag") + 1:]
+                        return True
+                    # The match may still change, so process it with the text after it
+                    cut = start
+                    break
+                output.append(buffer[position:start])
+                position = end
+        output.append(buffer[position:cut])
+        self._buffer = buffer[cut:]
+        return False
+    
+    def _cut(self) -> int:
+        """Find the end of the text before the last words, which may still change."""
+        cut = len(self._buffer)
+        for _ in range(self.processor.hold_words):
+            cut = _LAST_WORD.search(self._buffer, 0, cut).start()
+        return cut
+    
+    def _emit(self, text: str, final: bool) -> str:
+        """Apply the stripping of the whole response to a piece of it."""
+        if not self.processor.normalize_whitespace:
+            return text
+        text = self._pending + text
+        if not self._started:
+            text = text.lstrip()
+        if final:
+            self._pending = ""
+            return text.rstrip()
+        # Whitespace is only sent once more text follows it
+        body = text.rstrip()
+        self._pending = text[len(body):]
+        if body:
+            self._started = True
+        return body
+
+@lru_cache(maxsize=256)
+def _cached_post_processor(strip_thinking: bool, persian_only: bool, exclusion_words: Tuple[str, ...],
+                           normalize_whitespace: bool) -> ResponsePostProcessor:
+    return ResponsePostProcessor(strip_thinking, persian_only, exclusion_words, normalize_whitespace)
+
+def get_post_processor(strip_thinking: bool = True, persian_only: bool = False,
+                       exclusion_words: Optional[Iterable[str]] = None,
+                       normalize_whitespace: bool = True) -> ResponsePostProcessor:
+    """
+    Get a compiled post-processor, compiling each combination of steps once.
+    
+    Args:
+        strip_thinking: Remove <think> and <thinking> sections
+        persian_only: Remove text that is not Persian
+        exclusion_words: Words and phrases to remove, matched case-insensitively
+        normalize_whitespace: Remove trailing spaces, collapse runs of blank
+            lines and strip the response
+    
+    Returns:
+        ResponsePostProcessor: The post-processor
+    """
+    words = tuple(sorted({word.strip().lower() for word in exclusion_words or () if word.strip()}))
+    return _cached_post_processor(strip_thinking, persian_only, words, normalize_whitespace)
@@ -0,0 +1,203 @@
+import contextvars
+import hashlib
+import json
+import os
+import random
+import re
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from utils.batching import BatchWorker
+
+# Seconds spent in each stage of the request being recorded
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_PATTERN = re.compile(r"(?<!\w)\+?\d[\d\s().-]{7,}\d(?!\w)")
+
+def start_stage_timings() -> contextvars.Token:
+    """Start collecting stage times for the current request."""
+    return _stage_timings.set(defaultdict(float))
+
+def stop_stage_timings(token: contextvars.Token) -> Dict[str, float]:
+    """
+    Stop collecting stage times.
+    
+    Returns:
+        Dict[str, float]: Milliseconds spent in each stage; nested stages are counted in their parents too
+    """
+    timings = _stage_timings.get() or {}
+    try:
+        _stage_timings.reset(token)
+    except ValueError:
+        # Stopped from another context, such as after a streamed response
+        pass
+    return {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+
+def add_stage_time(stage: str, seconds: float):
+    """Add the time of a stage to the request being recorded, if any."""
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[stage] += seconds
+
+def hash_user_id(record: Dict) -> Dict:
+    """Replace the user ID with a salted hash, keeping one user's requests together."""
+    body = record.get("json")
+    if isinstance(body, dict) and body.get("user_id"):
+        digest = hashlib.sha256(f"{Config.RECORD_REDACT_SALT}:{body['user_id']}".encode("utf-8"))
+        body["user_id"] = f"user-{digest.hexdigest()[:16]}"
+    return record
+
+def mask_contact_details(record: Dict) -> Dict:
+    """Mask email addresses and phone numbers in the text fields of the request body."""
+    body = record.get("json")
+    if isinstance(body, dict):
+        for key, value in body.items():
+            if isinstance(value, str) and key != "user_id":
+                body[key] = PHONE_PATTERN.sub("<phone>", EMAIL_PATTERN.sub("<email>", value))
+    return record
+
+class RotatingLineWriter:
+    """Appends lines to a file, rotating it to numbered backups when it grows too large."""
+    
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        """
+        Initialize a writer.
+        
+        Args:
+            path: File to append to; "{pid}" is replaced with the process ID
+            max_bytes: Size at which the file is rotated, or 0 to never rotate
+            backup_count: Number of rotated files kept, as path.1 (newest) to path.N
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+    
+    def write(self, lines: List[str]):
+        """Append lines with a single write."""
+        # Resolved on each write, since workers fork after the writer is created
+        path = self.path.replace("{pid}", str(os.getpid()))
+        data = "".join(line + "\n" for line in lines).encode("utf-8")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        elif self.max_bytes and os.path.getsize(path) + len(data) > self.max_bytes:
+            self._rotate(path)
+        with open(path, "ab") as record_file:
+            record_file.write(data)
+    
+    def _rotate(self, path: str):
+        """Shift the backups up by one and move the current file to path.1."""
+        if self.backup_count <= 0:
+            os.remove(path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+
+class RequestRecorder:
+    """
+    Records sampled requests as JSON lines for replay.
+    
+    Requests are queued as they finish and a worker thread redacts,
+    serializes and writes them in batches, so requests never wait for
+    the disk. When the queue is full, records are dropped and counted.
+    """
+    
+    def __init__(self, writer=None, sample_rate: float = 1.0, paths=("/api/chat",),
+                 queue_size: int = 10000, batch_size: int = 512, flush_interval: float = 1.0):
+        """
+        Initialize a recorder.
+        
+        Args:
+            writer: Writer of batches of lines, or None to disable recording
+            sample_rate: Fraction of requests to record (0.0 to 1.0)
+            paths: Request paths that are recorded
+            queue_size: Maximum number of records waiting to be written
+            batch_size: Maximum number of records written at once
+            flush_interval: Seconds between writes when few requests are recorded
+        """
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.paths = frozenset(paths)
+        self._redactors = []
+        self._batches = BatchWorker(self._write, "request-recorder", queue_size, batch_size, flush_interval)
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether requests are recorded at all."""
+        return self.writer is not None
+    
+    @property
+    def dropped(self) -> int:
+        """Number of records dropped because the write queue was full."""
+        return self._batches.dropped
+    
+    def add_redactor(self, redactor: Callable[[Dict], Optional[Dict]]):
+        """
+        Add a hook that redacts records before they are written.
+        
+        Redactors run in order on the writer thread. Each gets the record,
+        may change it in place, and returns it, or None to drop it.
+        """
+        self._redactors.append(redactor)
+    
+    def should_record(self, path: str) -> bool:
+        """Whether to record a request to `path`, sampling at the configured rate."""
+        return self.enabled and path in self.paths and random.random() < self.sample_rate
+    
+    def record(self, record: Dict):
+        """Queue a finished request for writing."""
+        self._batches.put(record)
+    
+    def _write(self, batch: List[Dict]):
+        """Redact and write a batch."""
+        lines = []
+        for record in batch:
+            try:
+                for redactor in self._redactors:
+                    record = redactor(record)
+                    if record is None:
+                        break
+                if record is not None:
+                    lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str))
+            except Exception as e:
+                print(f"Error redacting recorded request: {str(e)}")
+        if lines:
+            self.writer.write(lines)
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Write every record queued so far.
+        
+        Args:
+            timeout: Maximum seconds to wait for the write
+        
+        Returns:
+            bool: Whether the write finished in time
+        """
+        return self._batches.flush(timeout)
+
+# Singleton instance
+_request_recorder_instance = None
+
+def get_request_recorder():
+    """Get the singleton request recorder, disabled unless RECORD_REQUESTS is set."""
+    global _request_recorder_instance
+    if _request_recorder_instance is None:
+        writer = None
+        if Config.RECORD_REQUESTS:
+            writer = RotatingLineWriter(Config.RECORD_FILE, Config.RECORD_MAX_BYTES, Config.RECORD_BACKUP_COUNT)
+        recorder = RequestRecorder(
+            writer,
+            sample_rate=Config.RECORD_SAMPLE_RATE,
+            paths=Config.RECORD_PATHS,
+            queue_size=Config.RECORD_QUEUE_SIZE,
+            flush_interval=Config.RECORD_FLUSH_INTERVAL
+        )
+        if Config.RECORD_REDACT_PII:
+            recorder.add_redactor(hash_user_id)
+            recorder.add_redactor(mask_contact_details)
+        _request_recorder_instance = recorder
+    return _request_recorder_instance
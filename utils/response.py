@@ -1,7 +1,33 @@
 import re
+import time
 from enum import Enum
-from typing import List, Dict, Generator, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Generator, Optional, Iterable
+from dataclasses import dataclass, replace
+
+from utils.postprocess import ResponsePostProcessor
+
+# Sentence endings, including the Persian question mark and the Arabic full stop
+SENTENCE_ENDINGS = ".!?\u061f\u06d4"
+
+# Maximum length of a chunk of grouped sentences
+MAX_SENTENCE_CHUNK_CHARS = 200
+
+# Typing speed suggested to clients that reveal chunks gradually
+TYPING_DELAY_PER_CHAR = 0.01
+MAX_TYPING_DELAY = 0.5
+
+# Whitespace after a sentence ending
+SENTENCE_SPLIT = re.compile(rf"(?<=[{SENTENCE_ENDINGS}])\s+")
+
+# A sentence break is only final once the text after it has started
+SENTENCE_BREAK = re.compile(rf"(?<=[{SENTENCE_ENDINGS}])\s+(?=\S)")
+
+# Blank lines between paragraphs
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+def typing_delay(content: str) -> float:
+    """Get the seconds a client may wait before showing a chunk, to simulate typing."""
+    return min(MAX_TYPING_DELAY, len(content) * TYPING_DELAY_PER_CHAR)
 
 class ChunkingStrategy(Enum):
     SENTENCE = "sentence"
@@ -9,43 +35,265 @@ class ChunkingStrategy(Enum):
     FIXED_LENGTH = "fixed_length"
     SMART = "smart"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ResponseChunk:
+    """
+    One chunk of a response.
+    
+    Chunk metadata is derived from the sequence number and total on
+    access rather than stored with every chunk.
+    """
     content: str
     sequence: int
-    total_chunks: int
-    metadata: Dict
+    total_chunks: Optional[int] = None
+    
+    @property
+    def is_first(self) -> bool:
+        """Whether this is the first chunk of the response."""
+        return self.sequence == 1
+    
+    @property
+    def is_last(self) -> bool:
+        """Whether this is the last chunk of the response."""
+        return self.total_chunks is not None and self.sequence == self.total_chunks
+    
+    @property
+    def progress(self) -> Optional[float]:
+        """Fraction of the response sent with this chunk, None while the total is unknown."""
+        return self.sequence / self.total_chunks if self.total_chunks else None
+    
+    @property
+    def pacing_delay(self) -> float:
+        """Seconds a client may wait before showing this chunk, to simulate typing."""
+        return typing_delay(self.content)
+    
+    @property
+    def metadata(self) -> Dict:
+        """Chunk metadata as a dict."""
+        return {
+            "is_first": self.is_first,
+            "is_last": self.is_last,
+            "progress": self.progress,
+            "pacing_delay": self.pacing_delay
+        }
+
+class StreamingChunker:
+    """
+    Incremental chunker fed with text deltas as they arrive from the model.
+    
+    Chunks are cut at the same boundaries as ResponseManager.chunk_response,
+    but each one is emitted as soon as the boundary after it is seen, and
+    only the text of the chunk being built is kept. The total number of
+    chunks is unknown while streaming, so it is only set on the last chunk;
+    to flag that chunk, each chunk is held back until the next one starts
+    or the stream is flushed.
+    """
+    
+    __slots__ = (
+        "strategy", "chunk_size", "_buffer", "_scan", "_group", "_words",
+        "_split_sentences", "_held", "_sequence", "_ready"
+    )
+    
+    def __init__(self, strategy: ChunkingStrategy = ChunkingStrategy.SMART, chunk_size: int = 100):
+        """
+        Initialize an empty chunker.
+        
+        Args:
+            strategy: Chunking strategy to use
+            chunk_size: Words per fixed-length chunk; SMART splits paragraphs
+                longer than twice this into sentences
+        """
+        self.strategy = strategy
+        self.chunk_size = chunk_size
+        self._buffer = ""
+        self._scan = 0
+        self._group = ""
+        self._words = []
+        self._split_sentences = False
+        self._held = None
+        self._sequence = 0
+        self._ready = []
+    
+    def feed(self, delta: str) -> List[ResponseChunk]:
+        """
+        Add the next piece of the response.
+        
+        Args:
+            delta: Text received since the last call
+        
+        Returns:
+            List[ResponseChunk]: Chunks completed by this text, often none
+        """
+        if delta:
+            if self.strategy == ChunkingStrategy.FIXED_LENGTH:
+                self._feed_words(delta)
+            else:
+                self._buffer += delta
+                self._drain()
+        return self._take()
+    
+    def flush(self) -> List[ResponseChunk]:
+        """
+        End the response and get the remaining chunks, the last one flagged as such.
+        
+        Returns:
+            List[ResponseChunk]: The remaining chunks
+        """
+        if self.strategy == ChunkingStrategy.FIXED_LENGTH:
+            self._feed_words(" ")
+            self._emit(" ".join(self._words))
+            self._words = []
+        elif self.strategy == ChunkingStrategy.PARAGRAPH:
+            self._emit(self._buffer.strip())
+        elif self.strategy == ChunkingStrategy.SENTENCE:
+            for sentence in SENTENCE_SPLIT.split(self._buffer):
+                self._add_sentence(sentence)
+            self._flush_group()
+        else:
+            self._end_paragraph(self._buffer)
+        self._buffer = ""
+        self._scan = 0
+        
+        if self._held is not None:
+            self._sequence += 1
+            self._ready.append(self._chunk(self._held, is_last=True))
+            self._held = None
+        return self._take()
+    
+    def _chunk(self, content: str, is_last: bool) -> ResponseChunk:
+        """Build the chunk with the current sequence number."""
+        return ResponseChunk(content, self._sequence, self._sequence if is_last else None)
+    
+    def _emit(self, content: str):
+        """Queue a finished chunk, releasing the one held back before it."""
+        if not content:
+            return
+        if self._held is not None:
+            self._sequence += 1
+            self._ready.append(self._chunk(self._held, is_last=False))
+        self._held = content
+    
+    def _take(self) -> List[ResponseChunk]:
+        """Hand over the queued chunks."""
+        ready, self._ready = self._ready, []
+        return ready
+    
+    def _feed_words(self, delta: str):
+        """Collect complete words and emit them in fixed-size groups."""
+        text = self._buffer + delta
+        words = text.split()
+        
+        # The last word may continue in the next delta
+        self._buffer = words.pop() if words and not text[-1].isspace() else ""
+        self._words.extend(words)
+        
+        while len(self._words) >= self.chunk_size:
+            self._emit(" ".join(self._words[:self.chunk_size]))
+            del self._words[:self.chunk_size]
+    
+    def _drain(self):
+        """Cut the buffered text at every boundary that is final."""
+        while True:
+            paragraph = None
+            sentence = None
+            if self.strategy != ChunkingStrategy.SENTENCE:
+                paragraph = PARAGRAPH_BREAK.search(self._buffer, self._scan)
+            if self.strategy == ChunkingStrategy.SENTENCE or self._split_sentences:
+                sentence = SENTENCE_BREAK.search(self._buffer, self._scan)
+            
+            # A sentence break never swallows a paragraph break
+            if paragraph is not None and (sentence is None or paragraph.start() < sentence.end()):
+                segment = self._buffer[:paragraph.start()]
+                self._buffer = self._buffer[paragraph.end():]
+                self._scan = 0
+                self._end_paragraph(segment)
+            elif sentence is not None:
+                segment = self._buffer[:sentence.start()]
+                self._buffer = self._buffer[sentence.end():]
+                self._scan = 0
+                self._add_sentence(segment)
+            elif (self.strategy == ChunkingStrategy.SMART and not self._split_sentences
+                  and len(self._buffer.split()) > self.chunk_size * 2):
+                # The paragraph is too long to send whole, so go on sentence by sentence
+                self._split_sentences = True
+                self._buffer = self._buffer.lstrip()
+                self._scan = 0
+            else:
+                # Breaks can only start in the trailing whitespace
+                self._scan = len(self._buffer.rstrip())
+                return
+    
+    def _end_paragraph(self, paragraph: str):
+        """Emit a finished paragraph, split into sentences if it is too long."""
+        if self._split_sentences or (self.strategy == ChunkingStrategy.SMART
+                                     and len(paragraph.split()) > self.chunk_size * 2):
+            for sentence in SENTENCE_SPLIT.split(paragraph.strip()):
+                self._add_sentence(sentence)
+            self._flush_group()
+            self._split_sentences = False
+        else:
+            self._emit(paragraph.strip())
+    
+    def _add_sentence(self, sentence: str):
+        """Add a sentence to the current group, emitting the group once it is full."""
+        if self._group and len(self._group) + len(sentence) > MAX_SENTENCE_CHUNK_CHARS:
+            self._emit(self._group.strip())
+            self._group = sentence
+        else:
+            self._group += " " + sentence if self._group else sentence
+    
+    def _flush_group(self):
+        """Emit the current group of sentences."""
+        self._emit(self._group.strip())
+        self._group = ""
 
 class ResponseManager:
     """Manager for handling response chunking and streaming."""
     
-    def __init__(self):
-        """Initialize the response manager."""
+    def __init__(self, length_estimator=None):
+        """
+        Initialize the response manager.
+        
+        Args:
+            length_estimator: Optional ResponseLengthEstimator to predict
+                response lengths from observed responses
+        """
         self.default_chunk_size = 100  # Default chunk size in tokens
+        self.length_estimator = length_estimator
     
     def estimate_response_length(self, prompt: str, model_name: str,
-                               creativity: float = 0.7) -> int:
+                               creativity: float = 0.7, response_length: Optional[str] = None,
+                               prompt_tokens: Optional[int] = None) -> int:
         """
         Estimate the expected length of a response.
         
+        Uses the median length of similar observed responses when the length
+        estimator has seen enough of them, and a heuristic otherwise.
+        
         Args:
             prompt: The input prompt
             model_name: The model being used
             creativity: Creativity level (0.0 to 1.0)
-            
+            response_length: Requested response length, if any
+            prompt_tokens: Tokens in the prompt, if already counted
+        
         Returns:
             int: Estimated response length in tokens
         """
-        # Simple heuristic: response length is proportional to prompt length and creativity
-        prompt_length = len(prompt.split())
+        # Prompt length in tokens if already counted, otherwise in words
+        prompt_length = prompt_tokens if prompt_tokens is not None else len(prompt.split())
+        
+        if self.length_estimator is not None:
+            prediction = self.length_estimator.predict(model_name, prompt_length, response_length, creativity)
+            if prediction is not None:
+                return int(prediction["p50"])
         
+        # Simple heuristic: response length is proportional to prompt length and creativity
         # Base multiplier depends on the model
         model_multipliers = {
-            "llama2": 1.5,
-            "llama3": 2.0,
-            "gemma": 1.8,
-            "claude2": 2.5,
-            "groq-llama3": 2.0
+            "deepseek": 2.5,
+            "llama": 2.0,
+            "gemma": 1.8
         }
         
         multiplier = model_multipliers.get(model_name, 2.0)
@@ -71,158 +319,87 @@ class ResponseManager:
             response: The response text to chunk
             strategy: Chunking strategy to use
             chunk_size: Optional custom chunk size
-            
+        
         Returns:
             List[ResponseChunk]: List of response chunks
         """
         if not response:
             return []
-            
-        # Use default chunk size if not specified
-        if chunk_size is None:
-            chunk_size = self.default_chunk_size
-        
-        # Choose chunking method based on strategy
-        if strategy == ChunkingStrategy.SENTENCE:
-            chunks = self._chunk_by_sentences(response)
-        elif strategy == ChunkingStrategy.PARAGRAPH:
-            chunks = self._chunk_by_paragraphs(response)
-        elif strategy == ChunkingStrategy.FIXED_LENGTH:
-            chunks = self._chunk_fixed_length(response)
-        else:  # SMART or default
-            chunks = self._chunk_smart(response)
-        
-        # Create ResponseChunk objects
-        result = []
-        total_chunks = len(chunks)
-        
-        for i, content in enumerate(chunks):
-            chunk = ResponseChunk(
-                content=content,
-                sequence=i + 1,
-                total_chunks=total_chunks,
-                metadata={
-                    "is_first": i == 0,
-                    "is_last": i == total_chunks - 1,
-                    "progress": (i + 1) / total_chunks
-                }
-            )
-            result.append(chunk)
-        
-        return result
-    
-    def _chunk_by_sentences(self, text: str) -> List[str]:
-        """
-        Split text into chunks by sentences.
         
-        Args:
-            text: Text to split
-            
-        Returns:
-            List[str]: List of sentence chunks
-        """
-        # Simple sentence splitting regex
-        # This is a simplified approach - a more robust implementation would use NLP
-        sentence_endings = r'(?<=[.!?])\s+'
-        sentences = re.split(sentence_endings, text)
-        
-        # Group sentences into chunks
-        chunks = []
-        current_chunk = ""
-        
-        for sentence in sentences:
-            # If adding this sentence would make the chunk too long, start a new chunk
-            if current_chunk and len(current_chunk) + len(sentence) > 200:
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence
-            else:
-                current_chunk += " " + sentence if current_chunk else sentence
-        
-        # Add the last chunk if it's not empty
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        chunker = self.create_chunker(strategy, chunk_size)
+        result = chunker.feed(response) + chunker.flush()
         
-        return chunks
+        # The whole response is chunked, so every chunk can carry the total
+        total_chunks = len(result)
+        return [replace(chunk, total_chunks=total_chunks) for chunk in result]
     
-    def _chunk_by_paragraphs(self, text: str) -> List[str]:
+    def create_chunker(self, strategy: ChunkingStrategy = ChunkingStrategy.SMART,
+                       chunk_size: Optional[int] = None) -> StreamingChunker:
         """
-        Split text into chunks by paragraphs.
+        Create a chunker for a response that is still being generated.
         
         Args:
-            text: Text to split
-            
-        Returns:
-            List[str]: List of paragraph chunks
-        """
-        # Split by double newlines (paragraph breaks)
-        paragraphs = re.split(r'\n\s*\n', text)
-        
-        # Filter out empty paragraphs
-        paragraphs = [p.strip() for p in paragraphs if p.strip()]
-        
-        return paragraphs
-    
-    def _chunk_fixed_length(self, text: str) -> List[str]:
-        """
-        Split text into fixed-length chunks.
+            strategy: Chunking strategy to use
+            chunk_size: Optional custom chunk size
         
-        Args:
-            text: Text to split
-            
         Returns:
-            List[str]: List of fixed-length chunks
+            StreamingChunker: The chunker
         """
-        words = text.split()
-        chunks = []
-        
-        for i in range(0, len(words), self.default_chunk_size):
-            chunk = " ".join(words[i:i + self.default_chunk_size])
-            chunks.append(chunk)
-        
-        return chunks
+        return StreamingChunker(strategy, chunk_size or self.default_chunk_size)
     
-    def _chunk_smart(self, text: str) -> List[str]:
+    def stream_chunks(self, deltas: Iterable[str], strategy: ChunkingStrategy = ChunkingStrategy.SMART,
+                      chunk_size: Optional[int] = None,
+                      post_processor: Optional[ResponsePostProcessor] = None) -> Generator[ResponseChunk, None, None]:
         """
-        Split text using a smart strategy that preserves context.
+        Chunk a response as its text arrives.
         
         Args:
-            text: Text to split
-            
-        Returns:
-            List[str]: List of smart chunks
-        """
-        # First try to split by paragraphs
-        paragraphs = self._chunk_by_paragraphs(text)
-        
-        # If paragraphs are too long, split them further by sentences
-        chunks = []
-        for paragraph in paragraphs:
-            if len(paragraph.split()) > self.default_chunk_size * 2:
-                # This paragraph is too long, split it by sentences
-                sentences = self._chunk_by_sentences(paragraph)
-                chunks.extend(sentences)
-            else:
-                chunks.append(paragraph)
+            deltas: Pieces of the response, in order, as the model produces them
+            strategy: Chunking strategy to use
+            chunk_size: Optional custom chunk size
+            post_processor: Optional post-processor to clean the text before it is chunked
         
-        return chunks
+        Yields:
+            ResponseChunk: Each chunk as soon as it is complete
+        """
+        chunker = self.create_chunker(strategy, chunk_size)
+        cleaner = post_processor.stream() if post_processor else None
+        for delta in deltas:
+            if cleaner:
+                delta = cleaner.feed(delta)
+            yield from chunker.feed(delta)
+        if cleaner:
+            yield from chunker.feed(cleaner.flush())
+        yield from chunker.flush()
     
-    def stream_response(self, chunks: List[ResponseChunk]) -> Generator[ResponseChunk, None, None]:
+    def stream_response(self, chunks: Iterable[ResponseChunk],
+                        pace: bool = False) -> Generator[ResponseChunk, None, None]:
         """
-        Stream response chunks with appropriate timing.
+        Stream response chunks as soon as they are available.
+        
+        Each chunk carries a "pacing_delay" hint in its metadata, so clients
+        can reveal the text at typing speed themselves. With `pace`, chunks
+        are released at that speed here instead: each chunk is due its delay
+        after the previous one, and the stream only waits for the part of
+        that time not already spent producing the chunk. The wait uses
+        time.sleep, which yields to other greenlets under gevent.
         
         Args:
-            chunks: List of response chunks
-            
+            chunks: Response chunks, possibly still being produced
+            pace: Whether to release chunks at typing speed
+        
         Yields:
             ResponseChunk: Each chunk in sequence
         """
-        import time
+        due = time.monotonic()
         
         for chunk in chunks:
-            # Add a small delay between chunks to simulate typing
-            # The delay is proportional to the chunk length
-            delay = min(0.5, len(chunk.content) * 0.01)
-            time.sleep(delay)
+            if pace:
+                now = time.monotonic()
+                # Never catch up on time lost waiting for the chunk
+                due = max(due + chunk.pacing_delay, now)
+                if due > now:
+                    time.sleep(due - now)
             
             yield chunk
     
@@ -232,16 +409,17 @@ class ResponseManager:
         
         Args:
             chunk: The response chunk
-            
+        
         Returns:
             Dict: Formatted metadata
         """
         return {
             "sequence": chunk.sequence,
             "total_chunks": chunk.total_chunks,
-            "progress": chunk.metadata["progress"],
-            "is_first": chunk.metadata["is_first"],
-            "is_last": chunk.metadata["is_last"]
+            "progress": chunk.progress,
+            "is_first": chunk.is_first,
+            "is_last": chunk.is_last,
+            "pacing_delay": chunk.pacing_delay
         }
     
     def merge_chunks(self, chunks: List[ResponseChunk]) -> str:
@@ -254,16 +432,21 @@ class ResponseManager:
         
         Args:
             chunks: List of response chunks
-            
+        
         Returns:
             bool: True if sequence is valid
         """
         if not chunks:
             return True
-            
+        
+        # Streamed chunks only carry the total on the last chunk
+        total_chunks = next((chunk.total_chunks for chunk in chunks if chunk.total_chunks is not None), None)
+        if total_chunks is None:
+            return False
+        
         # Check that all sequence numbers are present
         sequences = [chunk.sequence for chunk in chunks]
-        expected_sequences = list(range(1, chunks[0].total_chunks + 1))
+        expected_sequences = list(range(1, total_chunks + 1))
         
         return sorted(sequences) == expected_sequences
     
@@ -273,9 +456,10 @@ class ResponseManager:
         
         Args:
             chunk: The response chunk
-            
+        
         Returns:
             str: Summary of the chunk
         """
         content_preview = chunk.content[:30] + "..." if len(chunk.content) > 30 else chunk.content
-        return f"Chunk {chunk.sequence}/{chunk.total_chunks}: {content_preview}"
+        total_chunks = chunk.total_chunks if chunk.total_chunks is not None else "?"
+        return f"Chunk {chunk.sequence}/{total_chunks}: {content_preview}"
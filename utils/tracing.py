@@ -0,0 +1,297 @@
+import contextvars
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from utils.batching import BatchWorker
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+# OTLP status code of a span that failed
+STATUS_CODE_ERROR = 2
+
+# The span that new spans are children of, per thread, greenlet or task
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """A timed operation within a trace."""
+    
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+    
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        """Start a span now."""
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes) if attributes else {}
+        self.error = None
+    
+    def set_attribute(self, key: str, value: Any):
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+    
+    def to_otlp(self) -> Dict:
+        """Convert the span to its OTLP JSON representation."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()]
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error is not None:
+            span["status"] = {"code": STATUS_CODE_ERROR, "message": self.error}
+        return span
+
+def _otlp_value(value: Any) -> Dict:
+    """Convert an attribute value to an OTLP AnyValue."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_request(spans: List[Span]) -> Dict:
+    """Wrap spans in an OTLP ExportTraceServiceRequest."""
+    return {
+        "resourceSpans": [{
+            "resource": {
+                "attributes": [
+                    {"key": "service.name", "value": {"stringValue": Config.TRACE_SERVICE_NAME}},
+                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}}
+                ]
+            },
+            "scopeSpans": [{
+                "scope": {"name": "parviz-mind"},
+                "spans": [span.to_otlp() for span in spans]
+            }]
+        }]
+    }
+
+class FileSpanExporter:
+    """Appends each batch of spans to a file as one line of OTLP JSON."""
+    
+    def __init__(self, path: str):
+        """Initialize an exporter writing to `path`."""
+        self.path = path
+    
+    def export(self, spans: List[Span]):
+        """Write a batch of spans."""
+        line = json.dumps(otlp_request(spans), separators=(",", ":"))
+        with open(self.path, "a", encoding="utf-8") as trace_file:
+            trace_file.write(line + "\n")
+
+class OtlpHttpSpanExporter:
+    """Sends each batch of spans to an OTLP/HTTP collector as JSON."""
+    
+    def __init__(self, endpoint: str, timeout: float):
+        """Initialize an exporter posting to `endpoint`, such as http://localhost:4318/v1/traces."""
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._session = None
+    
+    def export(self, spans: List[Span]):
+        """Send a batch of spans."""
+        if self._session is None:
+            # Imported here so that tracing adds no import cost when it is off
+            import requests
+            self._session = requests.Session()
+        response = self._session.post(self.endpoint, json=otlp_request(spans), timeout=self.timeout)
+        response.raise_for_status()
+
+class Tracer:
+    """
+    Records spans of sampled requests and exports them in the background.
+    
+    Finished spans are queued and a worker thread exports them in batches,
+    so requests never wait for the exporter. When the queue is full, spans
+    are dropped and counted rather than slowing requests down.
+    """
+    
+    def __init__(self, exporter=None, sample_rate: float = 1.0, queue_size: int = 10000,
+                 batch_size: int = 512, export_interval: float = 2.0):
+        """
+        Initialize a tracer.
+        
+        Args:
+            exporter: Exporter of finished spans, or None to disable tracing
+            sample_rate: Fraction of new traces to record (0.0 to 1.0)
+            queue_size: Maximum number of finished spans waiting for export
+            batch_size: Maximum number of spans exported at once
+            export_interval: Seconds between exports when the batch is not full
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self._batches = BatchWorker(self._export, "trace-exporter", queue_size, batch_size, export_interval)
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether spans are recorded at all."""
+        return self.exporter is not None
+    
+    @property
+    def dropped(self) -> int:
+        """Number of spans dropped because the export queue was full."""
+        return self._batches.dropped
+    
+    def start_trace(self, name: str, traceparent: Optional[str] = None,
+                    attributes: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Span], Optional[contextvars.Token]]:
+        """
+        Start the root span of a request and make it current.
+        
+        Args:
+            name: Name of the span
+            traceparent: Optional W3C traceparent header of the caller, to continue its trace
+            attributes: Optional span attributes
+        
+        Returns:
+            Tuple[Optional[Span], Optional[contextvars.Token]]: The span and the token to pass
+                to end_trace(), or (None, None) if the request is not sampled
+        """
+        if not self.enabled:
+            return None, None
+        
+        parent = _parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+            if not sampled:
+                return None, None
+        elif random.random() < self.sample_rate:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        else:
+            return None, None
+        
+        span = Span(name, trace_id, parent_id, SPAN_KIND_SERVER, attributes)
+        return span, _current_span.set(span)
+    
+    def end_trace(self, span: Optional[Span], token: Optional[contextvars.Token], error: Optional[str] = None):
+        """End a span started with start_trace()."""
+        if span is None:
+            return
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Ended from another context, such as after a streamed response
+            pass
+        self._finish(span, error)
+    
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        """
+        Record a child span of the current span.
+        
+        Outside a sampled trace nothing is recorded.
+        
+        Args:
+            name: Name of the span
+            attributes: Optional span attributes
+        
+        Yields:
+            Optional[Span]: The span, or None outside a sampled trace
+        """
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        
+        span = Span(name, parent.trace_id, parent.span_id, SPAN_KIND_INTERNAL, attributes)
+        token = _current_span.set(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span, error)
+    
+    def _finish(self, span: Span, error: Optional[str]):
+        """End a span and queue it for export."""
+        span.end_ns = time.time_ns()
+        span.error = error
+        self._batches.put(span)
+    
+    def _export(self, batch: List[Span]):
+        """Export a batch of spans."""
+        self.exporter.export(batch)
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Export every span finished so far.
+        
+        Args:
+            timeout: Maximum seconds to wait for the export
+        
+        Returns:
+            bool: Whether the export finished in time
+        """
+        return self._batches.flush(timeout)
+
+def _parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Parse a W3C traceparent header into trace ID, parent span ID and sampled flag."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+def current_span() -> Optional[Span]:
+    """Get the current span, or None outside a sampled trace."""
+    return _current_span.get()
+
+def set_attributes(**attributes):
+    """Set attributes of the current span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+def _create_exporter():
+    """Create the exporter configured by TRACE_EXPORTER."""
+    if Config.TRACE_EXPORTER == "file":
+        return FileSpanExporter(Config.TRACE_FILE)
+    if Config.TRACE_EXPORTER == "otlp":
+        return OtlpHttpSpanExporter(Config.TRACE_OTLP_ENDPOINT, Config.HTTP_TIMEOUT)
+    return None
+
+# Singleton instance
+_tracer_instance = None
+
+def get_tracer():
+    """Get the singleton tracer, disabled unless TRACE_EXPORTER is set."""
+    global _tracer_instance
+    if _tracer_instance is None:
+        _tracer_instance = Tracer(
+            _create_exporter(),
+            sample_rate=Config.TRACE_SAMPLE_RATE,
+            queue_size=Config.TRACE_QUEUE_SIZE,
+            batch_size=Config.TRACE_BATCH_SIZE,
+            export_interval=Config.TRACE_EXPORT_INTERVAL
+        )
+    return _tracer_instance